@@ -1,25 +1,101 @@
+import os
+from importlib import import_module
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from config import Config 
+from werkzeug.middleware.proxy_fix import ProxyFix
+from config import Config, CONFIGURACIONES
+from app.replicas import SesionEnrutada
 
-db = SQLAlchemy()
+# La sesión elige el engine de cada sentencia: primaria o réplica de lectura (ver app/replicas.py)
+db = SQLAlchemy(session_options={'class_': SesionEnrutada})
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 
-def create_app():
+# Módulos que pueden aportar el blueprint 'main' (se elige con BLUEPRINT_PRINCIPAL)
+BLUEPRINTS_PRINCIPALES = ('routes', 'test_routes')
+
+def create_app(config_class=None):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class or CONFIGURACIONES.get(os.environ.get('APP_ENTORNO'), Config))
+
+    # Detrás de proxies inversos, la IP y el esquema del cliente salen de X-Forwarded-* (solo de esa cantidad de proxies)
+    if app.config['PROXIES_CONFIABLES']:
+        proxies = app.config['PROXIES_CONFIABLES']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies, x_host=proxies)
+
+    # Caché de bytecode de Jinja (antes de que se cree el entorno de plantillas)
+    from app import plantillas
+    plantillas.init_app(app)
+
+    # Pool de conexiones medido y límite de tiempo por consulta (antes de crear el engine)
+    from app import pool
+    pool.preparar(app)
 
     db.init_app(app)
+    pool.init_app(app)
     login_manager.init_app(app)
 
-    from app.routes import main 
-    #from app.test_routes import main
-    
+    # Lecturas de las peticiones GET desde las réplicas configuradas en DATABASE_REPLICAS
+    from app import replicas
+    replicas.init_app(app)
+
+    # Versión de la tabla libro para ETag / Last-Modified (se incrementa en cada escritura)
+    from app import versiones
+
+    # Contadores del catálogo por categoría, estado, año y préstamos (se actualizan en cada escritura)
+    from app import estadisticas
+
+    # Índice de búsqueda del catálogo (se sincroniza con las señales de app.eventos)
+    from app import busqueda
+    busqueda.init_app(app)
+
+    # Caché de usuarios/roles para load_user (se invalida con las señales de app.eventos)
+    from app import cache
+    cache.init_app(app)
+
+    # Métricas de préstamos y conflictos de versión (concurrencia optimista de libros)
+    from app import concurrencia
+    concurrencia.init_app(app)
+
+    # Registro de cambios de libros para la sincronización incremental (/cambios?since=<cursor>)
+    from app import cambios
+    cambios.init_app(app)
+
+    # Tareas largas del catálogo en un pool de hilos acotado, con su progreso en la tabla tarea
+    from app import tareas
+    tareas.init_app(app)
+
+    # Límite de intentos de login y registro (antes de cualquier hash o consulta)
+    from app import limites
+    limites.init_app(app)
+
+    # Hashing de contraseñas en un pool de procesos acotado
+    from app import hashing
+    hashing.init_app(app)
+
+    # Compresión gzip de las respuestas grandes
+    from app import serializacion
+    serializacion.init_app(app)
+
+    # Conteo de SQL por petición, detector de consultas N+1 y perfilado opcional (Server-Timing)
+    from app import instrumentacion
+    instrumentacion.init_app(app)
+
+    # Solo se importa el módulo del blueprint principal elegido
+    principal = app.config['BLUEPRINT_PRINCIPAL']
+    if principal not in BLUEPRINTS_PRINCIPALES:
+        raise ValueError(f'Unknown BLUEPRINT_PRINCIPAL: {principal}')
+    main = import_module(f'app.{principal}').main
+
     from app.auth_routes import auth
+    from app.metricas_routes import metricas
+    from app.tareas_routes import tareas as tareas_bp
 
     app.register_blueprint(main)
     app.register_blueprint(auth)
+    app.register_blueprint(metricas)
+    app.register_blueprint(tareas_bp)
 
     return app
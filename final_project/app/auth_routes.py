@@ -1,25 +1,47 @@
-from flask import Blueprint, render_template, redirect, url_for, flash
+from math import ceil
+from flask import Blueprint, render_template, redirect, url_for, flash, request
 from app.forms import LoginForm, RegisterForm
+from app.hashing import registrar_rehash
+from app.limites import intentos_excedidos, registrar_fallo
 from app.models import db, User, Role
 from flask_login import login_user, logout_user
 
 # Blueprint de autenticación: gestiona login, registro y logout
 auth = Blueprint('auth', __name__)
 
+def _demasiados_intentos(plantilla, form, espera):
+    """ Respuesta 429 con el formulario y Retry-After, sin procesar el intento. """
+    segundos = ceil(espera)
+    flash(f'Too many attempts. Please try again in {segundos} seconds.')
+    return render_template(plantilla, form=form), 429, {'Retry-After': str(segundos)}
+
 @auth.route('/login', methods=['GET', 'POST'])
 def login():
     """
     Inicia sesión de un usuario existente si las credenciales son válidas.
+    Los intentos por IP y los fallidos por email están limitados: el exceso se rechaza sin consultar la base ni calcular hashes.
     """
     form = LoginForm()
 
+    if request.method == 'POST':
+        espera = intentos_excedidos('login', request.form.get('email'))
+        if espera:
+            return _demasiados_intentos('login.html', form, espera)
+
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
 
         if user and user.check_password(form.password.data):
+            # Si cambió el costo configurado, se aprovecha la contraseña en claro para actualizar el hash
+            if user.password_desactualizado():
+                user.set_password(form.password.data)
+                db.session.commit()
+                registrar_rehash()
+
             login_user(user)
             return redirect(url_for('main.dashboard'))
 
+        registrar_fallo('login', form.email.data)
         flash('Invalid credentials')
 
     return render_template('login.html', form=form)
@@ -32,8 +54,14 @@ def login():
 def register():
     """
     Registra un nuevo usuario y lo asocia por defecto al rol "Lector".
+    Limitado por IP y por intentos rechazados por email, igual que el login.
     """    
     form = RegisterForm()
+
+    if request.method == 'POST':
+        espera = intentos_excedidos('registro', request.form.get('email'))
+        if espera:
+            return _demasiados_intentos('register.html', form, espera)
     
     # Procesa el formulario si fue enviado correctamente
     if form.validate_on_submit():
@@ -54,7 +82,10 @@ def register():
         # Muestra mensaje de éxito
         flash('User registered successfully.')
         return redirect(url_for('auth.login'))
-    
+
+    if request.method == 'POST':
+        registrar_fallo('registro', request.form.get('email'))
+
     # Renderiza el formulario de registro
     return render_template('register.html', form=form)
 
@@ -0,0 +1,289 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from flask import current_app
+
+from app.cambios import CursorVencido, cambios_desde, cursor_actual
+from app.eventos import libros_confirmados
+from app.exportacion import filas_por_id
+from app.models import db, Libro
+
+# Peso de cada campo al calcular la relevancia de un libro
+PESOS_CAMPOS = {'titulo': 3, 'autor': 2, 'categoria': 1, 'isbn': 1}
+
+# Parámetros de BM25
+K1 = 1.2
+B = 0.75
+
+# Máximo de palabras del vocabulario que puede abarcar el prefijo del último término
+MAX_EXPANSION_PREFIJO = 50
+
+# Columnas de Libro que usa el índice
+COLUMNAS_INDICE = ['id', 'titulo', 'autor', 'isbn', 'categoria', 'estado', 'año_publicacion']
+
+# Entradas del registro de cambios que se leen por consulta al ponerse al día
+LOTE_CAMBIOS = 1000
+
+PALABRA = re.compile(r'\w+')
+
+
+def normalizar(texto):
+    """
+    Pasa el texto a minúsculas y sin tildes ('Canción' -> 'cancion'),
+    para que la búsqueda no dependa de acentos.
+    """
+    descompuesto = unicodedata.normalize('NFKD', str(texto or ''))
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return sin_tildes.lower()
+
+
+def tokenizar(texto):
+    """ Divide un texto normalizado en palabras. """
+    return PALABRA.findall(normalizar(texto))
+
+
+class IndiceInvertido:
+    """
+    Índice invertido en memoria sobre titulo/autor/isbn/categoria de los libros.
+
+    Cada palabra apunta a los libros que la contienen con su frecuencia ponderada por campo,
+    de modo que una búsqueda solo recorre las listas de sus términos y no la tabla completa.
+    Cada proceso (worker) mantiene su propia copia; se construye la primera vez que se usa
+    y se actualiza con la señal libros_confirmados. Esa señal solo llega al worker que hizo el
+    cambio: para ver los de los demás, antes de cada búsqueda el índice aplica las entradas del
+    registro de cambios (app/cambios.py) posteriores a su cursor.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.postings = defaultdict(dict)   # palabra -> {libro_id: frecuencia ponderada}
+        self.vocabulario = []               # palabras ordenadas, para búsquedas por prefijo
+        self.documentos = {}                # libro_id -> (palabras, longitud, categoria, estado, año)
+        self.longitud_total = 0
+        self.construido = False
+        self.cursor = 0                     # última entrada del registro de cambios aplicada
+
+    def _terminos(self, datos):
+        terminos = defaultdict(int)
+        for campo, peso in PESOS_CAMPOS.items():
+            for palabra in tokenizar(datos.get(campo)):
+                terminos[palabra] += peso
+        # El ISBN también se indexa sin guiones ni espacios
+        isbn = ''.join(tokenizar(datos.get('isbn')))
+        if isbn:
+            terminos[isbn] += PESOS_CAMPOS['isbn']
+        return terminos
+
+    def agregar(self, datos):
+        """ Agrega (o reemplaza) un libro en el índice a partir de sus columnas. """
+        with self._lock:
+            self.eliminar(datos['id'])
+            terminos = self._terminos(datos)
+            for palabra, frecuencia in terminos.items():
+                if palabra not in self.postings:
+                    bisect.insort(self.vocabulario, palabra)
+                self.postings[palabra][datos['id']] = frecuencia
+            longitud = sum(terminos.values())
+            self.documentos[datos['id']] = (
+                tuple(terminos), longitud,
+                normalizar(datos.get('categoria')), datos.get('estado'), datos.get('año_publicacion'),
+            )
+            self.longitud_total += longitud
+
+    def eliminar(self, libro_id):
+        """ Quita un libro del índice, si estaba. """
+        with self._lock:
+            documento = self.documentos.pop(libro_id, None)
+            if documento is None:
+                return
+            palabras, longitud = documento[0], documento[1]
+            for palabra in palabras:
+                lista = self.postings.get(palabra)
+                if lista is None:
+                    continue
+                lista.pop(libro_id, None)
+                if not lista:
+                    del self.postings[palabra]
+                    posicion = bisect.bisect_left(self.vocabulario, palabra)
+                    if posicion < len(self.vocabulario) and self.vocabulario[posicion] == palabra:
+                        self.vocabulario.pop(posicion)
+            self.longitud_total -= longitud
+
+    def construir(self, filas, cursor):
+        """
+        Reconstruye el índice completo desde un iterable de diccionarios de libros. `cursor` es el
+        del registro de cambios tomado antes de leer las filas.
+
+        El índice nuevo se arma aparte y reemplaza al actual al final, así las búsquedas siguen
+        respondiendo con el anterior mientras se leen las filas. Si la lectura falla, el índice
+        actual queda como estaba.
+        """
+        nuevo = IndiceInvertido()
+        for datos in filas:
+            nuevo.agregar(datos)
+        with self._lock:
+            self.postings = nuevo.postings
+            self.vocabulario = nuevo.vocabulario
+            self.documentos = nuevo.documentos
+            self.longitud_total = nuevo.longitud_total
+            self.cursor = cursor
+            self.construido = True
+
+    def _expandir_prefijo(self, prefijo):
+        """ Palabras del vocabulario que comienzan con el prefijo. """
+        posicion = bisect.bisect_left(self.vocabulario, prefijo)
+        palabras = []
+        while (posicion < len(self.vocabulario) and self.vocabulario[posicion].startswith(prefijo)
+               and len(palabras) < MAX_EXPANSION_PREFIJO):
+            palabras.append(self.vocabulario[posicion])
+            posicion += 1
+        return palabras
+
+    def buscar(self, consulta, pagina=1, por_pagina=25, categoria=None, estado=None, año_publicacion=None):
+        """
+        Busca libros que contengan todos los términos de la consulta. El último término
+        se trata como prefijo, para que la búsqueda funcione mientras se escribe.
+
+        Retorna (ids ordenados por relevancia para la página pedida, total de coincidencias).
+        """
+        terminos = tokenizar(consulta)
+        if not terminos:
+            return [], 0
+
+        with self._lock:
+            # Para cada término: {libro_id: frecuencia} (el último combina todas sus expansiones)
+            listas = []
+            for posicion, termino in enumerate(terminos):
+                if posicion == len(terminos) - 1:
+                    combinada = {}
+                    for palabra in self._expandir_prefijo(termino):
+                        for libro_id, frecuencia in self.postings[palabra].items():
+                            combinada[libro_id] = max(frecuencia, combinada.get(libro_id, 0))
+                    listas.append(combinada)
+                else:
+                    listas.append(self.postings.get(termino, {}))
+
+            # Se intersecta empezando por la lista más corta
+            mas_corta = min(listas, key=len)
+            candidatos = [libro_id for libro_id in mas_corta if all(libro_id in lista for lista in listas)]
+
+            if categoria or estado or año_publicacion is not None:
+                categoria = normalizar(categoria) if categoria else None
+                filtrados = []
+                for libro_id in candidatos:
+                    _, _, cat, est, año = self.documentos[libro_id]
+                    if ((categoria is None or cat == categoria) and (not estado or est == estado)
+                            and (año_publicacion is None or año == año_publicacion)):
+                        filtrados.append(libro_id)
+                candidatos = filtrados
+
+            total_documentos = len(self.documentos) or 1
+            promedio = (self.longitud_total / total_documentos) or 1
+            idfs = [math.log(1 + (total_documentos - len(lista) + 0.5) / (len(lista) + 0.5)) for lista in listas]
+
+            def puntaje(libro_id):
+                longitud = self.documentos[libro_id][1]
+                total = 0.0
+                for idf, lista in zip(idfs, listas):
+                    frecuencia = lista[libro_id]
+                    total += idf * frecuencia * (K1 + 1) / (frecuencia + K1 * (1 - B + B * longitud / promedio))
+                return total
+
+            # Solo se ordenan los resultados hasta la página pedida
+            desde = (pagina - 1) * por_pagina
+            mejores = heapq.nlargest(desde + por_pagina, candidatos, key=lambda libro_id: (puntaje(libro_id), -libro_id))
+            return mejores[desde:], len(candidatos)
+
+
+def _filas_libros():
+    """ Recorre la tabla libro por lotes, solo con las columnas que se indexan. """
+    consulta = db.session.query(*[getattr(Libro, columna) for columna in COLUMNAS_INDICE]).yield_per(1000)
+    for fila in consulta:
+        yield fila._asdict()
+
+
+def _construir(indice):
+    # El cursor se toma antes de recorrer la tabla: lo cambiado durante la lectura se vuelve a aplicar
+    cursor = cursor_actual()
+    indice.construir(_filas_libros(), cursor)
+
+
+def _ponerse_al_dia(indice):
+    """
+    Aplica al índice los cambios del registro posteriores a su cursor (los hechos por otros
+    workers). Si el cursor quedó antes del horizonte del registro, reconstruye el índice.
+    """
+    if cursor_actual() <= indice.cursor:
+        return
+    with indice._lock:
+        try:
+            hay_mas = True
+            while hay_mas:
+                cambios, cursor, hay_mas = cambios_desde(indice.cursor, LOTE_CAMBIOS, COLUMNAS_INDICE)
+                for cambio in cambios:
+                    if cambio['libro'] is None:
+                        indice.eliminar(cambio['id'])
+                    else:
+                        indice.agregar(cambio['libro'])
+                indice.cursor = cursor
+        except CursorVencido:
+            _construir(indice)
+
+
+def obtener_indice():
+    """
+    Retorna el índice de la aplicación actual, construyéndolo la primera vez y poniéndolo al
+    día con el registro de cambios las siguientes.
+    """
+    indice = current_app.extensions['busqueda']
+    if not indice.construido:
+        with indice._lock:
+            if not indice.construido:
+                _construir(indice)
+                return indice
+    _ponerse_al_dia(indice)
+    return indice
+
+
+def buscar_libros(consulta, pagina=1, por_pagina=25, columnas=None, **filtros):
+    """
+    Busca en el índice y carga los libros de la página en el orden de relevancia.
+    Con `columnas` retorna diccionarios con solo esas columnas en lugar de entidades Libro.
+
+    Retorna (libros, total de coincidencias).
+    """
+    ids, total = obtener_indice().buscar(consulta, pagina=pagina, por_pagina=por_pagina, **filtros)
+    if not ids:
+        return [], total
+    if columnas:
+        por_id = filas_por_id(ids, columnas)
+    else:
+        por_id = {libro.id: libro for libro in Libro.query.filter(Libro.id.in_(ids))}
+    return [por_id[libro_id] for libro_id in ids if libro_id in por_id], total
+
+
+def _sincronizar(app, cambios):
+    """ Aplica al índice los cambios de libros confirmados en la base de datos. """
+    indice = app.extensions.get('busqueda') if app is not None else None
+    if indice is None or not indice.construido:
+        return
+    for cambio in cambios:
+        if cambio['accion'] == 'recargar':
+            # Cambio masivo sin detalle por fila: se reconstruye en la próxima búsqueda
+            indice.construido = False
+            return
+        if cambio['accion'] == 'eliminar':
+            indice.eliminar(cambio['id'])
+        else:
+            indice.agregar(cambio['datos'])
+
+
+def init_app(app):
+    """ Registra el índice de búsqueda en la aplicación. """
+    app.extensions['busqueda'] = IndiceInvertido()
+    libros_confirmados.connect(_sincronizar)
@@ -0,0 +1,224 @@
+import hashlib
+import os
+import pickle
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+from app.eventos import libros_confirmados, usuarios_confirmados
+from app.metricas_routes import registrar_metrica
+
+# Valor centinela para distinguir "no está en caché" de un valor None guardado
+_AUSENTE = object()
+
+
+class CacheLRU:
+    """
+    Caché en memoria del proceso con expulsión LRU y expiración por tiempo (TTL).
+
+    Es segura entre hilos y lleva contadores de aciertos, fallos y expulsiones
+    para poder medir su efectividad.
+    """
+
+    def __init__(self, max_entradas=1024, ttl=None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._datos = OrderedDict()   # clave -> (expira, valor)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.invalidaciones = 0
+
+    def obtener(self, clave, defecto=None):
+        """ Retorna el valor guardado o `defecto` si no existe o ya expiró. """
+        with self._lock:
+            entrada = self._datos.get(clave, _AUSENTE)
+            if entrada is not _AUSENTE:
+                expira, valor = entrada
+                if expira is None or expira > time.monotonic():
+                    self._datos.move_to_end(clave)
+                    self.aciertos += 1
+                    return valor
+                del self._datos[clave]
+            self.fallos += 1
+            return defecto
+
+    def guardar(self, clave, valor, ttl=None):
+        """ Guarda un valor, expulsando el menos usado si se supera el máximo de entradas. """
+        ttl = self.ttl if ttl is None else ttl
+        expira = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._datos[clave] = (expira, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                self.expulsiones += 1
+
+    def eliminar(self, clave):
+        """ Invalida una entrada. """
+        with self._lock:
+            if self._datos.pop(clave, _AUSENTE) is not _AUSENTE:
+                self.invalidaciones += 1
+
+    def limpiar(self, espacio=None):
+        """
+        Invalida todas las entradas, o solo las del espacio indicado
+        (claves de texto con la forma 'espacio:...').
+        """
+        with self._lock:
+            if espacio is None:
+                self.invalidaciones += len(self._datos)
+                self._datos.clear()
+                return
+            prefijo = espacio + ':'
+            claves = [clave for clave in self._datos if isinstance(clave, str) and clave.startswith(prefijo)]
+            for clave in claves:
+                del self._datos[clave]
+            self.invalidaciones += len(claves)
+
+    def estadisticas(self):
+        """ Contadores de uso de la caché. """
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._datos),
+                'max_entradas': self.max_entradas,
+                'ttl': self.ttl,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else None,
+                'expulsiones': self.expulsiones,
+                'invalidaciones': self.invalidaciones,
+            }
+
+
+class CacheArchivos:
+    """
+    Caché en archivos locales (un archivo por entrada, agrupados por espacio).
+    La comparten todos los workers del mismo servidor; sirve como sustituto local
+    de una caché compartida. Misma interfaz que CacheLRU.
+    """
+
+    def __init__(self, directorio, ttl=None):
+        self.directorio = directorio
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+        os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, clave):
+        espacio = str(clave).split(':', 1)[0]
+        nombre = hashlib.sha1(str(clave).encode('utf-8')).hexdigest()
+        return os.path.join(self.directorio, espacio, nombre)
+
+    def obtener(self, clave, defecto=None):
+        try:
+            with open(self._ruta(clave), 'rb') as archivo:
+                expira, valor = pickle.load(archivo)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.fallos += 1
+            return defecto
+        if expira is not None and expira <= time.time():
+            self.fallos += 1
+            return defecto
+        self.aciertos += 1
+        return valor
+
+    def guardar(self, clave, valor, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        ruta = self._ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # Se escribe en un temporal y se renombra, para que otro worker nunca lea un archivo a medias
+        temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporal, 'wb') as archivo:
+            pickle.dump((time.time() + ttl if ttl else None, valor), archivo, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporal, ruta)
+
+    def eliminar(self, clave):
+        try:
+            os.remove(self._ruta(clave))
+            self.invalidaciones += 1
+        except FileNotFoundError:
+            pass
+
+    def limpiar(self, espacio=None):
+        """ Borra todas las entradas, o solo las de un espacio. """
+        carpetas = [espacio] if espacio else os.listdir(self.directorio)
+        for carpeta in carpetas:
+            ruta = os.path.join(self.directorio, carpeta)
+            if os.path.isdir(ruta):
+                self.invalidaciones += len(os.listdir(ruta))
+                shutil.rmtree(ruta, ignore_errors=True)
+
+    def estadisticas(self):
+        entradas, tamaño = 0, 0
+        for raiz, _, archivos in os.walk(self.directorio):
+            for nombre in archivos:
+                entradas += 1
+                tamaño += os.path.getsize(os.path.join(raiz, nombre))
+        consultas = self.aciertos + self.fallos
+        return {
+            'backend': 'archivos',
+            'entradas': entradas,
+            'bytes': tamaño,
+            'ttl': self.ttl,
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else None,
+            'invalidaciones': self.invalidaciones,
+        }
+
+
+def crear_cache_paginas(app):
+    """ Crea la caché de páginas del catálogo según CACHE_PAGINAS ('memoria', 'archivos' o '' para desactivarla). """
+    backend = app.config['CACHE_PAGINAS']
+    if backend == 'memoria':
+        return CacheLRU(max_entradas=app.config['CACHE_PAGINAS_MAX'], ttl=app.config['CACHE_PAGINAS_TTL'])
+    if backend == 'archivos':
+        return CacheArchivos(app.config['CACHE_PAGINAS_DIR'], ttl=app.config['CACHE_PAGINAS_TTL'])
+    if backend:
+        raise ValueError(f'Unknown CACHE_PAGINAS backend: {backend}')
+    return None
+
+
+def _invalidar_catalogo(app, cambios):
+    """ Cualquier cambio confirmado en libros descarta las páginas del catálogo guardadas. """
+    cache = app.extensions.get('cache_paginas') if app is not None else None
+    if cache is not None:
+        cache.limpiar('catalogo')
+
+
+def _invalidar_usuarios(app, ids, roles):
+    """ Quita de la caché a los usuarios modificados (o todos, si cambió algún rol). """
+    cache = app.extensions.get('cache_usuarios') if app is not None else None
+    if cache is None:
+        return
+    if roles:
+        cache.limpiar()
+    else:
+        for user_id in ids:
+            cache.eliminar(user_id)
+
+
+def init_app(app):
+    """
+    Crea la caché de usuarios usada por load_user, salvo que CACHE_USUARIOS_TTL sea 0.
+    Cada worker tiene su propia caché: un cambio hecho en otro proceso se ve al vencer el TTL.
+    """
+    if app.config['CACHE_USUARIOS_TTL']:
+        app.extensions['cache_usuarios'] = CacheLRU(
+            max_entradas=app.config['CACHE_USUARIOS_MAX'],
+            ttl=app.config['CACHE_USUARIOS_TTL'],
+        )
+        usuarios_confirmados.connect(_invalidar_usuarios)
+        registrar_metrica(app, 'cache_usuarios', app.extensions['cache_usuarios'].estadisticas)
+
+    # Caché de páginas y consultas del catálogo (dashboard)
+    cache_paginas = crear_cache_paginas(app)
+    if cache_paginas is not None:
+        app.extensions['cache_paginas'] = cache_paginas
+        libros_confirmados.connect(_invalidar_catalogo)
+        registrar_metrica(app, 'cache_paginas', cache_paginas.estadisticas)
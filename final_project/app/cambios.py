@@ -0,0 +1,264 @@
+"""
+Registro de cambios de libros (change feed) para que los clientes sincronicen solo lo que cambió.
+
+Cada creación, modificación o eliminación de un libro agrega una fila a cambio_libro en la misma
+transacción que el cambio: por el ORM (señal libros_escritos de app/eventos.py) o, en las inserciones masivas con
+Core, con registrar_inserciones. GET /cambios?since=<cursor> devuelve los libros cambiados desde
+entonces con sus datos actuales, y las eliminaciones como lápidas (tombstones).
+
+El cursor no es el id de la fila: los ids se asignan al insertar, y una transacción que confirma
+después puede tener un id menor que uno ya leído por un cliente, que lo saltearía. Por eso las
+filas entran sin secuencia y secuenciar les asigna números crecientes cuando ya están confirmadas
+(después de cada commit que cambió libros y antes de cada lectura), bajo el bloqueo de una fila
+de version_tabla. Los lectores solo ven filas con secuencia, y toda fila que la recibe después
+tiene una mayor que las ya leídas.
+
+Compactación (compactar): en las entradas más viejas que CAMBIOS_RETENCION_DIAS se borran las
+que tienen otra más nueva del mismo libro (el cliente igual recibe la última) y las lápidas.
+Borrar lápidas sí pierde información: la mayor secuencia borrada queda como horizonte y los
+cursores anteriores deben volver a hacer una carga completa.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import bindparam, delete, func, insert, literal, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.eventos import libros_confirmados, libros_escritos
+from app.exportacion import filas_por_id
+from app.metricas_routes import registrar_metrica
+from app.models import db, CambioLibro, Libro, VersionTabla
+
+logger = logging.getLogger('app.cambios')
+
+# Fila de version_tabla donde se guarda el horizonte del registro (mayor secuencia compactada con lápidas)
+HORIZONTE = 'cambio_libro'
+
+# Fila de version_tabla con la última secuencia asignada; su bloqueo ordena a los secuenciadores
+SECUENCIA = 'cambio_libro_secuencia'
+
+# Filas que secuencia cada sentencia
+TAMAÑO_SECUENCIA = 1000
+
+# Ids por sentencia DELETE de la compactación
+TAMAÑO_BORRADO = 900
+
+# Contadores publicados en /metricas
+contadores = {'registrados': 0, 'secuenciados': 0, 'consultas': 0, 'cambios_enviados': 0, 'cursores_vencidos': 0,
+              'compactados': 0}
+
+
+@libros_escritos.connect
+def _registrar_cambios(session, cambios):
+    """ Agrega al registro los libros creados, modificados y eliminados en el flush. """
+    ahora = datetime.utcnow()
+    filas = [
+        {'libro_id': cambio['id'], 'accion': cambio['accion'], 'creado_en': ahora,
+         'version': (cambio['datos'] or cambio['anterior'])['version']}
+        for cambio in cambios
+    ]
+    session.connection().execute(insert(CambioLibro), filas)
+    contadores['registrados'] += len(filas)
+
+
+def ultimo_id_libro(conexion):
+    """ Mayor id de libro actual (para registrar después las inserciones masivas). """
+    return conexion.execute(select(func.max(Libro.id))).scalar() or 0
+
+
+def registrar_inserciones(conexion, desde_id):
+    """
+    Registra como creados los libros con id mayor que `desde_id`, con un INSERT ... SELECT.
+    Para las inserciones masivas con Core, que no pasan por el flush del ORM; va en su misma
+    transacción. Si otra transacción insertó libros en el medio también quedan registrados,
+    lo que no afecta a los clientes (aplicar un libro dos veces es idempotente). El orden en que
+    los ven los clientes lo da la secuencia que reciben al confirmarse, no el id.
+    """
+    resultado = conexion.execute(
+        insert(CambioLibro).from_select(
+            ['libro_id', 'accion', 'version', 'creado_en'],
+            select(Libro.id, literal('crear'), Libro.version, literal(datetime.utcnow())).where(Libro.id > desde_id),
+        )
+    )
+    contadores['registrados'] += max(resultado.rowcount, 0)
+
+
+def secuenciar(conexion):
+    """
+    Asigna secuencia a las entradas confirmadas que todavía no la tienen, en orden de id, y
+    retorna cuántas secuenció. Va en su propia transacción: el bloqueo de la fila SECUENCIA
+    la ordena respecto de los demás secuenciadores, y las entradas de transacciones sin
+    confirmar no se ven y reciben una secuencia mayor cuando se confirman.
+    """
+    ultima = conexion.execute(
+        select(VersionTabla.version).where(VersionTabla.tabla == SECUENCIA).with_for_update()
+    ).scalar()
+    if ultima is None:
+        # Base creada sin la migración: se arranca desde la mayor secuencia existente
+        ultima = conexion.execute(select(func.max(CambioLibro.secuencia))).scalar() or 0
+        conexion.execute(insert(VersionTabla).values(tabla=SECUENCIA, version=ultima, modificado_en=datetime.utcnow()))
+
+    pendientes = conexion.execute(
+        select(CambioLibro.id).where(CambioLibro.secuencia.is_(None)).order_by(CambioLibro.id).limit(TAMAÑO_SECUENCIA)
+    ).scalars().all()
+    if not pendientes:
+        return 0
+    conexion.execute(
+        update(CambioLibro.__table__)
+        .where(CambioLibro.id == bindparam('entrada'), CambioLibro.secuencia.is_(None))
+        .values(secuencia=bindparam('numero')),
+        [{'entrada': id, 'numero': ultima + orden} for orden, id in enumerate(pendientes, 1)],
+    )
+    conexion.execute(
+        update(VersionTabla).where(VersionTabla.tabla == SECUENCIA)
+        .values(version=ultima + len(pendientes), modificado_en=datetime.utcnow().replace(microsecond=0))
+    )
+    contadores['secuenciados'] += len(pendientes)
+    return len(pendientes)
+
+
+def secuenciar_pendientes():
+    """
+    Secuencia todas las entradas confirmadas pendientes. Un error (por ejemplo, el bloqueo de otro
+    secuenciador en SQLite) solo se registra: las entradas quedan para el próximo llamado.
+    """
+    try:
+        # Sin pendientes no se toma el bloqueo (lo consultan las lecturas del registro y cada búsqueda)
+        with db.engine.connect() as conexion:
+            if conexion.execute(select(CambioLibro.id).where(CambioLibro.secuencia.is_(None)).limit(1)).first() is None:
+                return
+        while True:
+            with db.engine.begin() as conexion:
+                if secuenciar(conexion) < TAMAÑO_SECUENCIA:
+                    return
+    except SQLAlchemyError:
+        logger.exception('Could not assign sequence numbers to the change log')
+
+
+def _secuenciar_confirmados(sender, cambios, **kwargs):
+    secuenciar_pendientes()
+
+
+def cursor_actual():
+    """
+    Cursor desde el que sigue un cliente que acaba de hacer una carga completa (0 si el registro
+    está vacío). Se toma antes de leer la tabla: lo cambiado durante la lectura se repite en el
+    próximo /cambios, lo que no afecta al cliente.
+    """
+    secuenciar_pendientes()
+    return db.session.execute(select(func.max(CambioLibro.secuencia))).scalar() or 0
+
+
+def horizonte():
+    """ Cursor más viejo que todavía se puede seguir (los anteriores perdieron lápidas al compactar). """
+    return db.session.execute(select(VersionTabla.version).where(VersionTabla.tabla == HORIZONTE)).scalar() or 0
+
+
+class CursorVencido(ValueError):
+    """ El cursor es anterior al horizonte: el cliente debe hacer una carga completa. """
+
+
+def cambios_desde(cursor, limite=1000, columnas=None):
+    """
+    Cambios posteriores a `cursor`, como máximo `limite` entradas del registro. Cada libro aparece
+    una sola vez con su estado actual: {'id', 'accion', 'version', 'libro'} (libro es None en las
+    lápidas). Solo se leen las entradas secuenciadas, en orden de secuencia.
+
+    Retorna (cambios, nuevo cursor, hay_mas). Lanza CursorVencido si el cursor ya no es válido.
+    """
+    contadores['consultas'] += 1
+    if cursor < horizonte():
+        contadores['cursores_vencidos'] += 1
+        raise CursorVencido('The cursor is older than the change log, resync with /listar_libro')
+
+    secuenciar_pendientes()
+    entradas = db.session.execute(
+        select(CambioLibro.secuencia, CambioLibro.libro_id, CambioLibro.accion, CambioLibro.version)
+        .where(CambioLibro.secuencia > cursor)
+        .order_by(CambioLibro.secuencia)
+        .limit(limite + 1)
+    ).all()
+    hay_mas = len(entradas) > limite
+    entradas = entradas[:limite]
+    if not entradas:
+        return [], cursor, False
+
+    # La última entrada de cada libro decide si es lápida o si se envían sus datos actuales
+    ultimas = {}
+    for entrada in entradas:
+        ultimas.pop(entrada.libro_id, None)
+        ultimas[entrada.libro_id] = entrada
+    vivos = [id for id, entrada in ultimas.items() if entrada.accion != 'eliminar']
+    datos = filas_por_id(vivos, columnas) if vivos else {}
+
+    cambios = []
+    for id, entrada in ultimas.items():
+        libro = datos.get(id)
+        # Un libro eliminado por una entrada todavía sin secuencia se informa como lápida desde ya
+        accion = 'eliminar' if libro is None else entrada.accion
+        cambios.append({'id': id, 'accion': accion, 'version': entrada.version, 'libro': libro})
+    contadores['cambios_enviados'] += len(cambios)
+    return cambios, entradas[-1].secuencia, hay_mas
+
+
+def compactar(conexion, dias=None):
+    """
+    Compacta las entradas más viejas que `dias` (CAMBIOS_RETENCION_DIAS por defecto): borra las
+    reemplazadas por una entrada más nueva del mismo libro y las lápidas, y avanza el horizonte.
+    Retorna {'reemplazadas': n, 'lapidas': n, 'horizonte': id}.
+    """
+    dias = current_app.config['CAMBIOS_RETENCION_DIAS'] if dias is None else dias
+    limite = datetime.utcnow() - timedelta(days=dias)
+
+    ultimas = select(CambioLibro.libro_id, func.max(CambioLibro.id).label('ultima')).group_by(CambioLibro.libro_id).subquery()
+    # Las entradas de un mismo libro se confirman en orden de id (el bloqueo de su fila las ordena)
+    viejas = (
+        select(CambioLibro.id, CambioLibro.secuencia, CambioLibro.accion, ultimas.c.ultima)
+        .join(ultimas, ultimas.c.libro_id == CambioLibro.libro_id)
+        .where(CambioLibro.creado_en < limite, CambioLibro.secuencia.is_not(None))
+    )
+    reemplazadas, lapidas, secuencias_lapidas = [], [], []
+    for id, secuencia, accion, ultima in conexion.execute(viejas):
+        if id < ultima:
+            reemplazadas.append(id)
+        elif accion == 'eliminar':
+            lapidas.append(id)
+            secuencias_lapidas.append(secuencia)
+
+    borrar = reemplazadas + lapidas
+    for inicio in range(0, len(borrar), TAMAÑO_BORRADO):
+        conexion.execute(delete(CambioLibro).where(CambioLibro.id.in_(borrar[inicio:inicio + TAMAÑO_BORRADO])))
+
+    nuevo_horizonte = max(secuencias_lapidas, default=0)
+    if nuevo_horizonte:
+        ahora = datetime.utcnow().replace(microsecond=0)
+        actualizado = conexion.execute(
+            update(VersionTabla).where(VersionTabla.tabla == HORIZONTE, VersionTabla.version < nuevo_horizonte)
+            .values(version=nuevo_horizonte, modificado_en=ahora)
+        ).rowcount
+        existe = conexion.execute(select(VersionTabla.tabla).where(VersionTabla.tabla == HORIZONTE)).first()
+        if not actualizado and not existe:
+            conexion.execute(insert(VersionTabla).values(tabla=HORIZONTE, version=nuevo_horizonte, modificado_en=ahora))
+
+    contadores['compactados'] += len(borrar)
+    horizonte_actual = conexion.execute(
+        select(VersionTabla.version).where(VersionTabla.tabla == HORIZONTE)
+    ).scalar() or 0
+    return {'reemplazadas': len(reemplazadas), 'lapidas': len(lapidas), 'horizonte': horizonte_actual}
+
+
+def estadisticas():
+    """ Tamaño del registro, entradas sin secuencia, horizonte y contadores de este worker. """
+    entradas = db.session.execute(select(func.count(CambioLibro.id))).scalar()
+    sin_secuencia = db.session.execute(
+        select(func.count(CambioLibro.id)).where(CambioLibro.secuencia.is_(None))
+    ).scalar()
+    return dict(contadores, entradas=entradas, sin_secuencia=sin_secuencia, horizonte=horizonte(),
+                retencion_dias=current_app.config['CAMBIOS_RETENCION_DIAS'])
+
+
+def init_app(app):
+    """ Secuencia las entradas después de cada commit que cambió libros y publica las métricas. """
+    libros_confirmados.connect(_secuenciar_confirmados)
+    registrar_metrica(app, 'cambios', estadisticas)
@@ -0,0 +1,121 @@
+"""
+Control de concurrencia optimista para libros, sin bloquear filas.
+
+Libro.version es el version_id_col del ORM: cada UPDATE o DELETE de un libro lleva
+"WHERE id = ? AND version = ?" e incrementa la versión. Si otra transacción modificó el libro
+desde que se leyó, la sentencia no afecta ninguna fila y el flush lanza StaleDataError, que
+aquí se convierte en ConflictoDeVersion. Como los cambios siguen pasando por el ORM, los
+listeners de eventos, versiones y estadísticas se aplican igual que en cualquier escritura.
+
+La API publica la versión como ETag fuerte ("libro-<id>-v<version>") para usarla con If-Match.
+"""
+from flask import current_app
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.metricas_routes import registrar_metrica
+from app.models import db, Libro
+
+# Acción -> (estado requerido, estado nuevo)
+TRANSICIONES = {
+    'prestar': ('Disponible', 'Prestado'),
+    'devolver': ('Prestado', 'Disponible'),
+}
+
+# Contadores publicados en /metricas
+contadores = {'prestamos': 0, 'devoluciones': 0, 'conflictos_estado': 0, 'conflictos_version': 0, 'reintentos': 0}
+
+
+class ConflictoDeVersion(Exception):
+    """ Otra transacción modificó el libro desde que se leyó. """
+
+
+def etag_libro(id, version):
+    """ ETag fuerte de un libro: cambia con cada escritura de la fila. """
+    return f'libro-{id}-v{version}'
+
+
+def cumple_if_match(if_match, libro):
+    """
+    True si la cabecera If-Match (request.if_match) permite modificar el libro: sin cabecera,
+    con '*' o con el ETag de su versión actual (comparación fuerte, como pide HTTP).
+    """
+    return not if_match or if_match.contains(etag_libro(libro.id, libro.version))
+
+
+def version_de_if_match(if_match, id):
+    """
+    Versión del libro pedida con If-Match, o None si no hay condición (sin cabecera o '*').
+    Si ningún ETag corresponde a este libro retorna 0, una versión que nunca existe.
+    """
+    if not if_match or if_match.star_tag:
+        return None
+    prefijo = f'libro-{id}-v'
+    for etag in if_match.as_set():
+        if etag.startswith(prefijo) and etag[len(prefijo):].isdigit():
+            return int(etag[len(prefijo):])
+    return 0
+
+
+def confirmar():
+    """ Confirma la sesión; si algún libro cambió en el medio, deshace todo y lanza ConflictoDeVersion. """
+    try:
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        contadores['conflictos_version'] += 1
+        raise ConflictoDeVersion('The book was modified by another request')
+
+
+def cambiar_estado(id, accion, version=None, reintentos=None):
+    """
+    Presta o devuelve un libro con un compare-and-swap sobre su estado. Retorna (resultado, libro):
+
+    - 'ok': el estado cambió.
+    - 'no_encontrado': el libro no existe (libro es None).
+    - 'conflicto_estado': el libro no estaba en el estado requerido (ya prestado / ya disponible).
+    - 'conflicto_version': el cliente pidió una `version` concreta y el libro ya no la tiene.
+
+    Sin `version`, si otra petición escribe el libro entre la lectura y el UPDATE se relee
+    y se reintenta hasta `reintentos` veces (PRESTAMOS_REINTENTOS por defecto).
+    """
+    desde, hacia = TRANSICIONES[accion]
+    reintentos = current_app.config['PRESTAMOS_REINTENTOS'] if reintentos is None else reintentos
+
+    for intento in range(reintentos + 1):
+        if intento:
+            contadores['reintentos'] += 1
+        # populate_existing: siempre la fila actual, aunque el libro ya esté en la sesión
+        libro = db.session.get(Libro, id, populate_existing=True)
+        if libro is None:
+            return 'no_encontrado', None
+        if version is not None and libro.version != version:
+            contadores['conflictos_version'] += 1
+            return 'conflicto_version', libro
+        if libro.estado != desde:
+            contadores['conflictos_estado'] += 1
+            return 'conflicto_estado', libro
+
+        libro.estado = hacia
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            if version is not None:
+                contadores['conflictos_version'] += 1
+                return 'conflicto_version', db.session.get(Libro, id)
+            continue
+        contadores['prestamos' if accion == 'prestar' else 'devoluciones'] += 1
+        return 'ok', libro
+
+    contadores['conflictos_version'] += 1
+    return 'conflicto_version', db.session.get(Libro, id)
+
+
+def estadisticas():
+    """ Métricas de préstamos y conflictos de escritura. """
+    return dict(contadores, reintentos_maximos=current_app.config['PRESTAMOS_REINTENTOS'])
+
+
+def init_app(app):
+    """ Publica las métricas de concurrencia. """
+    registrar_metrica(app, 'concurrencia', estadisticas)
@@ -24,7 +24,73 @@ CREATE TABLE libro (
     isbn VARCHAR(20),
     categoria VARCHAR(50),
     estado ENUM('Disponible', 'Prestado'),
-    año_publicacion INT
+    año_publicacion INT,
+    bibliotecario_id INT NOT NULL,
+    -- Control de concurrencia optimista: cada UPDATE compara e incrementa (ver app/concurrencia.py)
+    version INT NOT NULL DEFAULT 1,
+    FOREIGN KEY (bibliotecario_id) REFERENCES user(id)
+);
+
+-- Índices para filtros, orden por columna y búsqueda por ISBN (ver app/migraciones)
+CREATE INDEX ix_libro_titulo ON libro (titulo);
+CREATE INDEX ix_libro_autor ON libro (autor);
+CREATE INDEX ix_libro_isbn ON libro (isbn);
+CREATE INDEX ix_libro_categoria ON libro (categoria);
+CREATE INDEX ix_libro_año_publicacion ON libro (año_publicacion);
+CREATE INDEX ix_libro_estado_categoria ON libro (estado, categoria);
+CREATE INDEX ix_libro_bibliotecario_estado ON libro (bibliotecario_id, estado);
+
+-- Versión de cada tabla, para ETag / Last-Modified de la API (ver app/versiones.py)
+CREATE TABLE version_tabla (
+    tabla VARCHAR(50) NOT NULL,
+    fragmento INT NOT NULL DEFAULT 0,
+    version INT NOT NULL,
+    modificado_en DATETIME NOT NULL,
+    PRIMARY KEY (tabla, fragmento)
 );
 
 INSERT INTO role (name) VALUES ('Admin'), ('Bibliotecario'), ('Lector');
+INSERT INTO version_tabla (tabla, version, modificado_en) VALUES ('libro', 1, UTC_TIMESTAMP());
+
+-- Contadores del catálogo, mantenidos en cada escritura de libros (ver app/estadisticas.py).
+-- Se inicializan vacíos; "python estadisticas.py recalcular" los rehace desde la tabla libro.
+CREATE TABLE estadistica_libro (
+    dimension VARCHAR(30) NOT NULL,
+    valor VARCHAR(100) NOT NULL,
+    fragmento INT NOT NULL DEFAULT 0,
+    cantidad INT NOT NULL,
+    PRIMARY KEY (dimension, valor, fragmento)
+);
+INSERT INTO estadistica_libro (dimension, valor, cantidad) VALUES ('total', '', 0);
+
+-- Tareas en segundo plano con su progreso (ver app/tareas.py)
+CREATE TABLE tarea (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    tipo VARCHAR(50) NOT NULL,
+    estado VARCHAR(20) NOT NULL,
+    progreso FLOAT NOT NULL,
+    parametros JSON,
+    resultado JSON,
+    error TEXT,
+    cancelar BOOLEAN NOT NULL,
+    usuario_id INT,
+    creada_en DATETIME NOT NULL,
+    iniciada_en DATETIME,
+    terminada_en DATETIME,
+    proceso VARCHAR(100),
+    latido_en DATETIME,
+    FOREIGN KEY (usuario_id) REFERENCES user(id)
+);
+CREATE INDEX ix_tarea_estado ON tarea (estado);
+
+-- Registro de cambios de libros para la sincronización incremental (ver app/cambios.py)
+CREATE TABLE cambio_libro (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    libro_id INT NOT NULL,
+    accion VARCHAR(10) NOT NULL,
+    version INT,
+    creado_en DATETIME NOT NULL,
+    secuencia INT
+);
+CREATE INDEX ix_cambio_libro_libro_id ON cambio_libro (libro_id);
+CREATE UNIQUE INDEX ix_cambio_libro_secuencia ON cambio_libro (secuencia);
@@ -0,0 +1,167 @@
+"""
+Estadísticas del catálogo mantenidas de forma incremental.
+
+Cada flush que crea, modifica o elimina libros suma o resta sus contadores en la tabla
+estadistica_libro, dentro de la misma transacción. Así el panel de estadísticas lee unas
+pocas filas en lugar de agrupar toda la tabla libro. recalcular() y verificar() rehacen
+los contadores con GROUP BY para corregir o detectar diferencias.
+
+Los deltas de la transacción se acumulan y se escriben una sola vez justo antes del COMMIT,
+en orden de clave y en uno de los CONTADORES_FRAGMENTOS fragmentos de cada contador: las
+escrituras del catálogo no se esperan entre sí por las mismas filas de contadores, y un
+préstamo y una devolución simultáneos no pueden bloquearse mutuamente.
+"""
+from collections import Counter
+
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.eventos import libros_escritos
+from app.models import db, EstadisticaLibro, Libro, User
+from app.versiones import fragmento_al_azar, fragmento_de
+
+def claves_de(libro):
+    """
+    Contadores (dimensión, valor) a los que aporta un libro, dado como diccionario de columnas.
+    'total' tiene un único valor '' y 'prestados_por_bibliotecario' solo cuenta libros prestados.
+    """
+    claves = [
+        ('total', ''),
+        ('categoria', str(libro['categoria'])),
+        ('estado', str(libro['estado'])),
+        ('año_publicacion', str(libro['año_publicacion'])),
+    ]
+    if libro['estado'] == 'Prestado':
+        claves.append(('prestados_por_bibliotecario', str(libro['bibliotecario_id'])))
+    return claves
+
+
+def sumar(conexion, deltas, fragmento=None):
+    """
+    Aplica un Counter {(dimensión, valor): delta} sobre un fragmento de estadistica_libro
+    (`conexion` puede ser una sesión o una conexión de SQLAlchemy). Las filas se actualizan
+    en orden de clave, el mismo en todas las transacciones.
+    """
+    fragmento = fragmento_al_azar() if fragmento is None else fragmento
+    for (dimension, valor), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        resultado = conexion.execute(
+            update(EstadisticaLibro)
+            .where(EstadisticaLibro.dimension == dimension, EstadisticaLibro.valor == valor,
+                   EstadisticaLibro.fragmento == fragmento)
+            .values(cantidad=EstadisticaLibro.cantidad + delta)
+        )
+        if resultado.rowcount == 0:
+            conexion.execute(insert(EstadisticaLibro).values(
+                dimension=dimension, valor=valor, fragmento=fragmento, cantidad=delta))
+
+
+def contar_filas(conexion, filas):
+    """ Suma los contadores de libros insertados fuera del ORM (importación masiva). """
+    deltas = Counter()
+    for fila in filas:
+        deltas.update(claves_de(fila))
+    sumar(conexion, deltas)
+
+
+@libros_escritos.connect
+def _actualizar_contadores(session, cambios):
+    """ Acumula los deltas de los libros creados, modificados y eliminados del flush. """
+    deltas = session.info.setdefault('deltas_estadisticas', Counter())
+    for cambio in cambios:
+        if cambio['datos'] is not None:
+            deltas.update(claves_de(cambio['datos']))
+        if cambio['anterior'] is not None:
+            deltas.subtract(claves_de(cambio['anterior']))
+
+
+@event.listens_for(Session, 'before_commit')
+def _aplicar_contadores(session):
+    """ Escribe los deltas acumulados de la transacción (después del último flush). """
+    session.flush()
+    deltas = session.info.pop('deltas_estadisticas', None)
+    if deltas and any(deltas.values()):
+        sumar(session.connection(), deltas, fragmento_de(session))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_contadores(session):
+    session.info.pop('deltas_estadisticas', None)
+
+
+def calcular(conexion):
+    """ Cuenta desde cero con GROUP BY sobre la tabla libro. Retorna un Counter {(dimensión, valor): cantidad}. """
+    reales = Counter()
+    reales[('total', '')] = conexion.execute(select(func.count()).select_from(Libro)).scalar_one()
+    for dimension in ('categoria', 'estado', 'año_publicacion'):
+        columna = Libro.__table__.c[dimension]
+        for valor, cantidad in conexion.execute(select(columna, func.count()).group_by(columna)):
+            reales[(dimension, str(valor))] = cantidad
+    prestados = (
+        select(Libro.bibliotecario_id, func.count())
+        .where(Libro.estado == 'Prestado')
+        .group_by(Libro.bibliotecario_id)
+    )
+    for valor, cantidad in conexion.execute(prestados):
+        reales[('prestados_por_bibliotecario', str(valor))] = cantidad
+    return reales
+
+
+def guardados(conexion):
+    """ Contadores actuales de estadistica_libro (suma de sus fragmentos), sin los que quedaron en cero. """
+    filas = conexion.execute(
+        select(EstadisticaLibro.dimension, EstadisticaLibro.valor, func.sum(EstadisticaLibro.cantidad))
+        .group_by(EstadisticaLibro.dimension, EstadisticaLibro.valor)
+    )
+    return Counter({(dimension, valor): int(cantidad) for dimension, valor, cantidad in filas if cantidad})
+
+
+def verificar(conexion):
+    """
+    Compara los contadores guardados con un recálculo completo.
+    Retorna {(dimensión, valor): (guardado, real)} solo para los que difieren.
+    """
+    actuales, reales = guardados(conexion), calcular(conexion)
+    return {
+        clave: (actuales.get(clave, 0), reales.get(clave, 0))
+        for clave in sorted(set(actuales) | set(reales))
+        if actuales.get(clave, 0) != reales.get(clave, 0)
+    }
+
+
+def recalcular(conexion):
+    """
+    Reemplaza todos los contadores por un recálculo completo, en el fragmento 0.
+    Retorna la cantidad de contadores escritos.
+    """
+    reales = calcular(conexion)
+    conexion.execute(delete(EstadisticaLibro))
+    if reales:
+        conexion.execute(insert(EstadisticaLibro), [
+            {'dimension': dimension, 'valor': valor, 'cantidad': cantidad}
+            for (dimension, valor), cantidad in reales.items()
+        ])
+    return len(reales)
+
+
+def resumen():
+    """ Estadísticas del catálogo para el panel del dashboard y /estadisticas. """
+    contadores = guardados(db.session)
+    datos = {'total': contadores.get(('total', ''), 0)}
+    for dimension in ('categoria', 'estado', 'año_publicacion'):
+        datos[dimension] = dict(sorted(
+            (valor, cantidad) for (nombre, valor), cantidad in contadores.items() if nombre == dimension
+        ))
+
+    # Préstamos pendientes por bibliotecario, con su nombre de usuario
+    prestados = {
+        int(valor): cantidad for (nombre, valor), cantidad in contadores.items()
+        if nombre == 'prestados_por_bibliotecario'
+    }
+    nombres = dict(db.session.execute(select(User.id, User.username).where(User.id.in_(prestados))).all()) if prestados else {}
+    datos['prestados_por_bibliotecario'] = [
+        {'bibliotecario_id': id, 'username': nombres.get(id), 'prestados': cantidad}
+        for id, cantidad in sorted(prestados.items(), key=lambda par: -par[1])
+    ]
+    return datos
@@ -0,0 +1,107 @@
+from blinker import Namespace
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.models import Libro, Role, User
+
+# Señales internas de la aplicación (mismo mecanismo que usa Flask con blinker)
+señales = Namespace()
+
+# Se emite una vez por transacción confirmada que creó, modificó o eliminó libros.
+# Recibe la lista de cambios: [{'accion': 'crear'|'actualizar'|'eliminar', 'id': ..., 'datos': {...}, 'anterior': {...}}]
+# La acción 'recargar' indica un cambio masivo sin detalle por fila: los suscriptores deben recalcular todo.
+libros_confirmados = señales.signal('libros-confirmados')
+
+# Se emite después de cada flush que creó, modificó o eliminó libros, dentro de la transacción
+# (sender: la sesión). Recibe los cambios del flush con la misma forma que libros_confirmados.
+# Es el único recorrido de session.new/dirty/deleted para libros: versiones, estadísticas y el
+# registro de cambios se suscriben aquí y escriben en la misma transacción.
+libros_escritos = señales.signal('libros-escritos')
+
+# Se emite cuando una transacción confirmada modificó o eliminó usuarios, o cambió roles.
+# Recibe ids (usuarios afectados) y roles (True si cambió algún rol).
+usuarios_confirmados = señales.signal('usuarios-confirmados')
+
+# Columnas de Libro que se copian en cada cambio
+COLUMNAS_LIBRO = [columna.key for columna in Libro.__table__.columns]
+
+
+def valores(libro):
+    """ Copia los valores actuales de las columnas de un libro. """
+    return {columna: getattr(libro, columna) for columna in COLUMNAS_LIBRO}
+
+
+def valores_anteriores(libro):
+    """ Valores de las columnas antes de la modificación pendiente de este flush. """
+    estado = inspect(libro)
+    anterior = {}
+    for columna in COLUMNAS_LIBRO:
+        historia = estado.attrs[columna].history
+        anterior[columna] = historia.deleted[0] if historia.deleted else getattr(libro, columna)
+    return anterior
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_cambios(session, flush_context):
+    """
+    Reúne los cambios de libros del flush, los pasa a los suscriptores de libros_escritos y los
+    acumula en la sesión hasta que la transacción se confirme.
+    """
+    cambios = []
+
+    for libro in session.new:
+        if isinstance(libro, Libro):
+            cambios.append({'accion': 'crear', 'id': libro.id, 'datos': valores(libro), 'anterior': None})
+
+    for libro in session.dirty:
+        if isinstance(libro, Libro) and session.is_modified(libro, include_collections=False):
+            cambios.append({'accion': 'actualizar', 'id': libro.id, 'datos': valores(libro),
+                            'anterior': valores_anteriores(libro)})
+
+    for libro in session.deleted:
+        if isinstance(libro, Libro):
+            cambios.append({'accion': 'eliminar', 'id': libro.id, 'datos': None, 'anterior': valores(libro)})
+
+    if cambios:
+        libros_escritos.send(session, cambios=cambios)
+        session.info.setdefault('cambios_libro', []).extend(cambios)
+
+    # Usuarios y roles: solo interesa saber cuáles cambiaron (para invalidar cachés)
+    usuarios = session.info.setdefault('usuarios_modificados', set())
+    for objeto in list(session.dirty) + list(session.deleted):
+        if isinstance(objeto, User):
+            usuarios.add(objeto.id)
+    if any(isinstance(objeto, Role) for objeto in list(session.new) + list(session.dirty) + list(session.deleted)):
+        session.info['roles_modificados'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _emitir_cambios(session):
+    """ Notifica los cambios de libros una vez que la transacción fue confirmada. """
+    cambios = session.info.pop('cambios_libro', None)
+    if cambios:
+        notificar_cambios(cambios)
+
+    usuarios = session.info.pop('usuarios_modificados', None)
+    roles = session.info.pop('roles_modificados', False)
+    if usuarios or roles:
+        emisor = current_app._get_current_object() if has_app_context() else None
+        usuarios_confirmados.send(emisor, ids=usuarios or set(), roles=roles)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_cambios(session):
+    """ Los cambios de una transacción revertida no se notifican. """
+    session.info.pop('cambios_libro', None)
+    session.info.pop('usuarios_modificados', None)
+    session.info.pop('roles_modificados', None)
+
+
+def notificar_cambios(cambios):
+    """
+    Emite la señal libros_confirmados. Lo usan los listeners de sesión y las operaciones
+    masivas que escriben con Core (sin pasar por el ORM).
+    """
+    emisor = current_app._get_current_object() if has_app_context() else None
+    libros_confirmados.send(emisor, cambios=cambios)
@@ -0,0 +1,156 @@
+import csv
+import json
+import zlib
+
+import msgpack
+from flask import current_app
+from sqlalchemy import select
+
+from app.models import db, Libro
+
+# Columnas de libro que se exponen en la API JSON, en el orden en que se serializan
+COLUMNAS_LIBRO = ['id', 'titulo', 'autor', 'isbn', 'categoria', 'estado', 'año_publicacion', 'bibliotecario_id',
+                  'version']
+
+# Codificador JSON compacto reutilizado por todas las respuestas transmitidas
+_codificador_json = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def iterar_lotes(columnas=None, lote=None):
+    """
+    Recorre la tabla libro con un cursor del lado del servidor (yield_per), seleccionando
+    solo las columnas pedidas. Produce listas de tuplas, un lote por vez.
+    """
+    columnas = columnas or COLUMNAS_LIBRO
+    lote = lote or current_app.config['LOTE_STREAMING']
+
+    # Columnas de la tabla (no atributos del ORM): las filas salen sin pasar por la carga del ORM
+    tabla = Libro.__table__
+    consulta = (
+        select(*[tabla.c[columna] for columna in columnas])
+        .order_by(tabla.c.id)
+        .execution_options(yield_per=lote)
+    )
+    for filas in db.session.execute(consulta).partitions():
+        yield filas
+
+
+def filas_por_id(ids, columnas=None):
+    """
+    Lee los libros indicados consultando solo las columnas pedidas (sin crear entidades del ORM).
+    Retorna {id: {columna: valor}}; los ids inexistentes no aparecen.
+    """
+    columnas = columnas or COLUMNAS_LIBRO
+    seleccion = columnas if 'id' in columnas else ['id', *columnas]
+    consulta = db.session.query(*[getattr(Libro, columna) for columna in seleccion]).filter(Libro.id.in_(ids))
+    filas = {}
+    for valores in consulta:
+        fila = dict(zip(seleccion, valores))
+        filas[fila['id']] = {columna: fila[columna] for columna in columnas}
+    return filas
+
+
+def json_array(lotes, columnas=None):
+    """
+    Serializa los lotes de tuplas como un único arreglo JSON, emitiendo un fragmento por lote.
+    Cada lote se codifica con una sola llamada al codificador (en C) en lugar de una por fila.
+    """
+    columnas = columnas or COLUMNAS_LIBRO
+    codificar = _codificador_json.encode
+    primero = True
+    yield '['
+    for filas in lotes:
+        if not filas:
+            continue
+        texto = codificar([dict(zip(columnas, fila)) for fila in filas])[1:-1]
+        yield texto if primero else ',' + texto
+        primero = False
+    yield ']\n'
+
+
+def ndjson(lotes, columnas=None):
+    """
+    Serializa los lotes de tuplas como NDJSON (un objeto JSON por línea), un fragmento por lote.
+    """
+    columnas = columnas or COLUMNAS_LIBRO
+    codificar = _codificador_json.encode
+    for filas in lotes:
+        if filas:
+            yield '\n'.join([codificar(dict(zip(columnas, fila))) for fila in filas]) + '\n'
+
+
+def msgpack_filas(lotes, columnas=None):
+    """
+    Serializa en MessagePack como una secuencia de objetos: primero {'columnas': [...]}
+    y luego cada libro como un arreglo de valores en ese orden (sin repetir los nombres).
+    Se lee con msgpack.Unpacker sobre el flujo.
+    """
+    columnas = columnas or COLUMNAS_LIBRO
+    empaquetador = msgpack.Packer()
+    empaquetar = empaquetador.pack
+    yield empaquetar({'columnas': list(columnas)})
+    for filas in lotes:
+        if filas:
+            yield b''.join([empaquetar(tuple(fila)) for fila in filas])
+
+
+class _Eco:
+    """ Pseudo-archivo para csv.writer: devuelve cada línea en lugar de guardarla. """
+
+    def write(self, valor):
+        return valor
+
+
+class _Acumulador(list):
+    """ Pseudo-archivo para csv.writer: junta las líneas de un lote. """
+
+    write = list.append
+
+
+def csv_filas(lotes, columnas=None):
+    """
+    Serializa los lotes de tuplas como CSV con encabezado, un fragmento por lote.
+    """
+    columnas = columnas or COLUMNAS_LIBRO
+    yield csv.writer(_Eco()).writerow(columnas)
+    for filas in lotes:
+        lineas = _Acumulador()
+        csv.writer(lineas).writerows(filas)
+        yield ''.join(lineas)
+
+
+def comprimir_gzip(partes, nivel=6):
+    """
+    Comprime al vuelo un flujo de fragmentos (texto o bytes) en formato gzip.
+    Solo se retiene en memoria el estado del compresor, no el contenido completo.
+    """
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)  # 31 = encabezado gzip
+    for parte in partes:
+        comprimido = compresor.compress(parte if isinstance(parte, bytes) else parte.encode('utf-8'))
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+
+def validar_columnas(texto):
+    """
+    Convierte 'id,titulo' en ['id', 'titulo']. Lanza ValueError si alguna columna no existe.
+    Sin texto retorna todas las columnas.
+    """
+    if not texto:
+        return list(COLUMNAS_LIBRO)
+    columnas = [columna.strip() for columna in texto.split(',') if columna.strip()]
+    desconocidas = [columna for columna in columnas if columna not in COLUMNAS_LIBRO]
+    if desconocidas or not columnas:
+        raise ValueError(f"Unknown columns: {', '.join(desconocidas)}")
+    return columnas
+
+
+def exportar(formato, columnas=None, gzip=False, lote=None):
+    """
+    Genera la exportación completa del catálogo en 'csv' o 'ndjson', opcionalmente comprimida.
+    Produce str sin compresión y bytes con compresión.
+    """
+    lotes = iterar_lotes(columnas, lote=lote)
+    partes = csv_filas(lotes, columnas) if formato == 'csv' else ndjson(lotes, columnas)
+    return comprimir_gzip(partes) if gzip else partes
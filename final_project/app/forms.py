@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, TextAreaField, SelectField, IntegerField
+from wtforms import StringField, PasswordField, SubmitField, TextAreaField, SelectField, IntegerField, HiddenField
 from wtforms.validators import DataRequired, Email, EqualTo, Length
 
 # Formulario para login de usuario
@@ -36,4 +36,6 @@ class LibroForm(FlaskForm):
     estado = SelectField('Status',choices=[('Disponible', 'Disponible'), ('Prestado', 'Prestado')],validators=[DataRequired()] )
     isbn = StringField('Book ISBN', validators=[DataRequired()])
     año_publicacion = IntegerField('Publication Year', validators=[DataRequired()])
+    # Versión del libro al abrir el formulario de edición (concurrencia optimista)
+    version = HiddenField()
     submit = SubmitField('Save')
@@ -0,0 +1,175 @@
+"""
+Generador de datos sintéticos para pruebas de carga: miles de usuarios y millones de libros
+con distribuciones configurables. Todo sale de un random.Random con semilla, así que la misma
+semilla sobre la misma base produce los mismos datos. Las filas se insertan con Core por lotes
+(executemany) y todos los usuarios generados comparten un hash de contraseña precalculado.
+"""
+import random
+import time
+from itertools import accumulate
+
+from flask import current_app
+from sqlalchemy import func, insert, select
+
+from app.cambios import registrar_inserciones, ultimo_id_libro
+from app.estadisticas import contar_filas
+from app.eventos import notificar_cambios
+from app.hashing import generar_hash
+from app.models import db, Libro, Role, User
+from app.versiones import incrementar_version
+
+ROLES = ('Admin', 'Bibliotecario', 'Lector')
+
+# Peso relativo de cada categoría en el catálogo generado
+CATEGORIAS = {
+    'Novela': 30, 'Ciencia': 12, 'Historia': 10, 'Infantil': 10, 'Ensayo': 8, 'Poesía': 6,
+    'Filosofía': 5, 'Arte': 5, 'Tecnología': 8, 'Biografía': 6,
+}
+
+PALABRAS = [
+    'sombra', 'río', 'ciudad', 'tiempo', 'memoria', 'viaje', 'noche', 'mar', 'jardín', 'guerra',
+    'silencio', 'fuego', 'isla', 'camino', 'espejo', 'luz', 'sueño', 'piedra', 'viento', 'casa',
+    'invierno', 'ciencia', 'historia', 'amor', 'montaña', 'frontera', 'reino', 'secreto', 'tierra', 'cielo',
+]
+NOMBRES = ['Ana', 'Luis', 'María', 'Jorge', 'Lucía', 'Pedro', 'Sofía', 'Carlos', 'Elena', 'Diego',
+           'Valeria', 'Andrés', 'Camila', 'Miguel', 'Isabel', 'Tomás']
+APELLIDOS = ['García', 'López', 'Martínez', 'Rodríguez', 'Pérez', 'Gómez', 'Díaz', 'Torres', 'Ruiz',
+             'Vargas', 'Castro', 'Morales', 'Herrera', 'Ramos', 'Ortiz', 'Silva']
+
+
+def parsear_pesos(texto):
+    """ Convierte 'Novela:30,Ciencia:10' en {'Novela': 30.0, 'Ciencia': 10.0}. """
+    pesos = {}
+    for parte in texto.split(','):
+        nombre, _, peso = parte.partition(':')
+        if not nombre.strip():
+            continue
+        try:
+            pesos[nombre.strip()] = float(peso) if peso else 1.0
+        except ValueError:
+            raise ValueError(f'Invalid weight in {parte!r}')
+    if not pesos:
+        raise ValueError('Empty weight list')
+    return pesos
+
+
+def isbn13(numero):
+    """ ISBN-13 válido (prefijo 978) a partir de un número correlativo. """
+    digitos = f'978{numero % 10 ** 9:09d}'
+    control = (10 - sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(digitos)) % 10) % 10
+    return f'{digitos[:3]}-{digitos[3:]}{control}'
+
+
+def asegurar_roles():
+    """ Crea los roles que falten y retorna {nombre: id}. """
+    existentes = dict(db.session.execute(select(Role.name, Role.id)).all())
+    for nombre in ROLES:
+        if nombre not in existentes:
+            db.session.add(Role(name=nombre))
+    db.session.commit()
+    return dict(db.session.execute(select(Role.name, Role.id)).all())
+
+
+def generar_usuarios(cantidad, bibliotecarios=50, admins=2, password='demo1234', semilla=42, lote=None, prefijo='usuario'):
+    """
+    Inserta `cantidad` usuarios: `admins` administradores, `bibliotecarios` bibliotecarios y el resto lectores.
+    La numeración continúa después de los usuarios existentes, para poder llamarla varias veces.
+    Retorna {rol: cantidad insertada}.
+    """
+    lote = lote or current_app.config['LOTE_IMPORTACION']
+    roles = asegurar_roles()
+    azar = random.Random(semilla)
+    password_hash = generar_hash(password)
+    inicio = (db.session.execute(select(func.max(User.id))).scalar() or 0) + 1
+
+    insertados = dict.fromkeys(ROLES, 0)
+    filas = []
+    for numero in range(inicio, inicio + cantidad):
+        posicion = numero - inicio
+        rol = 'Admin' if posicion < admins else 'Bibliotecario' if posicion < admins + bibliotecarios else 'Lector'
+        nombre = f'{azar.choice(NOMBRES).lower()}.{azar.choice(APELLIDOS).lower()}'
+        filas.append({
+            'username': f'{prefijo}{numero:07d}',
+            'email': f'{nombre}.{numero}@example.com',
+            'password_hash': password_hash,
+            'role_id': roles[rol],
+        })
+        insertados[rol] += 1
+        if len(filas) >= lote:
+            db.session.execute(insert(User), filas)
+            db.session.commit()
+            filas = []
+    if filas:
+        db.session.execute(insert(User), filas)
+        db.session.commit()
+    return insertados
+
+
+def generar_libros(cantidad, semilla=42, lote=None, categorias=None, prestados=0.3,
+                   años=(1900, 2024, 2015), sesgo_bibliotecarios=1.0, bibliotecarios=None, al_insertar=None):
+    """
+    Inserta `cantidad` libros por lotes, cada lote en su propia transacción (con sus contadores
+    de estadísticas y la versión de la tabla).
+
+    - categorias: {categoría: peso}; por defecto CATEGORIAS.
+    - prestados: fracción de libros con estado 'Prestado'.
+    - años: (mínimo, máximo, moda) de una distribución triangular del año de publicación.
+    - sesgo_bibliotecarios: exponente tipo Zipf del reparto entre bibliotecarios (0 = uniforme),
+      para reproducir catálogos donde pocos bibliotecarios cargan la mayoría de los libros.
+    - bibliotecarios: ids a usar; por defecto todos los usuarios Bibliotecario (o Admin si no hay).
+    - al_insertar(insertados, segundos): se llama después de cada lote.
+
+    Retorna la cantidad de libros insertados.
+    """
+    lote = lote or current_app.config['LOTE_IMPORTACION']
+    categorias = categorias or CATEGORIAS
+    azar = random.Random(semilla)
+
+    if bibliotecarios is None:
+        for rol in ('Bibliotecario', 'Admin'):
+            bibliotecarios = db.session.execute(
+                select(User.id).join(User.role).where(Role.name == rol).order_by(User.id)
+            ).scalars().all()
+            if bibliotecarios:
+                break
+    if not bibliotecarios:
+        raise ValueError('There are no librarians to assign the books to')
+
+    # Pesos acumulados: choices() con cum_weights evita recalcularlos en cada llamada
+    nombres_categoria = list(categorias)
+    pesos_categoria = list(accumulate(categorias.values()))
+    pesos_bibliotecario = list(accumulate(1 / (posicion ** sesgo_bibliotecarios)
+                                          for posicion in range(1, len(bibliotecarios) + 1)))
+    minimo, maximo, moda = años
+    primer_isbn = (db.session.execute(select(func.max(Libro.id))).scalar() or 0) + 1
+
+    inicio, insertados = time.perf_counter(), 0
+    while insertados < cantidad:
+        tamaño = min(lote, cantidad - insertados)
+        filas_categoria = azar.choices(nombres_categoria, cum_weights=pesos_categoria, k=tamaño)
+        filas_bibliotecario = azar.choices(bibliotecarios, cum_weights=pesos_bibliotecario, k=tamaño)
+        filas = []
+        for posicion in range(tamaño):
+            filas.append({
+                'titulo': ' '.join(azar.choices(PALABRAS, k=azar.randint(2, 4))).capitalize(),
+                'autor': f'{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)}',
+                'isbn': isbn13(primer_isbn + insertados + posicion),
+                'categoria': filas_categoria[posicion],
+                'estado': 'Prestado' if azar.random() < prestados else 'Disponible',
+                'año_publicacion': round(azar.triangular(minimo, maximo, moda)),
+                'bibliotecario_id': filas_bibliotecario[posicion],
+            })
+
+        desde_id = ultimo_id_libro(db.session)
+        db.session.execute(insert(Libro), filas)
+        incrementar_version(db.session, Libro.__tablename__)
+        contar_filas(db.session, filas)
+        registrar_inserciones(db.session, desde_id)
+        db.session.commit()
+        insertados += tamaño
+        if al_insertar:
+            al_insertar(insertados, time.perf_counter() - inicio)
+
+    # Cambio masivo sin detalle por fila: índices y cachés del proceso se reconstruyen
+    notificar_cambios([{'accion': 'recargar', 'id': None, 'datos': None, 'anterior': None}])
+    return insertados
@@ -0,0 +1,99 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from app.metricas_routes import registrar_metrica
+
+# Pool de procesos del worker actual (se crea al primer uso, después del fork de gunicorn)
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_pool_workers = None
+_cupos = None
+
+# Contadores publicados en /metricas
+contadores = {'hashes': 0, 'verificaciones': 0, 'rehashes': 0}
+
+
+def _obtener_pool(workers):
+    """
+    Retorna el pool de procesos y el semáforo que limita los trabajos en curso,
+    creándolos si no existen en este proceso o si cambió la cantidad de workers.
+    """
+    global _pool, _pool_pid, _pool_workers, _cupos
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid() or _pool_workers != workers:
+            if _pool is not None and _pool_pid == os.getpid():
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_pid, _pool_workers = os.getpid(), workers
+            # Como máximo dos trabajos por proceso esperando; el resto de hilos espera aquí
+            _cupos = threading.BoundedSemaphore(workers * 2)
+        return _pool, _cupos
+
+
+def cerrar_pool():
+    """ Detiene el pool de procesos de hashing (si existe). """
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=True)
+        _pool = None
+
+
+def _ejecutar(funcion, *args):
+    """
+    Ejecuta la función en el pool de hashing (HASH_WORKERS > 0) o en el propio hilo (0).
+    """
+    workers = current_app.config['HASH_WORKERS']
+    if not workers:
+        return funcion(*args)
+
+    pool, cupos = _obtener_pool(workers)
+    with cupos:
+        return pool.submit(funcion, *args).result()
+
+
+def generar_hash(password):
+    """ Genera el hash de la contraseña con el método y costo de HASH_METODO. """
+    contadores['hashes'] += 1
+    return _ejecutar(generate_password_hash, password, current_app.config['HASH_METODO'])
+
+
+def verificar_hash(password_hash, password):
+    """ Verifica una contraseña contra su hash. """
+    contadores['verificaciones'] += 1
+    return _ejecutar(check_password_hash, password_hash, password)
+
+
+@lru_cache(maxsize=8)
+def _prefijo_de(metodo):
+    """
+    Prefijo que Werkzeug antepone al hash con este método, p. ej. 'pbkdf2:sha256:600000'
+    (los parámetros omitidos en HASH_METODO se completan con los valores por defecto).
+    """
+    return generate_password_hash('', method=metodo).split('$', 1)[0]
+
+
+def necesita_rehash(password_hash):
+    """ True si el hash se generó con un método o costo distinto al configurado. """
+    return password_hash.split('$', 1)[0] != _prefijo_de(current_app.config['HASH_METODO'])
+
+
+def registrar_rehash():
+    """ Cuenta un hash actualizado al método configurado, una vez guardado. """
+    contadores['rehashes'] += 1
+
+
+def estadisticas():
+    """ Métricas del hashing de contraseñas. """
+    return dict(contadores, workers=current_app.config['HASH_WORKERS'], metodo=current_app.config['HASH_METODO'])
+
+
+def init_app(app):
+    """ Publica las métricas de hashing. """
+    registrar_metrica(app, 'hashing', estadisticas)
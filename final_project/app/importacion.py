@@ -0,0 +1,176 @@
+import csv
+import io
+import json
+import time
+
+from flask import current_app
+from sqlalchemy import insert
+
+from app.cambios import registrar_inserciones, ultimo_id_libro
+from app.eventos import notificar_cambios
+from app.models import db, Libro, User
+from app.estadisticas import contar_filas
+from app.versiones import incrementar_version
+
+# Valores aceptados para el estado de un libro (los mismos de LibroForm)
+ESTADOS = ('Disponible', 'Prestado')
+
+# Columnas de texto obligatorias y su largo máximo según el modelo
+COLUMNAS_TEXTO = {
+    columna: Libro.__table__.c[columna].type.length
+    for columna in ('titulo', 'autor', 'isbn', 'categoria', 'estado')
+}
+
+# Cantidad máxima de filas rechazadas que se detallan en el reporte
+MAX_ERRORES_REPORTADOS = 1000
+
+
+class FilaInvalida(ValueError):
+    """ Error de validación de una fila importada. """
+
+
+def leer_filas(flujo, formato):
+    """
+    Lee un flujo de texto CSV (con encabezado) o NDJSON fila por fila, sin cargarlo completo.
+
+    Produce tuplas (número de línea, diccionario o None si la línea no se pudo interpretar).
+    """
+    if formato == 'csv':
+        lector = csv.DictReader(flujo)
+        for datos in lector:
+            yield lector.line_num, datos
+    elif formato == 'ndjson':
+        for numero, linea in enumerate(flujo, start=1):
+            if not linea.strip():
+                continue
+            try:
+                datos = json.loads(linea)
+            except ValueError:
+                datos = None
+            yield numero, datos if isinstance(datos, dict) else None
+    else:
+        raise ValueError(f'Unsupported format: {formato}')
+
+
+def validar_fila(datos, bibliotecarios, bibliotecario_id=None):
+    """
+    Valida y normaliza una fila. Retorna el diccionario listo para insertar o lanza FilaInvalida.
+    """
+    if datos is None:
+        raise FilaInvalida('Malformed row')
+
+    fila = {}
+    for columna, largo in COLUMNAS_TEXTO.items():
+        valor = str(datos.get(columna) or '').strip()
+        if not valor:
+            raise FilaInvalida(f'Missing {columna}')
+        if len(valor) > largo:
+            raise FilaInvalida(f'{columna} longer than {largo} characters')
+        fila[columna] = valor
+
+    if fila['estado'] not in ESTADOS:
+        raise FilaInvalida(f"Invalid estado '{fila['estado']}'")
+
+    try:
+        fila['año_publicacion'] = int(datos.get('año_publicacion'))
+    except (TypeError, ValueError):
+        raise FilaInvalida('Invalid año_publicacion')
+
+    try:
+        fila['bibliotecario_id'] = int(datos.get('bibliotecario_id') or bibliotecario_id)
+    except (TypeError, ValueError):
+        raise FilaInvalida('Missing bibliotecario_id')
+    if fila['bibliotecario_id'] not in bibliotecarios:
+        raise FilaInvalida(f"Unknown bibliotecario_id {fila['bibliotecario_id']}")
+
+    return fila
+
+
+def _insertar_lote(lote):
+    """
+    Inserta un lote con un solo executemany y lo confirma en su propia transacción.
+    Si la base de datos admite RETURNING en inserciones múltiples, notifica cada libro creado;
+    si no, notifica una recarga completa a los suscriptores de libros_confirmados.
+    """
+    desde_id = ultimo_id_libro(db.session)
+    if db.engine.dialect.insert_executemany_returning:
+        ids = db.session.execute(insert(Libro).returning(Libro.id, sort_by_parameter_order=True), lote).scalars().all()
+        incrementar_version(db.session, Libro.__tablename__)
+        contar_filas(db.session, lote)
+        registrar_inserciones(db.session, desde_id)
+        db.session.commit()
+        notificar_cambios([
+            {'accion': 'crear', 'id': id, 'datos': dict(fila, id=id), 'anterior': None}
+            for id, fila in zip(ids, lote)
+        ])
+    else:
+        db.session.execute(insert(Libro), lote)
+        incrementar_version(db.session, Libro.__tablename__)
+        contar_filas(db.session, lote)
+        registrar_inserciones(db.session, desde_id)
+        db.session.commit()
+        notificar_cambios([{'accion': 'recargar', 'id': None, 'datos': None, 'anterior': None}])
+
+
+def importar_libros(flujo, formato, bibliotecario_id=None, lote=None, al_insertar=None):
+    """
+    Importa libros desde un flujo CSV o NDJSON validando fila por fila e insertando
+    por lotes grandes (una transacción por lote). al_insertar(insertados, rechazados)
+    se llama después de cada lote confirmado.
+
+    Retorna un reporte con insertados, rechazados, detalle de errores y filas por segundo.
+    """
+    lote = lote or current_app.config['LOTE_IMPORTACION']
+    inicio = time.perf_counter()
+
+    # Se cargan una sola vez los ids válidos, para no consultar la base por cada fila
+    bibliotecarios = {id for (id,) in db.session.query(User.id)}
+
+    insertados, rechazados, errores = 0, 0, []
+    pendientes = []
+
+    for numero, datos in leer_filas(flujo, formato):
+        try:
+            pendientes.append(validar_fila(datos, bibliotecarios, bibliotecario_id))
+        except FilaInvalida as error:
+            rechazados += 1
+            if len(errores) < MAX_ERRORES_REPORTADOS:
+                errores.append({'linea': numero, 'error': str(error)})
+            continue
+
+        if len(pendientes) >= lote:
+            _insertar_lote(pendientes)
+            insertados += len(pendientes)
+            pendientes = []
+            if al_insertar:
+                al_insertar(insertados, rechazados)
+
+    if pendientes:
+        _insertar_lote(pendientes)
+        insertados += len(pendientes)
+
+    segundos = time.perf_counter() - inicio
+    return {
+        'insertados': insertados,
+        'rechazados': rechazados,
+        'errores': errores,
+        'segundos': round(segundos, 3),
+        'filas_por_segundo': round((insertados + rechazados) / segundos, 1) if segundos else None,
+    }
+
+
+def formato_de(nombre_o_mimetype):
+    """ Deduce 'csv' o 'ndjson' a partir de una extensión de archivo o un Content-Type. """
+    valor = (nombre_o_mimetype or '').lower()
+    if valor.endswith('.csv') or 'csv' in valor:
+        return 'csv'
+    if valor.endswith(('.ndjson', '.jsonl')) or 'ndjson' in valor or 'jsonl' in valor:
+        return 'ndjson'
+    return None
+
+
+def flujo_de_texto(binario):
+    """ Envuelve un flujo binario (archivo o cuerpo de la petición) como texto UTF-8. """
+    if not isinstance(binario, io.BufferedIOBase):
+        binario = io.BufferedReader(binario)
+    return io.TextIOWrapper(binario, encoding='utf-8-sig', newline='')
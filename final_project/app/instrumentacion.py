@@ -0,0 +1,164 @@
+import cProfile
+import logging
+import os
+import random
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('app.instrumentacion')
+
+
+class ConsultasRepetidas(RuntimeError):
+    """ Una vista ejecutó muchas veces la misma consulta (patrón N+1). """
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _contar_consulta(conn, cursor, statement, parameters, context, executemany):
+    """
+    Cuenta cada sentencia SQL ejecutada durante la petición actual, agrupada por su texto
+    (los parámetros van aparte, así que el texto representa la "forma" de la consulta).
+    """
+    if has_request_context():
+        consultas = g.get('consultas_sql')
+        if consultas is not None:
+            consultas[statement] += 1
+        if g.get('tiempos_sql') is not None:
+            conn.info.setdefault('inicio_consulta', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _medir_consulta(conn, cursor, statement, parameters, context, executemany):
+    """ Con el perfilado activo, guarda la duración de cada sentencia de la petición. """
+    if has_request_context():
+        tiempos = g.get('tiempos_sql')
+        inicios = conn.info.get('inicio_consulta')
+        if tiempos is not None and inicios:
+            tiempos.append((time.perf_counter() - inicios.pop(), statement))
+
+
+def consultas_de_la_peticion():
+    """ Contador {sentencia: veces} de la petición actual (vacío fuera de una petición). """
+    return g.get('consultas_sql', Counter()) if has_request_context() else Counter()
+
+
+def _iniciar_conteo():
+    g.consultas_sql = Counter()
+
+
+def _revisar_n_mas_1(app, respuesta):
+    """
+    Busca consultas con la misma forma repetidas UMBRAL_N_MAS_1 veces o más.
+    Según DETECTOR_N_MAS_1 registra una advertencia ('advertir') o lanza ConsultasRepetidas ('fallar').
+    """
+    umbral = app.config['UMBRAL_N_MAS_1']
+    repetidas = {sql: veces for sql, veces in consultas_de_la_peticion().items() if veces >= umbral}
+    if not repetidas:
+        return respuesta
+
+    detalle = '; '.join(f'{veces}x {" ".join(sql.split())[:120]}' for sql, veces in repetidas.items())
+    mensaje = f'Possible N+1 in {request.method} {request.path}: {detalle}'
+    if app.config['DETECTOR_N_MAS_1'] == 'fallar':
+        raise ConsultasRepetidas(mensaje)
+    app.logger.warning(mensaje)
+    return respuesta
+
+
+# --- Perfilado por petición ------------------------------------------------------------------
+
+def _antes_de_plantilla(app, template, context, **extra):
+    if has_request_context() and g.get('tiempo_plantillas') is not None:
+        g.inicios_plantilla.append(time.perf_counter())
+
+
+def _plantilla_renderizada(app, template, context, **extra):
+    if has_request_context() and g.get('inicios_plantilla'):
+        g.tiempo_plantillas += time.perf_counter() - g.inicios_plantilla.pop()
+
+
+def _iniciar_perfil(app):
+    """ Empieza a medir la petición y, si le toca por muestreo, activa cProfile. """
+    g.inicio_peticion = time.perf_counter()
+    g.tiempos_sql = []
+    g.tiempo_plantillas = 0.0
+    g.inicios_plantilla = []
+
+    if app.config['PERFIL_MUESTREO'] and random.random() < app.config['PERFIL_MUESTREO']:
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Ya hay otro perfilador activo en el proceso (por ejemplo, en otra petición)
+            return
+        g.perfil = perfil
+
+
+def _guardar_perfil(app, perfil):
+    """ Vuelca las estadísticas de cProfile en PERFIL_DIR y retorna el nombre del archivo. """
+    os.makedirs(app.config['PERFIL_DIR'], exist_ok=True)
+    ruta_peticion = request.path.strip('/').replace('/', '_') or 'index'
+    nombre = f'{datetime.now():%Y%m%d_%H%M%S_%f}_{request.method}_{ruta_peticion}.prof'
+    perfil.dump_stats(os.path.join(app.config['PERFIL_DIR'], nombre))
+    return nombre
+
+
+def _terminar_perfil(app, respuesta):
+    """
+    Agrega la cabecera Server-Timing (total, SQL y plantillas), registra las peticiones lentas
+    con sus consultas más lentas y guarda el volcado de cProfile si la petición fue muestreada.
+    En respuestas transmitidas (streaming) solo se mide hasta que empieza el envío.
+    """
+    perfil = g.pop('perfil', None)
+    if perfil is not None:
+        perfil.disable()
+        respuesta.headers['X-Perfil'] = _guardar_perfil(app, perfil)
+
+    total = time.perf_counter() - g.inicio_peticion
+    tiempos_sql = g.tiempos_sql
+    tiempo_sql = sum(duracion for duracion, _ in tiempos_sql)
+    respuesta.headers.add(
+        'Server-Timing',
+        f'total;dur={1000 * total:.1f}, '
+        f'sql;dur={1000 * tiempo_sql:.1f};desc="{len(tiempos_sql)} queries", '
+        f'plantillas;dur={1000 * g.tiempo_plantillas:.1f}',
+    )
+
+    if 1000 * total >= app.config['PETICION_LENTA_MS']:
+        lentas = sorted(tiempos_sql, key=lambda par: par[0], reverse=True)[:app.config['PERFIL_CONSULTAS_LENTAS']]
+        detalle = '; '.join(f'{1000 * duracion:.1f} ms {" ".join(sql.split())[:200]}' for duracion, sql in lentas)
+        logger.warning(
+            'Slow request %s %s: %.1f ms total, %d queries in %.1f ms, templates %.1f ms. Slowest queries: %s',
+            request.method, request.full_path.rstrip('?'), 1000 * total, len(tiempos_sql), 1000 * tiempo_sql,
+            1000 * g.tiempo_plantillas, detalle or 'none',
+        )
+    return respuesta
+
+
+def _cerrar_perfil(error=None):
+    """ Si la vista lanzó una excepción, after_request no se ejecuta: se apaga cProfile aquí. """
+    perfil = g.pop('perfil', None)
+    if perfil is not None:
+        perfil.disable()
+
+
+def init_app(app):
+    """
+    Con DETECTOR_N_MAS_1 ('advertir' o 'fallar') cuenta las sentencias SQL de cada petición
+    y al final revisa si hubo consultas repetidas. Pensado para desarrollo y pruebas.
+
+    Con PERFILADO mide cada petición (tiempo total, SQL y plantillas) y lo publica en Server-Timing.
+    """
+    if app.config['DETECTOR_N_MAS_1']:
+        app.before_request(_iniciar_conteo)
+        app.after_request(lambda respuesta: _revisar_n_mas_1(app, respuesta))
+
+    if app.config['PERFILADO']:
+        app.before_request(lambda: _iniciar_perfil(app))
+        app.after_request(lambda respuesta: _terminar_perfil(app, respuesta))
+        app.teardown_request(_cerrar_perfil)
+        before_render_template.connect(_antes_de_plantilla, app)
+        template_rendered.connect(_plantilla_renderizada, app)
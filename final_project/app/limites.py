@@ -0,0 +1,252 @@
+"""
+Límite de intentos de login y registro por IP y por email, con cubos de fichas (token bucket).
+
+Cada clave ('login:ip:10.0.0.1', 'login:email:ana@example.com', ...) tiene un cubo de
+`capacidad` fichas que se rellena a razón de capacidad/periodo fichas por segundo; cada intento
+consume una. Un cubo que ya se rellenó por completo equivale a uno nuevo, así que se descarta:
+solo ocupan memoria las claves con intentos recientes.
+
+La verificación se hace al inicio de la vista, antes de validar el formulario, consultar la base
+o calcular un hash: una ráfaga de credential stuffing se corta sin gastar CPU en scrypt.
+
+Las reglas por IP cuentan cada intento. Las reglas por email solo cuentan los intentos fallidos
+(registrar_fallo, después de verificar las credenciales): al inicio de la vista solo se consulta
+si ese cubo ya está vacío. Así nadie bloquea a un usuario con intentos que ni siquiera llegan a
+verificarse, y un usuario bloqueado por fallos ajenos vuelve a entrar al rellenarse el cubo.
+
+La IP es request.remote_addr: detrás de un proxy inverso hay que configurar PROXIES_CONFIABLES
+(ver create_app) para que sea la del cliente y no la del proxy, o todos compartirían un cubo.
+
+Backends (LIMITES_BACKEND):
+- 'memoria': diccionario en el proceso; cada worker lleva sus propios contadores.
+- 'sqlite': archivo SQLite compartido por los workers del mismo servidor. Implementa la misma
+  interfaz que tendría un backend compartido (por ejemplo Redis) y sirve como sustituto local.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, request
+
+from app.metricas_routes import registrar_metrica
+
+# Reglas por operación: (dimensión, opción de configuración con 'intentos/segundos', qué cuenta:
+# 'intento' cada petición, 'fallo' solo los intentos fallidos)
+REGLAS = {
+    'login': (('ip', 'LIMITE_LOGIN_IP', 'intento'), ('email', 'LIMITE_LOGIN_EMAIL', 'fallo')),
+    'registro': (('ip', 'LIMITE_REGISTRO_IP', 'intento'), ('email', 'LIMITE_REGISTRO_EMAIL', 'fallo')),
+}
+
+# Contadores publicados en /metricas: {'login:ip': {'permitidos': n, 'rechazados': n, 'fallos': n}, ...}
+contadores = {}
+
+
+def parsear_limite(texto):
+    """ Convierte '5/60' en (5, 60.0): 5 intentos cada 60 segundos. Sin texto retorna None (sin límite). """
+    if not texto:
+        return None
+    intentos, _, segundos = texto.partition('/')
+    try:
+        limite = (int(intentos), float(segundos or 1))
+    except ValueError:
+        raise ValueError(f'Invalid limit {texto!r}, expected "attempts/seconds"')
+    if limite[0] < 1 or limite[1] <= 0:
+        raise ValueError(f'Invalid limit {texto!r}, expected "attempts/seconds"')
+    return limite
+
+
+def _cargar(fichas, ultimo, ahora, capacidad, tasa):
+    """ Fichas del cubo en `ahora`, después de rellenarlo desde `ultimo`. """
+    return min(capacidad, fichas + (ahora - ultimo) * tasa)
+
+
+class LimitadorMemoria:
+    """
+    Cubos en un OrderedDict del proceso: clave -> (fichas, último uso, momento en que vuelve a estar lleno).
+    El orden es el del último uso, así que los cubos ya llenos se barren desde el principio en
+    tiempo amortizado constante. Con más de max_claves se descartan los menos usados.
+    """
+
+    def __init__(self, max_claves=100000):
+        self.max_claves = max_claves
+        self._cubos = OrderedDict()
+        self._lock = threading.Lock()
+        self.descartados = 0
+
+    def consumir(self, clave, capacidad, periodo):
+        """ Consume una ficha. Retorna 0 si se permitió, o los segundos a esperar para la próxima. """
+        tasa = capacidad / periodo
+        ahora = time.monotonic()
+        with self._lock:
+            self._barrer(ahora)
+            entrada = self._cubos.pop(clave, None)
+            fichas = capacidad if entrada is None else _cargar(entrada[0], entrada[1], ahora, capacidad, tasa)
+            espera = 0.0
+            if fichas >= 1:
+                fichas -= 1
+            else:
+                espera = (1 - fichas) / tasa
+            self._cubos[clave] = (fichas, ahora, ahora + (capacidad - fichas) / tasa)
+            while len(self._cubos) > self.max_claves:
+                self._cubos.popitem(last=False)
+                self.descartados += 1
+            return espera
+
+    def consultar(self, clave, capacidad, periodo):
+        """ Segundos a esperar para la próxima ficha (0 si hay), sin consumirla. """
+        tasa = capacidad / periodo
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._cubos.get(clave)
+            fichas = capacidad if entrada is None else _cargar(entrada[0], entrada[1], ahora, capacidad, tasa)
+        return 0.0 if fichas >= 1 else (1 - fichas) / tasa
+
+    def _barrer(self, ahora):
+        while self._cubos:
+            clave, (_, _, lleno_en) = next(iter(self._cubos.items()))
+            if lleno_en > ahora:
+                return
+            del self._cubos[clave]
+
+    def estadisticas(self):
+        with self._lock:
+            return {'backend': 'memoria', 'claves': len(self._cubos), 'max_claves': self.max_claves,
+                    'descartados': self.descartados}
+
+
+class LimitadorSQLite:
+    """
+    Cubos en una tabla SQLite compartida por los procesos del servidor. Cada consumo es una
+    transacción BEGIN IMMEDIATE (lectura y escritura del cubo sin carreras entre workers).
+    Los cubos llenos se borran cada `barrido` consumos.
+    """
+
+    def __init__(self, ruta, barrido=1000):
+        self.ruta = ruta
+        self.barrido = barrido
+        self._local = threading.local()
+        self._consumos = 0
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        with self._conexion() as conexion:
+            conexion.execute(
+                'CREATE TABLE IF NOT EXISTS cubo ('
+                'clave TEXT PRIMARY KEY, fichas REAL NOT NULL, ultimo REAL NOT NULL, lleno_en REAL NOT NULL)'
+            )
+
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            # isolation_level=None: las transacciones se abren explícitamente con BEGIN IMMEDIATE
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            self._local.conexion = conexion
+        return conexion
+
+    def consumir(self, clave, capacidad, periodo):
+        tasa = capacidad / periodo
+        ahora = time.time()
+        conexion = self._conexion()
+        conexion.execute('BEGIN IMMEDIATE')
+        try:
+            fila = conexion.execute('SELECT fichas, ultimo FROM cubo WHERE clave = ?', (clave,)).fetchone()
+            fichas = capacidad if fila is None else _cargar(fila[0], fila[1], ahora, capacidad, tasa)
+            espera = 0.0
+            if fichas >= 1:
+                fichas -= 1
+            else:
+                espera = (1 - fichas) / tasa
+            conexion.execute(
+                'INSERT OR REPLACE INTO cubo (clave, fichas, ultimo, lleno_en) VALUES (?, ?, ?, ?)',
+                (clave, fichas, ahora, ahora + (capacidad - fichas) / tasa),
+            )
+            self._consumos += 1
+            if self._consumos % self.barrido == 0:
+                conexion.execute('DELETE FROM cubo WHERE lleno_en <= ?', (ahora,))
+            conexion.execute('COMMIT')
+        except BaseException:
+            conexion.execute('ROLLBACK')
+            raise
+        return espera
+
+    def consultar(self, clave, capacidad, periodo):
+        tasa = capacidad / periodo
+        fila = self._conexion().execute('SELECT fichas, ultimo FROM cubo WHERE clave = ?', (clave,)).fetchone()
+        fichas = capacidad if fila is None else _cargar(fila[0], fila[1], time.time(), capacidad, tasa)
+        return 0.0 if fichas >= 1 else (1 - fichas) / tasa
+
+    def estadisticas(self):
+        claves = self._conexion().execute('SELECT COUNT(*) FROM cubo').fetchone()[0]
+        return {'backend': 'sqlite', 'ruta': self.ruta, 'claves': claves}
+
+
+def crear_limitador(app):
+    """ Crea el limitador según LIMITES_BACKEND ('memoria', 'sqlite' o '' para desactivarlo). """
+    backend = app.config['LIMITES_BACKEND']
+    if backend == 'memoria':
+        return LimitadorMemoria(max_claves=app.config['LIMITES_MAX_CLAVES'])
+    if backend == 'sqlite':
+        return LimitadorSQLite(app.config['LIMITES_SQLITE'])
+    if backend:
+        raise ValueError(f'Unknown LIMITES_BACKEND: {backend}')
+    return None
+
+
+def _claves(operacion, email, cuenta):
+    """ (clave del cubo, límite, contador) de las reglas de `operacion` que cuentan `cuenta`. """
+    valores = {'ip': request.remote_addr or '-', 'email': (email or '').strip().lower()}
+    for dimension, opcion, cuenta_regla in REGLAS[operacion]:
+        limite = parsear_limite(current_app.config[opcion])
+        if cuenta_regla != cuenta or limite is None or not valores[dimension]:
+            continue
+        contador = contadores.setdefault(f'{operacion}:{dimension}', {'permitidos': 0, 'rechazados': 0, 'fallos': 0})
+        yield f'{operacion}:{dimension}:{valores[dimension]}', limite, contador
+
+
+def intentos_excedidos(operacion, email=None):
+    """
+    Consume un intento de `operacion` ('login' o 'registro') para la IP del cliente y revisa,
+    sin consumir, que el email no haya agotado sus intentos fallidos.
+    Retorna 0 si se permite, o los segundos que debe esperar el cliente.
+    """
+    limitador = current_app.extensions.get('limitador')
+    if limitador is None:
+        return 0
+
+    for cuenta, operar in (('intento', limitador.consumir), ('fallo', limitador.consultar)):
+        for clave, limite, contador in _claves(operacion, email, cuenta):
+            espera = operar(clave, *limite)
+            if espera:
+                contador['rechazados'] += 1
+                return espera
+            contador['permitidos'] += 1
+    return 0
+
+
+def registrar_fallo(operacion, email=None):
+    """ Cuenta un intento fallido (credenciales inválidas o formulario rechazado) para el email. """
+    limitador = current_app.extensions.get('limitador')
+    if limitador is None:
+        return
+    for clave, limite, contador in _claves(operacion, email, 'fallo'):
+        limitador.consumir(clave, *limite)
+        contador['fallos'] += 1
+
+
+def estadisticas(app):
+    """ Intentos permitidos y rechazados por regla, más el estado del backend. """
+    return {'reglas': contadores, **app.extensions['limitador'].estadisticas()}
+
+
+def init_app(app):
+    """ Crea el limitador de intentos de login y registro, salvo que LIMITES_BACKEND esté vacío. """
+    # Los límites mal escritos fallan al arrancar y no en el primer login
+    for reglas in REGLAS.values():
+        for _, opcion, _ in reglas:
+            parsear_limite(app.config[opcion])
+
+    limitador = crear_limitador(app)
+    if limitador is not None:
+        app.extensions['limitador'] = limitador
+        registrar_metrica(app, 'limites', lambda: estadisticas(app))
@@ -0,0 +1,170 @@
+"""
+Operaciones por lotes sobre libros para la API JSON: obtener, actualizar y eliminar muchos
+libros por petición. Los libros se cargan con consultas IN (en tramos de TAMAÑO_IN ids) y los
+cambios se confirman en una sola transacción, pasando por el ORM para que los listeners de
+eventos, versiones y estadísticas se apliquen igual que en las operaciones de a uno.
+"""
+from flask import current_app
+
+from app.concurrencia import ConflictoDeVersion, confirmar
+from app.exportacion import COLUMNAS_LIBRO, filas_por_id
+from app.importacion import FilaInvalida, validar_fila
+from app.models import db, Libro, User
+
+# Ids por consulta IN (por debajo del límite de parámetros de SQLite y de un tamaño razonable para MySQL)
+TAMAÑO_IN = 900
+
+# Columnas que se pueden modificar con actualizar_libros
+COLUMNAS_EDITABLES = set(COLUMNAS_LIBRO) - {'id', 'version'}
+
+
+class LoteInvalido(ValueError):
+    """ El cuerpo de una petición por lotes no tiene la forma esperada o excede el máximo. """
+
+
+def _como_id(valor):
+    if isinstance(valor, bool):
+        raise LoteInvalido(f'Invalid id: {valor!r}')
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise LoteInvalido(f'Invalid id: {valor!r}')
+
+
+def _es_id_valido(valor):
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+
+def _revisar_tamaño(elementos):
+    if not isinstance(elementos, list):
+        raise LoteInvalido('Expected a JSON list')
+    maximo = current_app.config['LOTE_API_MAXIMO']
+    if len(elementos) > maximo:
+        raise LoteInvalido(f'Too many items: {len(elementos)} (maximum {maximo})')
+
+
+def _datos(libro):
+    return {columna: getattr(libro, columna) for columna in COLUMNAS_LIBRO}
+
+
+def cargar_libros(ids):
+    """ Diccionario {id: Libro} de los libros existentes, con una consulta IN por tramo. """
+    ids = list(dict.fromkeys(ids))
+    libros = {}
+    for inicio in range(0, len(ids), TAMAÑO_IN):
+        tramo = ids[inicio:inicio + TAMAÑO_IN]
+        libros.update((libro.id, libro) for libro in Libro.query.filter(Libro.id.in_(tramo)))
+    return libros
+
+
+def obtener_libros(ids, columnas=None):
+    """
+    Retorna (libros en el orden pedido, ids que no existen). Solo se leen las `columnas`
+    pedidas (todas por defecto), sin cargar entidades del ORM.
+    """
+    _revisar_tamaño(ids)
+    ids = list(dict.fromkeys(_como_id(valor) for valor in ids))
+    encontrados = {}
+    for inicio in range(0, len(ids), TAMAÑO_IN):
+        encontrados.update(filas_por_id(ids[inicio:inicio + TAMAÑO_IN], columnas))
+    return (
+        [encontrados[id] for id in ids if id in encontrados],
+        [id for id in ids if id not in encontrados],
+    )
+
+
+def actualizar_libros(cambios, atomico=False):
+    """
+    Aplica una lista de cambios parciales [{'id': ..., 'titulo': ...}, ...] en una transacción.
+    Cada libro modificado se valida completo, con las mismas reglas que la importación.
+    Un cambio con 'version' solo se aplica si el libro sigue en esa versión ('conflicto' si no).
+
+    Retorna (resultados por elemento, confirmado). Con atomico=True, si algún elemento falla
+    no se aplica ninguno y los demás quedan como 'omitido'.
+    """
+    _revisar_tamaño(cambios)
+    if not all(isinstance(cambio, dict) and 'id' in cambio for cambio in cambios):
+        raise LoteInvalido("Every item must be an object with an 'id'")
+
+    libros = cargar_libros(_como_id(cambio['id']) for cambio in cambios)
+
+    # Bibliotecarios referenciados por los cambios, validados con una sola consulta. Solo se
+    # consultan los ids enteros; el resto se informa como 'invalido' en su elemento.
+    referidos_validos = list({cambio['bibliotecario_id'] for cambio in cambios
+                              if _es_id_valido(cambio.get('bibliotecario_id'))})
+    bibliotecarios = {libro.bibliotecario_id for libro in libros.values()}
+    if referidos_validos:
+        bibliotecarios |= {id for (id,) in db.session.query(User.id).filter(User.id.in_(referidos_validos))}
+
+    resultados, fallidos = [], 0
+    for cambio in cambios:
+        id = _como_id(cambio['id'])
+        libro = libros.get(id)
+        desconocidas = set(cambio) - COLUMNAS_EDITABLES - {'id', 'version'}
+        if libro is None:
+            resultados.append({'id': id, 'resultado': 'no_encontrado'})
+            fallidos += 1
+            continue
+        if desconocidas:
+            resultados.append({'id': id, 'resultado': 'invalido',
+                               'error': f'Unknown fields: {", ".join(sorted(desconocidas))}'})
+            fallidos += 1
+            continue
+        if cambio.get('bibliotecario_id') is not None and not _es_id_valido(cambio['bibliotecario_id']):
+            resultados.append({'id': id, 'resultado': 'invalido',
+                               'error': f"Invalid bibliotecario_id {cambio['bibliotecario_id']!r}"})
+            fallidos += 1
+            continue
+        if 'version' in cambio and cambio['version'] != libro.version:
+            resultados.append({'id': id, 'resultado': 'conflicto', 'version': libro.version})
+            fallidos += 1
+            continue
+        try:
+            fila = validar_fila({**_datos(libro), **cambio}, bibliotecarios)
+        except FilaInvalida as error:
+            resultados.append({'id': id, 'resultado': 'invalido', 'error': str(error)})
+            fallidos += 1
+            continue
+
+        modificadas = {columna: valor for columna, valor in fila.items() if getattr(libro, columna) != valor}
+        for columna, valor in modificadas.items():
+            setattr(libro, columna, valor)
+        resultados.append({'id': id, 'resultado': 'actualizado' if modificadas else 'sin_cambios'})
+
+    if atomico and fallidos:
+        db.session.rollback()
+        return _omitir(resultados), False
+    try:
+        confirmar()
+    except ConflictoDeVersion:
+        # Otra petición modificó alguno de los libros mientras tanto: no se aplicó ningún cambio
+        return _omitir(resultados), False
+    return resultados, True
+
+
+def _omitir(resultados):
+    for resultado in resultados:
+        if resultado['resultado'] in ('actualizado', 'sin_cambios'):
+            resultado['resultado'] = 'omitido'
+    return resultados
+
+
+def eliminar_libros(ids, atomico=False):
+    """
+    Elimina los libros indicados en una transacción. Retorna (resultados por id, confirmado).
+    Con atomico=True no se elimina ninguno si falta alguno.
+    """
+    _revisar_tamaño(ids)
+    ids = list(dict.fromkeys(_como_id(valor) for valor in ids))
+    libros = cargar_libros(ids)
+
+    if atomico and len(libros) < len(ids):
+        return [{'id': id, 'resultado': 'omitido' if id in libros else 'no_encontrado'} for id in ids], False
+
+    for libro in libros.values():
+        db.session.delete(libro)
+    try:
+        confirmar()
+    except ConflictoDeVersion:
+        return [{'id': id, 'resultado': 'omitido' if id in libros else 'no_encontrado'} for id in ids], False
+    return [{'id': id, 'resultado': 'eliminado' if id in libros else 'no_encontrado'} for id in ids], True
@@ -0,0 +1,41 @@
+from flask import Blueprint, current_app, jsonify
+from flask_login import login_required, current_user
+
+# Blueprint de métricas internas (cachés, conexiones, etc.) y estadísticas del catálogo, solo para administradores
+metricas = Blueprint('metricas', __name__)
+
+
+def registrar_metrica(app, nombre, funcion):
+    """
+    Registra una función sin argumentos que retorna un diccionario de métricas,
+    publicado en /metricas bajo la clave `nombre`.
+    """
+    app.extensions.setdefault('metricas', {})[nombre] = funcion
+
+
+@metricas.route('/metricas', methods=['GET'])
+@login_required
+def ver_metricas():
+    """
+    Retorna (JSON) las métricas de todos los componentes registrados.
+    """
+    if not current_user.tiene_permiso('ver_metricas'):
+        return jsonify({'error': 'Forbidden'}), 403
+
+    fuentes = current_app.extensions.get('metricas', {})
+    return jsonify({nombre: funcion() for nombre, funcion in fuentes.items()}), 200
+
+
+@metricas.route('/estadisticas', methods=['GET'])
+@login_required
+def ver_estadisticas():
+    """
+    Retorna (JSON) las estadísticas del catálogo: libros por categoría, estado y año,
+    y préstamos pendientes por bibliotecario.
+    """
+    if not current_user.tiene_permiso('ver_estadisticas'):
+        return jsonify({'error': 'Forbidden'}), 403
+
+    # Importación diferida: app.estadisticas depende de los modelos, que importan este módulo
+    from app.estadisticas import resumen
+    return jsonify(resumen()), 200
@@ -0,0 +1,8 @@
+"""Esquema inicial: role, user y libro"""
+from app.migraciones import crear_tabla
+
+
+def aplicar(conexion):
+    crear_tabla(conexion, 'role')
+    crear_tabla(conexion, 'user')
+    crear_tabla(conexion, 'libro')
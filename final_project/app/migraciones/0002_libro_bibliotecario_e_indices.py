@@ -0,0 +1,16 @@
+"""Columna libro.bibliotecario_id e índices de libro"""
+from app.migraciones import agregar_clave_foranea, agregar_columna, crear_indice
+
+
+def aplicar(conexion):
+    # Las bases creadas con 02_biblioteca.sql no tenían la columna del bibliotecario
+    agregar_columna(conexion, 'libro', 'bibliotecario_id')
+    agregar_clave_foranea(conexion, 'libro', 'bibliotecario_id')
+
+    crear_indice(conexion, 'libro', 'ix_libro_titulo')
+    crear_indice(conexion, 'libro', 'ix_libro_autor')
+    crear_indice(conexion, 'libro', 'ix_libro_isbn')
+    crear_indice(conexion, 'libro', 'ix_libro_categoria')
+    crear_indice(conexion, 'libro', 'ix_libro_año_publicacion')
+    crear_indice(conexion, 'libro', 'ix_libro_estado_categoria')
+    crear_indice(conexion, 'libro', 'ix_libro_bibliotecario_estado')
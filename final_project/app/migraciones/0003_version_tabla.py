@@ -0,0 +1,16 @@
+"""Tabla version_tabla para ETag / Last-Modified del catálogo"""
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+from app.migraciones import crear_tabla
+from app.models import VersionTabla
+
+
+def aplicar(conexion):
+    crear_tabla(conexion, 'version_tabla')
+
+    # La fila de libro se crea aquí para que los incrementos posteriores sean solo UPDATE
+    existe = conexion.execute(select(VersionTabla.tabla).where(VersionTabla.tabla == 'libro')).first()
+    if not existe:
+        conexion.execute(insert(VersionTabla).values(tabla='libro', version=1, modificado_en=datetime.utcnow()))
@@ -0,0 +1,10 @@
+"""Tabla estadistica_libro con los contadores incrementales del catálogo"""
+from app.estadisticas import recalcular
+from app.migraciones import crear_tabla
+
+
+def aplicar(conexion):
+    crear_tabla(conexion, 'estadistica_libro')
+
+    # Los contadores parten de los libros que ya existen
+    recalcular(conexion)
@@ -0,0 +1,11 @@
+"""Columna libro.version para el control de concurrencia optimista"""
+from sqlalchemy import text
+
+from app.migraciones import agregar_columna
+
+
+def aplicar(conexion):
+    agregar_columna(conexion, 'libro', 'version')
+
+    # Con filas existentes la columna se agrega como NULL: todos los libros parten de la versión 1
+    conexion.execute(text('UPDATE libro SET version = 1 WHERE version IS NULL'))
@@ -0,0 +1,7 @@
+"""Tabla tarea para las tareas en segundo plano"""
+from app.migraciones import crear_indice, crear_tabla
+
+
+def aplicar(conexion):
+    crear_tabla(conexion, 'tarea')
+    crear_indice(conexion, 'tarea', 'ix_tarea_estado')
@@ -0,0 +1,8 @@
+"""Tabla cambio_libro con el registro de cambios para la sincronización incremental"""
+from app.migraciones import crear_indice, crear_tabla
+
+
+def aplicar(conexion):
+    # Empieza vacía: los clientes hacen una carga completa con /listar_libro y siguen desde su cursor
+    crear_tabla(conexion, 'cambio_libro')
+    crear_indice(conexion, 'cambio_libro', 'ix_cambio_libro_libro_id')
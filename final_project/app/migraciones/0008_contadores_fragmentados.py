@@ -0,0 +1,11 @@
+"""Fragmentos en version_tabla y estadistica_libro para repartir los incrementos"""
+from sqlalchemy import inspect
+
+from app.migraciones import recrear_tabla
+
+
+def aplicar(conexion):
+    # La clave primaria pasa a incluir el fragmento; las filas actuales quedan en el fragmento 0
+    for tabla in ('version_tabla', 'estadistica_libro'):
+        if 'fragmento' not in {c['name'] for c in inspect(conexion).get_columns(tabla)}:
+            recrear_tabla(conexion, tabla)
@@ -0,0 +1,7 @@
+"""Proceso y latido de las tareas para detectar las que quedaron huérfanas"""
+from app.migraciones import agregar_columna
+
+
+def aplicar(conexion):
+    agregar_columna(conexion, 'tarea', 'proceso')
+    agregar_columna(conexion, 'tarea', 'latido_en')
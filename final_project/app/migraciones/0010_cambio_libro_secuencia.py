@@ -0,0 +1,21 @@
+"""Secuencia de confirmación en cambio_libro, que pasa a ser el cursor de los clientes"""
+from datetime import datetime
+
+from sqlalchemy import func, inspect, insert, select, update
+
+from app.migraciones import agregar_columna, crear_indice
+from app.models import CambioLibro, VersionTabla
+
+
+def aplicar(conexion):
+    if 'secuencia' not in {c['name'] for c in inspect(conexion).get_columns('cambio_libro')}:
+        agregar_columna(conexion, 'cambio_libro', 'secuencia')
+        # Las entradas existentes conservan su id como secuencia: los cursores ya entregados siguen valiendo
+        conexion.execute(update(CambioLibro).values(secuencia=CambioLibro.id))
+    crear_indice(conexion, 'cambio_libro', 'ix_cambio_libro_secuencia')
+
+    if conexion.execute(select(VersionTabla.tabla).where(VersionTabla.tabla == 'cambio_libro_secuencia')).first() is None:
+        ultima = conexion.execute(select(func.max(CambioLibro.secuencia))).scalar() or 0
+        conexion.execute(insert(VersionTabla).values(
+            tabla='cambio_libro_secuencia', version=ultima, modificado_en=datetime.utcnow()
+        ))
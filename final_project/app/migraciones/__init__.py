@@ -0,0 +1,186 @@
+"""
+Migraciones versionadas del esquema.
+
+Cada migración es un módulo NNNN_descripcion.py dentro de este paquete con una función
+aplicar(conexion). Las versiones aplicadas se registran en la tabla schema_version.
+Las operaciones de este módulo son idempotentes (revisan el esquema antes de cambiarlo),
+así que las migraciones funcionan tanto en una base nueva como en una creada con los .sql.
+"""
+import importlib
+import os
+import re
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.schema import AddConstraint, CreateIndex, CreateTable, ForeignKeyConstraint
+
+from app.models import db
+
+CARPETA = os.path.dirname(os.path.abspath(__file__))
+ARCHIVO_MIGRACION = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+# Tabla de control, fuera de db.metadata para no mezclarla con los modelos
+_metadata_control = MetaData()
+schema_version = Table(
+    'schema_version', _metadata_control,
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('descripcion', String(200), nullable=False),
+    Column('aplicada_en', DateTime, nullable=False),
+)
+
+
+# --- Operaciones disponibles para las migraciones ---------------------------------------------
+
+def crear_tabla(conexion, nombre):
+    """ Crea la tabla del modelo (sin sus índices) si todavía no existe. """
+    if not inspect(conexion).has_table(nombre):
+        conexion.execute(CreateTable(db.metadata.tables[nombre]))
+
+
+def agregar_columna(conexion, tabla, columna):
+    """
+    Agrega una columna del modelo si falta. Si la tabla ya tiene filas (o es SQLite, que no
+    admite NOT NULL sin valor por defecto) la columna se agrega como NULL para no romper los datos.
+    """
+    if columna in {c['name'] for c in inspect(conexion).get_columns(tabla)}:
+        return
+    definicion = db.metadata.tables[tabla].c[columna]
+    preparador = conexion.dialect.identifier_preparer
+    tipo = definicion.type.compile(dialect=conexion.dialect)
+    tiene_filas = conexion.execute(text(f'SELECT 1 FROM {preparador.quote(tabla)} LIMIT 1')).first()
+    nulo = '' if definicion.nullable or tiene_filas or conexion.dialect.name == 'sqlite' else ' NOT NULL'
+    conexion.execute(text(
+        f'ALTER TABLE {preparador.quote(tabla)} ADD COLUMN {preparador.quote(columna)} {tipo}{nulo}'
+    ))
+
+
+def agregar_clave_foranea(conexion, tabla, columna):
+    """ Agrega la clave foránea del modelo sobre la columna, si falta (SQLite no lo permite y se omite). """
+    if conexion.dialect.name == 'sqlite':
+        return
+    existentes = {tuple(fk['constrained_columns']) for fk in inspect(conexion).get_foreign_keys(tabla)}
+    if (columna,) in existentes:
+        return
+    for restriccion in db.metadata.tables[tabla].constraints:
+        if isinstance(restriccion, ForeignKeyConstraint) and list(restriccion.column_keys) == [columna]:
+            conexion.execute(AddConstraint(restriccion))
+
+
+def recrear_tabla(conexion, nombre):
+    """
+    Vuelve a crear la tabla con la definición del modelo (por ejemplo, para cambiar la clave
+    primaria, que SQLite no permite alterar), conservando los valores de las columnas que siguen
+    existiendo. Las filas se copian en memoria: solo para tablas chicas.
+    """
+    modelo = db.metadata.tables[nombre]
+    comunes = [c['name'] for c in inspect(conexion).get_columns(nombre) if c['name'] in modelo.c]
+    # Se leen con los tipos del modelo (fechas como datetime, por ejemplo) para volver a insertarlas
+    filas = conexion.execute(select(*[modelo.c[columna] for columna in comunes])).mappings().all()
+    conexion.execute(text(f'DROP TABLE {conexion.dialect.identifier_preparer.quote(nombre)}'))
+    conexion.execute(CreateTable(modelo))
+    if filas:
+        conexion.execute(modelo.insert(), [dict(fila) for fila in filas])
+
+
+def crear_indice(conexion, tabla, nombre):
+    """ Crea un índice declarado en el modelo si todavía no existe. """
+    if nombre in {indice['name'] for indice in inspect(conexion).get_indexes(tabla)}:
+        return
+    for indice in db.metadata.tables[tabla].indexes:
+        if indice.name == nombre:
+            conexion.execute(CreateIndex(indice))
+            return
+    raise ValueError(f'Index {nombre} is not declared on {tabla}')
+
+
+# --- Ejecución -------------------------------------------------------------------------------
+
+def migraciones_disponibles():
+    """ Lista ordenada de (versión, nombre de módulo) de las migraciones del paquete. """
+    encontradas = []
+    for archivo in os.listdir(CARPETA):
+        coincidencia = ARCHIVO_MIGRACION.match(archivo)
+        if coincidencia:
+            encontradas.append((int(coincidencia.group(1)), archivo[:-3]))
+    return sorted(encontradas)
+
+
+def versiones_aplicadas(conexion):
+    """ Conjunto de versiones ya registradas en schema_version. """
+    _metadata_control.create_all(conexion)
+    return {fila.version for fila in conexion.execute(select(schema_version.c.version))}
+
+
+def aplicar_pendientes(engine, hasta=None, al_aplicar=None):
+    """
+    Aplica en orden las migraciones pendientes (hasta la versión indicada, si se da).
+    Cada migración corre en su propia transacción junto con su registro en schema_version.
+
+    Retorna la lista de versiones aplicadas.
+    """
+    aplicadas = []
+    with engine.begin() as conexion:
+        ya_aplicadas = versiones_aplicadas(conexion)
+
+    for version, nombre in migraciones_disponibles():
+        if version in ya_aplicadas or (hasta is not None and version > hasta):
+            continue
+        modulo = importlib.import_module(f'{__name__}.{nombre}')
+        with engine.begin() as conexion:
+            modulo.aplicar(conexion)
+            conexion.execute(schema_version.insert().values(
+                version=version,
+                descripcion=(modulo.__doc__ or nombre).strip().splitlines()[0][:200],
+                aplicada_en=datetime.utcnow(),
+            ))
+        aplicadas.append(version)
+        if al_aplicar:
+            al_aplicar(version, nombre)
+    return aplicadas
+
+
+def diferencias(conexion):
+    """
+    Compara los modelos con el esquema real. Retorna las operaciones faltantes como
+    tuplas ('crear_tabla', tabla) / ('agregar_columna', tabla, columna) / ('crear_indice', tabla, indice).
+    """
+    inspector = inspect(conexion)
+    operaciones = []
+    for tabla in db.metadata.sorted_tables:
+        if not inspector.has_table(tabla.name):
+            operaciones.append(('crear_tabla', tabla.name))
+            operaciones.extend(('crear_indice', tabla.name, indice.name) for indice in sorted(tabla.indexes, key=lambda i: i.name))
+            continue
+        columnas = {c['name'] for c in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name not in columnas:
+                operaciones.append(('agregar_columna', tabla.name, columna.name))
+                if columna.foreign_keys:
+                    operaciones.append(('agregar_clave_foranea', tabla.name, columna.name))
+        indices = {indice['name'] for indice in inspector.get_indexes(tabla.name)}
+        for indice in sorted(tabla.indexes, key=lambda i: i.name):
+            if indice.name not in indices:
+                operaciones.append(('crear_indice', tabla.name, indice.name))
+    return operaciones
+
+
+def generar(engine, descripcion):
+    """
+    Escribe una nueva migración con las diferencias entre los modelos y la base de datos.
+    Retorna la ruta del archivo creado, o None si el esquema ya coincide con los modelos.
+    """
+    with engine.connect() as conexion:
+        operaciones = diferencias(conexion)
+    if not operaciones:
+        return None
+
+    version = max([v for v, _ in migraciones_disponibles()], default=0) + 1
+    nombre = re.sub(r'\W+', '_', descripcion.lower()).strip('_')
+    ruta = os.path.join(CARPETA, f'{version:04d}_{nombre}.py')
+
+    lineas = [f'"""{descripcion}"""', 'from app.migraciones import ' + ', '.join(sorted({op[0] for op in operaciones})), '', '',
+              'def aplicar(conexion):']
+    lineas += [f'    {op[0]}(conexion, ' + ', '.join(repr(argumento) for argumento in op[1:]) + ')' for op in operaciones]
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        archivo.write('\n'.join(lineas) + '\n')
+    return ruta
@@ -0,0 +1,63 @@
+"""
+Verificación con EXPLAIN de que las consultas más frecuentes de routes.py y auth_routes.py usan índices.
+"""
+from sqlalchemy import select, text
+from sqlalchemy.exc import DBAPIError
+
+from app.models import Libro, User
+from app.paginacion import filtrar_libros
+
+
+def consultas_criticas():
+    """
+    Consultas representativas de las rutas, como (nombre, sentencia). Se arman con los mismos
+    filtros que usan las vistas para que el chequeo siga a los cambios del código.
+    """
+    def pagina(**filtros):
+        return filtrar_libros(select(Libro), **filtros).order_by(Libro.id).limit(26)
+
+    return [
+        ('auth.login: usuario por email', select(User).where(User.email == 'lector@example.com')),
+        ('load_user: usuario por id', select(User).where(User.id == 1)),
+        ('dashboard: filtro por categoría', pagina(categoria='Novela')),
+        ('dashboard: filtro por estado y categoría', pagina(estado='Disponible', categoria='Novela')),
+        ('dashboard: filtro por año', pagina(año_publicacion=2001)),
+        ('dashboard: orden por título (keyset)',
+         select(Libro).where(Libro.titulo > 'M').order_by(Libro.titulo, Libro.id).limit(26)),
+        ('libros por ISBN', select(Libro).where(Libro.isbn == '978-3-16-148410-0')),
+        ('libros prestados por bibliotecario',
+         select(Libro).where(Libro.bibliotecario_id == 1, Libro.estado == 'Prestado')),
+        ('editar_libro: libro por id', select(Libro).where(Libro.id == 1)),
+    ]
+
+
+def _plan(conexion, sentencia):
+    """ Ejecuta EXPLAIN para la sentencia y retorna (usa_indice, descripción del plan). """
+    sql = str(sentencia.compile(dialect=conexion.dialect, compile_kwargs={'literal_binds': True}))
+
+    if conexion.dialect.name == 'sqlite':
+        filas = conexion.execute(text('EXPLAIN QUERY PLAN ' + sql)).fetchall()
+        detalles = [fila[-1] for fila in filas]
+        # "SCAN libro" sin índice es un recorrido completo de la tabla
+        completo = any(d.startswith('SCAN ') and 'USING' not in d for d in detalles)
+        return not completo, ' | '.join(detalles)
+
+    filas = conexion.execute(text('EXPLAIN ' + sql)).mappings().fetchall()
+    # En MySQL, type = ALL indica un recorrido completo de la tabla
+    completo = any(fila.get('type') == 'ALL' for fila in filas)
+    detalles = [f"{fila.get('table')}: type={fila.get('type')} key={fila.get('key')}" for fila in filas]
+    return not completo, ' | '.join(detalles)
+
+
+def verificar_planes(conexion):
+    """
+    Retorna una lista de (nombre, usa_indice, plan) para cada consulta crítica.
+    """
+    resultados = []
+    for nombre, sentencia in consultas_criticas():
+        try:
+            resultados.append((nombre, *_plan(conexion, sentencia)))
+        except DBAPIError as error:
+            # Por ejemplo, una columna que todavía no existe porque faltan migraciones
+            resultados.append((nombre, False, f'error: {error.orig}'))
+    return resultados
@@ -1,12 +1,56 @@
 from app import db, login_manager
+from flask import current_app
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from app.hashing import generar_hash, verificar_hash, necesita_rehash
 
 
 # Carga un usuario desde su ID, necesario para el sistema de sesiones de Flask-Login
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    """
+    Carga el usuario de la sesión junto con su rol. Si la caché de usuarios está activa,
+    la copia guardada se adjunta a la sesión con merge(load=False), sin consultar la base.
+    """
+    user_id = int(user_id)
+    cache = current_app.extensions.get('cache_usuarios')
+    if cache is None:
+        return User.query.options(joinedload(User.role)).filter_by(id=user_id).first()
+
+    copia = cache.obtener(user_id)
+    if copia is None:
+        usuario = User.query.options(joinedload(User.role)).filter_by(id=user_id).first()
+        if usuario is not None:
+            cache.guardar(user_id, _copia_desligada(usuario))
+        return usuario
+
+    return db.session.merge(copia, load=False)
+
+def _copia_desligada(usuario):
+    """
+    Copia de un usuario y su rol, sin sesión, apta para guardarse en caché y compartirse entre hilos.
+    (No se usa expunge: la instancia original puede seguir en uso en la petición actual.)
+    """
+    def copiar(objeto):
+        copia = type(objeto)(**{c.key: getattr(objeto, c.key) for c in objeto.__table__.columns})
+        make_transient_to_detached(copia)
+        return copia
+
+    copia = copiar(usuario)
+    # set_committed_value no dispara el backref: role.users no queda con una lista parcial
+    set_committed_value(copia, 'role', copiar(usuario.role))
+    return copia
+
+# Permisos de cada rol: las rutas y las plantillas los consultan con User.tiene_permiso.
+# Un permiso '<nombre>_propios' habilita la acción solo sobre los libros del usuario (ver puede).
+PERMISOS_POR_ROL = {
+    'Admin': frozenset({'ver_libros', 'crear_libros', 'editar_libros', 'eliminar_libros', 'prestar_libros',
+                        'ver_usuarios', 'ver_estadisticas', 'ver_metricas', 'gestionar_tareas'}),
+    'Bibliotecario': frozenset({'ver_libros', 'crear_libros', 'editar_libros_propios', 'eliminar_libros_propios',
+                                'prestar_libros'}),
+    'Lector': frozenset({'ver_libros'}),
+}
 
 # Modelo de roles (Admin, Professor, Student, etc.)
 class Role(db.Model):
@@ -33,28 +77,129 @@ class User(UserMixin, db.Model):
 
     def set_password(self, password: str):
         """
-        Genera y guarda el hash de la contraseña.
+        Genera y guarda el hash de la contraseña (en el pool de hashing, con el costo de HASH_METODO).
         """
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generar_hash(password)
 
     def check_password(self, password: str) -> bool:
         """
         Verifica si la contraseña ingresada es válida comparando con el hash.
         """
-        return check_password_hash(self.password_hash, password)
+        return verificar_hash(self.password_hash, password)
+
+    def password_desactualizado(self) -> bool:
+        """
+        Indica si el hash guardado usa un método o costo distinto al configurado en HASH_METODO.
+        """
+        return necesita_rehash(self.password_hash)
+
+    @property
+    def permisos(self) -> frozenset:
+        """
+        Permisos del usuario según su rol (no requiere consultas si el rol ya está cargado).
+        """
+        return PERMISOS_POR_ROL.get(self.role.name, frozenset()) if self.role else frozenset()
+
+    def tiene_permiso(self, permiso: str) -> bool:
+        return permiso in self.permisos
+
+    def puede(self, permiso: str, bibliotecario_id) -> bool:
+        """
+        Indica si el usuario puede hacer la acción sobre un libro del bibliotecario indicado: con el
+        permiso general ('editar_libros') o, si el libro es suyo, con el de sus libros ('editar_libros_propios').
+        """
+        return self.tiene_permiso(permiso) or (
+            self.tiene_permiso(f'{permiso}_propios') and bibliotecario_id == self.id
+        )
 
 # Modelo de libros 
 class Libro(db.Model):
     __tablename__ = 'libro'
 
+    # Índices compuestos para filtros combinados del dashboard y préstamos por bibliotecario.
+    # También sirven a los filtros por estado o por bibliotecario_id solos (prefijo izquierdo).
+    __table_args__ = (
+        db.Index('ix_libro_estado_categoria', 'estado', 'categoria'),
+        db.Index('ix_libro_bibliotecario_estado', 'bibliotecario_id', 'estado'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    titulo = db.Column(db.String(100), nullable=False)
-    autor = db.Column(db.String(100), nullable=False)
-    isbn = db.Column(db.String(20), nullable=False)
-    categoria = db.Column(db.String(50), nullable=False)
+    # Los índices simples sirven a los filtros y al orden por columna (el id va implícito en el índice)
+    titulo = db.Column(db.String(100), nullable=False, index=True)
+    autor = db.Column(db.String(100), nullable=False, index=True)
+    isbn = db.Column(db.String(20), nullable=False, index=True)
+    categoria = db.Column(db.String(50), nullable=False, index=True)
     estado = db.Column(db.String(50), nullable=False)
-    año_publicacion = db.Column(db.Integer, nullable=False)
+    año_publicacion = db.Column(db.Integer, nullable=False, index=True)
 
     bibliotecario_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     user=db.relationship('User', backref='libros')
-    
+
+    # Control de concurrencia optimista (ver app/concurrencia.py): el ORM agrega "AND version = ?"
+    # a cada UPDATE/DELETE y la incrementa; si otra transacción la cambió, el flush falla.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
+
+# Versión de cada tabla: se incrementa en la misma transacción que modifica sus filas
+# (ver app/versiones.py). Permite responder ETag / Last-Modified sin leer los datos.
+# Cada tabla tiene hasta CONTADORES_FRAGMENTOS filas; la versión es la suma de sus fragmentos.
+class VersionTabla(db.Model):
+    __tablename__ = 'version_tabla'
+
+    tabla = db.Column(db.String(50), primary_key=True)
+    fragmento = db.Column(db.Integer, primary_key=True, autoincrement=False, default=0)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    modificado_en = db.Column(db.DateTime, nullable=False)
+
+
+# Contadores del catálogo por dimensión ('categoria', 'estado', ...) y valor. Se actualizan
+# en la misma transacción que modifica los libros (ver app/estadisticas.py), repartidos en
+# fragmentos como version_tabla: el valor de un contador es la suma de sus fragmentos.
+class EstadisticaLibro(db.Model):
+    __tablename__ = 'estadistica_libro'
+
+    dimension = db.Column(db.String(30), primary_key=True)
+    valor = db.Column(db.String(100), primary_key=True)
+    fragmento = db.Column(db.Integer, primary_key=True, autoincrement=False, default=0)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+
+# Tareas en segundo plano (importaciones, reindexado, recálculos). Se ejecutan en el pool de
+# app/tareas.py; la fila guarda el estado y el progreso para consultarlos desde cualquier worker.
+class Tarea(db.Model):
+    __tablename__ = 'tarea'
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    # 'pendiente', 'ejecutando', 'completada', 'fallida' o 'cancelada'
+    estado = db.Column(db.String(20), nullable=False, default='pendiente', index=True)
+    progreso = db.Column(db.Float, nullable=False, default=0)
+    parametros = db.Column(db.JSON)
+    resultado = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    # Cancelación pedida: la tarea la revisa cada vez que informa su progreso
+    cancelar = db.Column(db.Boolean, nullable=False, default=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    creada_en = db.Column(db.DateTime, nullable=False)
+    iniciada_en = db.Column(db.DateTime)
+    terminada_en = db.Column(db.DateTime)
+    # Proceso que la ejecuta ('host:pid:arranque') y su último latido: si el proceso muere, la
+    # tarea deja de latir y se marca como fallida (ver tareas.recuperar_huerfanas)
+    proceso = db.Column(db.String(100))
+    latido_en = db.Column(db.DateTime)
+
+# Registro de cambios de libros (solo se agrega), para la sincronización incremental de clientes
+# (ver app/cambios.py). No hay clave foránea porque las eliminaciones quedan registradas después
+# de borrado el libro.
+class CambioLibro(db.Model):
+    __tablename__ = 'cambio_libro'
+
+    id = db.Column(db.Integer, primary_key=True)
+    libro_id = db.Column(db.Integer, nullable=False, index=True)
+    # 'crear', 'actualizar' o 'eliminar'
+    accion = db.Column(db.String(10), nullable=False)
+    version = db.Column(db.Integer)
+    creado_en = db.Column(db.DateTime, nullable=False)
+    # Orden de confirmación, que es el cursor de los clientes: se asigna después del commit
+    # (cambios.secuenciar), así que es NULL mientras la entrada no se secuenció
+    secuencia = db.Column(db.Integer, unique=True, index=True)
@@ -0,0 +1,118 @@
+import base64
+import json
+
+from sqlalchemy import and_, or_
+
+from app.models import Libro
+
+# Columnas por las que se puede ordenar el listado de libros del dashboard
+COLUMNAS_ORDENABLES = {
+    'id': Libro.id,
+    'titulo': Libro.titulo,
+    'autor': Libro.autor,
+    'isbn': Libro.isbn,
+    'categoria': Libro.categoria,
+    'estado': Libro.estado,
+    'año_publicacion': Libro.año_publicacion,
+}
+
+
+def codificar_cursor(valor, id):
+    """
+    Convierte la última fila de una página (valor de orden + id) en un cursor opaco para la URL.
+    """
+    crudo = json.dumps([valor, id]).encode('utf-8')
+    return base64.urlsafe_b64encode(crudo).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """
+    Recupera (valor, id) desde un cursor. Retorna None si el cursor no es válido: además del
+    formato se validan los tipos, porque un cursor manipulado llega a la comparación en SQL.
+    """
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        decodificado = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(decodificado, list) or len(decodificado) != 2:
+        return None
+    valor, id = decodificado
+    # bool es subclase de int, pero ninguna columna ordenable es booleana
+    if isinstance(valor, bool) or not isinstance(valor, (int, str, type(None))):
+        return None
+    if isinstance(id, bool) or not isinstance(id, int):
+        return None
+    return valor, id
+
+
+def filtrar_libros(query, categoria=None, estado=None, año_publicacion=None):
+    """
+    Aplica los filtros del dashboard (igualdad exacta) sobre una consulta de libros.
+    """
+    if categoria:
+        query = query.filter(Libro.categoria == categoria)
+    if estado:
+        query = query.filter(Libro.estado == estado)
+    if año_publicacion is not None:
+        query = query.filter(Libro.año_publicacion == año_publicacion)
+    return query
+
+
+def paginar_keyset(query, orden='id', direccion='asc', despues=None, antes=None, por_pagina=25):
+    """
+    Pagina una consulta de libros por cursor (keyset) en lugar de OFFSET.
+
+    El orden siempre se desempata por Libro.id, de modo que (columna, id) es único y
+    cada página se obtiene con un "WHERE (columna, id) > cursor ... LIMIT n" cuyo costo
+    no depende de lo profunda que sea la página.
+
+    Retorna un diccionario con los libros de la página y los cursores anterior/siguiente.
+    """
+    columna = COLUMNAS_ORDENABLES.get(orden, Libro.id)
+    descendente = direccion == 'desc'
+
+    cursor = decodificar_cursor(antes) or decodificar_cursor(despues)
+    hacia_atras = decodificar_cursor(antes) is not None
+
+    # Al retroceder se recorre el índice en sentido contrario y luego se invierte el resultado
+    avanzar_desc = descendente != hacia_atras
+
+    if cursor is not None:
+        valor, ultimo_id = cursor
+        if columna is Libro.id:
+            condicion = Libro.id < ultimo_id if avanzar_desc else Libro.id > ultimo_id
+        elif avanzar_desc:
+            condicion = or_(columna < valor, and_(columna == valor, Libro.id < ultimo_id))
+        else:
+            condicion = or_(columna > valor, and_(columna == valor, Libro.id > ultimo_id))
+        query = query.filter(condicion)
+
+    if avanzar_desc:
+        query = query.order_by(columna.desc(), Libro.id.desc())
+    else:
+        query = query.order_by(columna.asc(), Libro.id.asc())
+
+    # Se pide una fila extra para saber si existe otra página sin hacer un COUNT(*)
+    filas = query.limit(por_pagina + 1).all()
+    hay_mas = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+
+    if hacia_atras:
+        filas.reverse()
+
+    def cursor_de(libro):
+        return codificar_cursor(getattr(libro, columna.key), libro.id)
+
+    if hacia_atras:
+        hay_anterior, hay_siguiente = hay_mas, True
+    else:
+        hay_anterior, hay_siguiente = cursor is not None, hay_mas
+
+    return {
+        'libros': filas,
+        'anterior': cursor_de(filas[0]) if filas and hay_anterior else None,
+        'siguiente': cursor_de(filas[-1]) if filas and hay_siguiente else None,
+    }
@@ -0,0 +1,28 @@
+"""
+Caché persistente de bytecode de Jinja: las plantillas compiladas se guardan en disco y
+los workers nuevos las cargan sin volver a compilarlas. precompilar() llena la caché durante
+el despliegue, antes de que llegue la primera petición.
+"""
+import os
+
+from jinja2 import FileSystemBytecodeCache
+
+
+def init_app(app):
+    """
+    Activa la caché de bytecode en PLANTILLAS_CACHE_DIR ('' la desactiva).
+    Debe llamarse antes de que se use app.jinja_env, que se crea con las opciones del momento.
+    """
+    directorio = app.config['PLANTILLAS_CACHE_DIR']
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+        app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(directorio)}
+
+
+def precompilar(app):
+    """ Compila todas las plantillas de la aplicación y sus blueprints. Retorna los nombres compilados. """
+    compiladas = []
+    for nombre in sorted(app.jinja_env.list_templates(extensions=['html'])):
+        app.jinja_env.get_template(nombre)
+        compiladas.append(nombre)
+    return compiladas
@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from app import db
+from app.metricas_routes import registrar_metrica
+
+logger = logging.getLogger('app.pool')
+
+# Opciones que solo tienen sentido con un pool de tamaño fijo (QueuePool)
+OPCIONES_QUEUEPOOL = ('pool_size', 'max_overflow', 'pool_timeout')
+
+
+class PoolMedido(QueuePool):
+    """
+    QueuePool que mide cuánto tarda cada petición en obtener una conexión
+    (incluye abrir una nueva si el pool aún no está lleno).
+    """
+
+    # Esperas más largas que esto (segundos) se registran en el log; se ajusta desde la configuración
+    espera_lenta = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock_metricas = threading.Lock()
+        self.checkouts = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+        self.esperas_lentas = 0
+        self.timeouts = 0
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexion = super()._do_get()
+        except PoolTimeoutError:
+            with self._lock_metricas:
+                self.timeouts += 1
+            logger.warning('Connection pool exhausted: %s', self.status())
+            raise
+
+        espera = time.perf_counter() - inicio
+        with self._lock_metricas:
+            self.checkouts += 1
+            self.espera_total += espera
+            self.espera_maxima = max(self.espera_maxima, espera)
+            lenta = self.espera_lenta is not None and espera > self.espera_lenta
+            if lenta:
+                self.esperas_lentas += 1
+        if lenta:
+            logger.warning('Waited %.3f s for a database connection: %s', espera, self.status())
+        return conexion
+
+    def metricas(self):
+        with self._lock_metricas:
+            return {
+                'checkouts': self.checkouts,
+                'espera_promedio_ms': round(1000 * self.espera_total / self.checkouts, 3) if self.checkouts else None,
+                'espera_maxima_ms': round(1000 * self.espera_maxima, 3),
+                'esperas_lentas': self.esperas_lentas,
+                'timeouts': self.timeouts,
+            }
+
+
+def _es_sqlite_en_memoria(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def preparar(app):
+    """
+    Ajusta SQLALCHEMY_ENGINE_OPTIONS antes de crear el engine: usa PoolMedido cuando hay un pool
+    de tamaño fijo y quita las opciones de QueuePool para SQLite en memoria (usa un pool propio).
+    """
+    opciones = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+
+    if _es_sqlite_en_memoria(app.config['SQLALCHEMY_DATABASE_URI']):
+        for opcion in OPCIONES_QUEUEPOOL:
+            opciones.pop(opcion, None)
+    elif any(opcion in opciones for opcion in OPCIONES_QUEUEPOOL):
+        opciones.setdefault('poolclass', PoolMedido)
+
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opciones
+
+
+def _limitar_tiempo_de_consultas(engine, milisegundos):
+    """ Fija el tiempo máximo por consulta en cada conexión nueva (MySQL y PostgreSQL). """
+    dialecto = engine.dialect.name
+    if dialecto == 'mysql':
+        sentencia = f'SET SESSION max_execution_time = {milisegundos}'
+    elif dialecto == 'postgresql':
+        sentencia = f'SET statement_timeout = {milisegundos}'
+    else:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _al_conectar(conexion_dbapi, registro):
+        cursor = conexion_dbapi.cursor()
+        cursor.execute(sentencia)
+        cursor.close()
+
+
+def estado_pools():
+    """ Conexiones en uso, libres y tiempos de espera de cada engine. """
+    estado = {}
+    for nombre, engine in db.engines.items():
+        pool = engine.pool
+        datos = {'clase': type(pool).__name__, 'estado': pool.status()}
+        if isinstance(pool, QueuePool):
+            datos.update({
+                'tamaño': pool.size(),
+                'en_uso': pool.checkedout(),
+                'libres': pool.checkedin(),
+                'overflow': pool.overflow(),
+            })
+        if isinstance(pool, PoolMedido):
+            datos.update(pool.metricas())
+        estado[nombre or 'default'] = datos
+    return estado
+
+
+def init_app(app):
+    """ Configura los engines ya creados y publica el estado de los pools en /metricas. """
+    PoolMedido.espera_lenta = app.config['DB_POOL_ESPERA_LENTA']
+
+    with app.app_context():
+        if app.config['DB_TIMEOUT_SENTENCIA_MS']:
+            for engine in db.engines.values():
+                _limitar_tiempo_de_consultas(engine, app.config['DB_TIMEOUT_SENTENCIA_MS'])
+
+    registrar_metrica(app, 'pool', estado_pools)
@@ -0,0 +1,114 @@
+"""
+Lecturas desde réplicas de la base de datos.
+
+Con DATABASE_REPLICAS configurado, cada réplica es un bind 'replica_N' de Flask-SQLAlchemy y
+db.session (SesionEnrutada) decide el engine de cada sentencia:
+
+- Peticiones de solo lectura (GET, HEAD, OPTIONS): los SELECT van a una réplica elegida al azar
+  al comienzo de la petición.
+- Cualquier otra petición, el flush del ORM, las sentencias INSERT/UPDATE/DELETE y todo lo que se
+  ejecuta fuera de una petición (CLI, tareas en segundo plano) usan la primaria.
+- Si una petición de lectura llega a escribir, el resto de la petición lee de la primaria.
+- Lectura después de escritura: quien escribió queda fijado a la primaria durante
+  REPLICA_RETRASO_MAX segundos (marca en la sesión de Flask), para que vea sus propios cambios
+  aunque la réplica todavía no los haya recibido.
+- Las vistas marcadas con @solo_primaria siempre leen de la primaria.
+
+Para probarlo en local alcanza con dos archivos SQLite: la réplica es una copia de la primaria
+que no recibe los cambios posteriores.
+"""
+import random
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+from app.metricas_routes import registrar_metrica
+
+PREFIJO_REPLICA = 'replica_'
+METODOS_LECTURA = ('GET', 'HEAD', 'OPTIONS')
+
+# Decisiones de enrutamiento por petición, publicadas en /metricas
+contadores = {
+    'replica': 0,
+    'primaria_escritura': 0,
+    'primaria_tras_escritura': 0,
+    'primaria_vista': 0,
+    'escrituras_en_lectura': 0,
+}
+
+
+def solo_primaria(vista):
+    """ Marca una vista que debe leer siempre de la primaria (por ejemplo, un formulario de edición). """
+    vista.solo_primaria = True
+    return vista
+
+
+class SesionEnrutada(Session):
+    """ db.session que envía los SELECT de las peticiones de solo lectura a la réplica elegida. """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and getattr(clause, 'is_select', False) and has_request_context():
+            replica = g.get('bind_lectura')
+            if replica is not None:
+                return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _marcar_escritura(*args, **kwargs):
+    """ La petición escribió: lo que queda de ella lee de la primaria, y también las siguientes del usuario. """
+    if has_request_context():
+        if g.get('bind_lectura') is not None:
+            contadores['escrituras_en_lectura'] += 1
+            g.bind_lectura = None
+        g.escribio = True
+
+
+@event.listens_for(SesionEnrutada, 'do_orm_execute')
+def _detectar_dml(estado):
+    # INSERT/UPDATE/DELETE ejecutados con db.session.execute, sin pasar por el flush
+    if estado.is_insert or estado.is_update or estado.is_delete:
+        _marcar_escritura()
+
+
+event.listen(SesionEnrutada, 'after_flush', _marcar_escritura)
+
+
+def _elegir_base(replicas):
+    """ Elige al comienzo de la petición de dónde se lee. """
+    g.bind_lectura = None
+    if request.method not in METODOS_LECTURA:
+        contadores['primaria_escritura'] += 1
+        return
+    if session.get('primaria_hasta', 0) > time.time():
+        contadores['primaria_tras_escritura'] += 1
+        return
+    vista = current_app.view_functions.get(request.endpoint)
+    if getattr(vista, 'solo_primaria', False):
+        contadores['primaria_vista'] += 1
+        return
+    g.bind_lectura = random.choice(replicas)
+    contadores['replica'] += 1
+
+
+def _fijar_tras_escritura(respuesta):
+    if g.get('escribio'):
+        session['primaria_hasta'] = time.time() + current_app.config['REPLICA_RETRASO_MAX']
+    return respuesta
+
+
+def estadisticas(replicas):
+    """ Réplicas configuradas y decisiones de enrutamiento. """
+    return dict(contadores, replicas=replicas)
+
+
+def init_app(app):
+    """ Activa el enrutamiento de lecturas si hay réplicas configuradas (binds 'replica_N'). """
+    replicas = sorted(nombre for nombre in app.config.get('SQLALCHEMY_BINDS') or {}
+                      if nombre.startswith(PREFIJO_REPLICA))
+    if not replicas:
+        return
+    app.before_request(lambda: _elegir_base(replicas))
+    app.after_request(_fijar_tras_escritura)
+    registrar_metrica(app, 'replicas', lambda: estadisticas(replicas))
@@ -1,7 +1,21 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash
+from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app
 from flask_login import login_required, current_user
 from app.forms import LibroForm, ChangePasswordForm
 from app.models import db, Libro, User
+from sqlalchemy.orm import contains_eager
+from app.paginacion import COLUMNAS_ORDENABLES, filtrar_libros, paginar_keyset
+from app.busqueda import buscar_libros
+from app.replicas import solo_primaria
+from app.concurrencia import ConflictoDeVersion, cambiar_estado, confirmar
+from app.estadisticas import resumen
+from app.versiones import version_de
+from markupsafe import Markup
+from urllib.parse import urlencode
+
+# Parámetros de la URL que cambian el contenido de la tabla del dashboard (forman la clave de la caché)
+PARAMETROS_CATALOGO = ('categoria', 'estado', 'año_publicacion', 'orden', 'direccion', 'por_pagina',
+                       'q', 'pagina', 'despues', 'antes')
+COLUMNAS_CATALOGO = ('id', 'titulo', 'autor', 'isbn', 'categoria', 'estado', 'año_publicacion', 'bibliotecario_id')
 
 # Blueprint principal que maneja el dashboard, gestión de cursos y cambio de contraseña
 main = Blueprint('main', __name__)
@@ -37,14 +51,100 @@ def cambiar_password():
 @login_required
 def dashboard():
     """
-    Panel principal del usuario. Muestra los libros si no es lector.
+    Panel principal del usuario. Muestra los libros paginados por cursor,
+    con filtros por categoría, estado y año, y orden por columna.
+    La página consultada y sus filas renderizadas se guardan en la caché de páginas.
     """
-    if current_user.role.name in ['Admin', 'Lector', 'Bibliotecario']:
-        libros = Libro.query.all()
+    # Parámetros de filtrado y orden recibidos por la URL
+    filtros = {
+        'categoria': request.args.get('categoria', '').strip(),
+        'estado': request.args.get('estado', '').strip(),
+        'año_publicacion': request.args.get('año_publicacion', type=int),
+    }
+    orden = request.args.get('orden', 'id')
+    if orden not in COLUMNAS_ORDENABLES:
+        orden = 'id'
+    direccion = 'desc' if request.args.get('direccion') == 'desc' else 'asc'
+
+    por_pagina = request.args.get('por_pagina', current_app.config['LIBROS_POR_PAGINA'], type=int)
+    por_pagina = max(1, min(por_pagina, current_app.config['LIBROS_POR_PAGINA_MAX']))
+
+    # Texto de búsqueda: si existe, los resultados salen del índice ordenados por relevancia
+    q = request.args.get('q', '').strip()
+
+    if current_user.tiene_permiso('ver_libros'):
+        cache = current_app.extensions.get('cache_paginas')
+        # La versión de la tabla en la clave descarta también lo que otros workers dejaron en caché
+        clave = 'catalogo:{}:{}'.format(version_de(Libro.__tablename__)[0], urlencode(sorted(
+            (campo, valor) for campo, valor in request.args.items(multi=True) if campo in PARAMETROS_CATALOGO
+        )))
+        pagina = cache.obtener(clave) if cache is not None else None
+        if pagina is None:
+            pagina = _consultar_catalogo(q, filtros, orden, direccion, por_pagina)
+            if cache is not None:
+                cache.guardar(clave, pagina)
+
+        # Las filas renderizadas dependen del rol y, si solo puede modificar sus libros, de cuáles son suyos
+        clave_filas = f'{clave}:filas:{current_user.role.name}'
+        if any(permiso.endswith('_propios') for permiso in current_user.permisos):
+            clave_filas += f':{current_user.id}'
+        filas = cache.obtener(clave_filas) if cache is not None else None
+        if filas is None:
+            filas = render_template('_filas_libros.html', libros=pagina['libros'])
+            if cache is not None:
+                cache.guardar(clave_filas, filas)
     else:
-        libros = []
+        pagina = {'libros': [], 'anterior': None, 'siguiente': None}
+        filas = ''
+
+    # Filtros activos, para conservarlos en los enlaces de orden y navegación
+    parametros = {clave: valor for clave, valor in filtros.items() if valor not in ('', None)}
+    if q:
+        parametros['q'] = q
 
-    return render_template('dashboard.html', libros=libros)
+    # Panel de estadísticas del catálogo para administradores (lee los contadores, no agrupa libros)
+    estadisticas = resumen() if current_user.tiene_permiso('ver_estadisticas') else None
+
+    return render_template(
+        'dashboard.html',
+        filas=Markup(filas),
+        estadisticas=estadisticas,
+        pagina=pagina,
+        filtros=filtros,
+        parametros=parametros,
+        q=q,
+        orden=orden,
+        direccion=direccion,
+        por_pagina=por_pagina,
+    )
+
+def _consultar_catalogo(q, filtros, orden, direccion, por_pagina):
+    """
+    Página del catálogo para el dashboard, con los libros como diccionarios
+    para poder guardarla en la caché de páginas.
+    """
+    if q:
+        numero = max(1, request.args.get('pagina', 1, type=int))
+        libros, total = buscar_libros(q, pagina=numero, por_pagina=por_pagina, **filtros)
+        pagina = {
+            'libros': libros,
+            'total': total,
+            'anterior': numero - 1 if numero > 1 else None,
+            'siguiente': numero + 1 if numero * por_pagina < total else None,
+        }
+    else:
+        pagina = paginar_keyset(
+            filtrar_libros(Libro.query, **filtros),
+            orden=orden,
+            direccion=direccion,
+            despues=request.args.get('despues'),
+            antes=request.args.get('antes'),
+            por_pagina=por_pagina,
+        )
+    pagina['libros'] = [
+        {columna: getattr(libro, columna) for columna in COLUMNAS_CATALOGO} for libro in pagina['libros']
+    ]
+    return pagina
 
 @main.route('/libros', methods=['GET', 'POST'])
 @login_required
@@ -72,19 +172,26 @@ def libro():
 
 @main.route('/libros/<int:id>/editar', methods=['GET', 'POST'])
 @login_required
+@solo_primaria  # el formulario lleva la versión actual del libro (concurrencia optimista)
 def editar_libro(id):
     """
     Permite editar un libro existente. Solo si es admin o el bibliotecario.
+    Si otro usuario guardó el libro mientras se editaba, no se sobrescribe: se muestran los valores actuales.
     """
     libro = Libro.query.get_or_404(id)
 
     # Validación de permisos:
     # El admin puede editar cualquier libro.
     # El bibliotecario solo puede editar los libros que él mismo ha creado (libro.bibliotecario_id == current_user.id).
-    if current_user.role.name == 'Admin' or libro.bibliotecario_id == current_user.id:
+    if current_user.puede('editar_libros', libro.bibliotecario_id):
         form = LibroForm(obj=libro)
 
         if form.validate_on_submit():
+            # El formulario se abrió sobre otra versión del libro: se recarga con los valores actuales
+            if form.version.data and form.version.data != str(libro.version):
+                flash('This book was changed by someone else while you were editing it. Review the current values and save again.')
+                return render_template('libro_form.html', form=LibroForm(formdata=None, obj=libro), editar=True)
+
             libro.titulo = form.titulo.data
             libro.autor = form.autor.data
             libro.isbn = form.isbn.data
@@ -92,7 +199,11 @@ def editar_libro(id):
             libro.estado = form.estado.data
             libro.año_publicacion = form.año_publicacion.data
 
-            db.session.commit()
+            try:
+                confirmar()
+            except ConflictoDeVersion:
+                flash('This book was changed by someone else while you were editing it. Review the current values and save again.')
+                return redirect(url_for('main.editar_libro', id=id))
             flash("Book updated successfully.")  # 🔁 Traducido
             return redirect(url_for('main.dashboard'))
         
@@ -111,24 +222,50 @@ def eliminar_libro(id):
 
     # Validación de permisos: El admin puede eliminar cualquier libro.
     
-    if current_user.role.name not in ['Admin', 'Bibliotecario'] or (
-        libro.bibliotecario_id != current_user.id and current_user.role.name != 'Admin'):
+    if not current_user.puede('eliminar_libros', libro.bibliotecario_id):
         flash('You do not have permission to delete this book.')  # 🔁 Traducido
         return redirect(url_for('main.dashboard'))
 
     db.session.delete(libro)
-    db.session.commit()
+    try:
+        confirmar()
+    except ConflictoDeVersion:
+        flash('This book was changed by someone else. Review it before deleting it.')
+        return redirect(url_for('main.dashboard'))
     flash("Book deleted successfully.")  # 🔁 Traducido
     return redirect(url_for('main.dashboard'))
 
+@main.route('/libros/<int:id>/<any(prestar, devolver):accion>', methods=['POST'])
+@login_required
+def prestar_libro(id, accion):
+    """
+    Presta o devuelve un libro (admin o bibliotecario). El cambio de estado es atómico:
+    si dos usuarios prestan el mismo libro a la vez, solo uno lo consigue.
+    """
+    if not current_user.tiene_permiso('prestar_libros'):
+        flash('You do not have permission to lend or return books.')
+        return redirect(url_for('main.dashboard'))
+
+    resultado, libro = cambiar_estado(id, accion)
+    if libro is None:
+        flash('Book not found.')
+    elif resultado == 'ok':
+        flash(f'"{libro.titulo}" {"lent" if accion == "prestar" else "returned"} successfully.')
+    elif resultado == 'conflicto_estado':
+        flash(f'"{libro.titulo}" is already {"on loan" if accion == "prestar" else "available"}.')
+    else:
+        flash(f'"{libro.titulo}" is being modified by someone else, please try again.')
+    return redirect(url_for('main.dashboard'))
+
 @main.route('/usuarios')
 @login_required
 def listar_usuarios():
-    if current_user.role.name != 'Admin':
+    if not current_user.tiene_permiso('ver_usuarios'):
         flash("You do not have permission to view this page.")
         return redirect(url_for('main.dashboard'))
 
-    # Obtener instancias completas de usuarios con sus roles (no usar .add_columns)
-    usuarios = User.query.join(User.role).all()
+    # Obtener instancias completas de usuarios con sus roles (no usar .add_columns).
+    # contains_eager reutiliza el JOIN para llenar usuario.role y evitar una consulta por fila.
+    usuarios = User.query.join(User.role).options(contains_eager(User.role)).all()
 
     return render_template('usuarios.html', usuarios=usuarios)
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+Negociación del formato de las respuestas de la API (JSON, NDJSON o MessagePack según
+?formato= o la cabecera Accept) y compresión gzip: al vuelo en las respuestas transmitidas
+y al final de la petición en las demás respuestas grandes.
+"""
+import gzip
+
+import msgpack
+from flask import Response, current_app, jsonify, request, stream_with_context
+
+from app.exportacion import comprimir_gzip
+
+# Formatos de la API y su tipo MIME
+FORMATOS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'msgpack': 'application/x-msgpack',
+}
+
+# Otros nombres con los que los clientes piden MessagePack en Accept
+ALIAS_MSGPACK = ('application/msgpack', 'application/vnd.msgpack')
+
+# Tipos que vale la pena comprimir (MessagePack también: repite textos como categorías y autores)
+TIPOS_COMPRIMIBLES = ('text/', 'application/json', 'application/x-ndjson', 'application/javascript',
+                      'application/xml', 'application/x-msgpack')
+
+
+def negociar(permitidos=('json', 'msgpack')):
+    """
+    Elige el formato de la respuesta: ?formato= tiene prioridad; si no, el mejor tipo de Accept
+    entre los permitidos. Por defecto JSON. Retorna None si ?formato= pide uno no permitido.
+    """
+    formato = request.args.get('formato')
+    if formato:
+        return formato if formato in permitidos else None
+
+    ofrecidos = [FORMATOS[nombre] for nombre in permitidos]
+    if 'msgpack' in permitidos:
+        ofrecidos += ALIAS_MSGPACK
+    elegido = request.accept_mimetypes.best_match(ofrecidos, default=FORMATOS['json'])
+    return 'msgpack' if elegido in ALIAS_MSGPACK else next(n for n, t in FORMATOS.items() if t == elegido)
+
+
+def acepta_gzip():
+    """ Indica si el cliente acepta respuestas gzip y la compresión está activada. """
+    return current_app.config['COMPRESION_GZIP'] and request.accept_encodings['gzip'] > 0
+
+
+def responder(datos, estado=200, formato=None):
+    """ Respuesta con `datos` en JSON o MessagePack según lo negociado con el cliente. """
+    formato = formato or negociar() or 'json'
+    if formato == 'msgpack':
+        respuesta = Response(msgpack.packb(datos), status=estado, mimetype=FORMATOS['msgpack'])
+    else:
+        respuesta = jsonify(datos)
+        respuesta.status_code = estado
+    respuesta.vary.add('Accept')
+    return respuesta
+
+
+def transmitir(partes, mimetype, estado=200, **opciones):
+    """
+    Respuesta transmitida (streaming) con los fragmentos dados, comprimida al vuelo
+    con gzip si el cliente la acepta.
+    """
+    comprimir = acepta_gzip()
+    if comprimir:
+        partes = comprimir_gzip(partes, nivel=current_app.config['COMPRESION_NIVEL'])
+    respuesta = Response(stream_with_context(partes), status=estado, mimetype=mimetype, **opciones)
+    if comprimir:
+        respuesta.headers['Content-Encoding'] = 'gzip'
+    respuesta.vary.update(('Accept', 'Accept-Encoding'))
+    return respuesta
+
+
+def _comprimir_respuesta(app, respuesta):
+    """ Comprime con gzip las respuestas completas de al menos COMPRESION_MINIMA bytes. """
+    if (respuesta.status_code != 200 or respuesta.is_streamed or respuesta.direct_passthrough
+            or 'Content-Encoding' in respuesta.headers
+            or not (respuesta.mimetype or '').startswith(TIPOS_COMPRIMIBLES)):
+        return respuesta
+
+    respuesta.vary.add('Accept-Encoding')
+    if not acepta_gzip():
+        return respuesta
+
+    cuerpo = respuesta.get_data()
+    if len(cuerpo) < app.config['COMPRESION_MINIMA']:
+        return respuesta
+    respuesta.set_data(gzip.compress(cuerpo, compresslevel=app.config['COMPRESION_NIVEL']))
+    respuesta.headers['Content-Encoding'] = 'gzip'
+    return respuesta
+
+
+def init_app(app):
+    """ Con COMPRESION_GZIP, comprime al final de la petición las respuestas grandes no transmitidas. """
+    if app.config['COMPRESION_GZIP']:
+        app.after_request(lambda respuesta: _comprimir_respuesta(app, respuesta))
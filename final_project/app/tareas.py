@@ -0,0 +1,411 @@
+"""
+Tareas en segundo plano para las operaciones largas del catálogo (importaciones masivas,
+reindexado, recálculo de estadísticas, generación de datos), fuera del hilo de la petición.
+
+Cada tarea es una fila de la tabla tarea con su estado y progreso, así que se puede consultar
+desde cualquier worker. Se ejecuta en un pool de hilos acotado (TAREAS_WORKERS) del worker que
+la recibió: el trabajo es casi todo de base de datos, que libera el GIL. Con más de
+TAREAS_MAXIMO_PENDIENTES tareas en curso en el proceso, las nuevas se rechazan (ColaLlena).
+
+Las funciones de cada tipo reciben un Progreso: al informar su avance se enteran de si se pidió
+cancelarlas (lanza TareaCancelada). Lo ya confirmado por la tarea no se deshace al cancelarla.
+
+Como el pool vive en el proceso, un reinicio o la caída del worker deja filas 'pendiente' o
+'ejecutando' que nadie va a terminar. Cada tarea guarda el proceso que la tiene y un hilo de ese
+proceso renueva su latido cada TAREAS_LATIDO segundos; recuperar_huerfanas marca como fallidas
+las que no latieron en TAREAS_LATIDO_VENCIDO segundos. No se vuelven a encolar: una importación
+interrumpida ya confirmó parte de sus lotes.
+"""
+import inspect
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select, update
+
+from app.metricas_routes import registrar_metrica
+from app.models import db, Tarea
+
+logger = logging.getLogger('app.tareas')
+
+TERMINADAS = ('completada', 'fallida', 'cancelada')
+ACTIVAS = ('pendiente', 'ejecutando')
+
+# Tipo de tarea -> función(progreso, **parametros) que retorna el resultado (serializable a JSON)
+TIPOS = {}
+
+# Pool de hilos del worker actual (se crea al primer uso, después del fork de gunicorn)
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_pool_workers = None
+_en_curso = 0
+
+# Identidad del proceso actual ('host:pid:arranque') y su hilo de latidos
+_identidad = None
+_identidad_pid = None
+_latido = None
+
+# Contadores publicados en /metricas
+contadores = {'enviadas': 0, 'completadas': 0, 'fallidas': 0, 'canceladas': 0, 'rechazadas': 0, 'huerfanas': 0}
+
+
+class TareaInvalida(ValueError):
+    """ Tipo de tarea desconocido o parámetros que no corresponden a ese tipo. """
+
+
+class ColaLlena(RuntimeError):
+    """ El proceso ya tiene TAREAS_MAXIMO_PENDIENTES tareas en curso. """
+
+
+class TareaCancelada(Exception):
+    """ Se pidió cancelar la tarea; la lanza Progreso.avanzar. """
+
+
+def tipo_de_tarea(nombre):
+    """ Decorador que registra una función como tipo de tarea. """
+    def registrar(funcion):
+        TIPOS[nombre] = funcion
+        return funcion
+    return registrar
+
+
+class Progreso:
+    """
+    Avance de una tarea en ejecución. Escribe en su propia transacción (visible al instante para
+    los demás workers) y como mucho una vez cada `intervalo` segundos, salvo al llegar a 100.
+    """
+
+    def __init__(self, tarea_id, intervalo):
+        self.tarea_id = tarea_id
+        self.intervalo = intervalo
+        self._ultima = 0.0
+
+    def avanzar(self, porcentaje):
+        """ Guarda el progreso (0 a 100) y lanza TareaCancelada si se pidió cancelar la tarea. """
+        ahora = time.monotonic()
+        if porcentaje < 100 and ahora - self._ultima < self.intervalo:
+            return
+        self._ultima = ahora
+        with db.engine.begin() as conexion:
+            conexion.execute(
+                update(Tarea).where(Tarea.id == self.tarea_id)
+                .values(progreso=round(min(porcentaje, 100), 1), latido_en=datetime.utcnow())
+            )
+            cancelar = conexion.execute(select(Tarea.cancelar).where(Tarea.id == self.tarea_id)).scalar()
+        if cancelar:
+            raise TareaCancelada()
+
+
+def identidad_proceso():
+    """
+    Identificador de este proceso para la columna tarea.proceso. Lleva un sufijo al azar porque
+    el pid se repite entre reinicios (en un contenedor suele ser siempre el mismo).
+    """
+    global _identidad, _identidad_pid
+    if _identidad_pid != os.getpid():
+        _identidad = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'[:100]
+        _identidad_pid = os.getpid()
+    return _identidad
+
+
+def _iniciar_latido(app):
+    """ Arranca (una vez por proceso) el hilo que renueva el latido de las tareas de este proceso. """
+    global _latido
+    with _pool_lock:
+        if _latido is not None and _latido.is_alive() and _latido.pid == os.getpid():
+            return
+        _latido = threading.Thread(target=_latir, args=(app,), name='tarea-latido', daemon=True)
+        _latido.pid = os.getpid()
+        _latido.start()
+
+
+def _latir(app):
+    while True:
+        time.sleep(app.config['TAREAS_LATIDO'])
+        try:
+            with app.app_context():
+                with db.engine.begin() as conexion:
+                    conexion.execute(
+                        update(Tarea).where(Tarea.proceso == identidad_proceso(), Tarea.estado.in_(ACTIVAS))
+                        .values(latido_en=datetime.utcnow())
+                    )
+                recuperar_huerfanas()
+        except Exception:
+            logger.exception('Could not renew the background task heartbeat')
+
+
+def recuperar_huerfanas():
+    """
+    Marca como fallidas las tareas pendientes o en ejecución cuyo proceso dejó de latir hace más
+    de TAREAS_LATIDO_VENCIDO segundos (se reinició o se cayó). Retorna cuántas marcó.
+    """
+    ahora = datetime.utcnow()
+    vencido = ahora - timedelta(seconds=current_app.config['TAREAS_LATIDO_VENCIDO'])
+    with db.engine.begin() as conexion:
+        huerfanas = conexion.execute(
+            update(Tarea)
+            .where(Tarea.estado.in_(ACTIVAS), func.coalesce(Tarea.latido_en, Tarea.creada_en) < vencido)
+            .values(estado='fallida', terminada_en=ahora,
+                    error='Interrupted: the worker running this task stopped before it finished')
+        ).rowcount
+    if huerfanas:
+        contadores['huerfanas'] += huerfanas
+        logger.warning('Marked %s orphaned background tasks as failed', huerfanas)
+    return huerfanas
+
+
+def _obtener_pool(workers):
+    global _pool, _pool_pid, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid() or _pool_workers != workers:
+            if _pool is not None and _pool_pid == os.getpid():
+                _pool.shutdown(wait=False)
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tarea')
+            _pool_pid, _pool_workers = os.getpid(), workers
+        return _pool
+
+
+def cerrar_pool():
+    """ Detiene el pool de tareas esperando las que están en ejecución. """
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=True)
+        _pool = None
+
+
+def _terminar(tarea_id, estado, **valores):
+    with db.engine.begin() as conexion:
+        conexion.execute(
+            update(Tarea).where(Tarea.id == tarea_id).values(estado=estado, terminada_en=datetime.utcnow(), **valores)
+        )
+
+
+def _ejecutar(app, tarea_id):
+    """ Ejecuta una tarea pendiente en su propio contexto de aplicación y guarda su resultado. """
+    with app.app_context():
+        # Solo arranca si sigue pendiente: pudo cancelarse mientras esperaba en la cola
+        with db.engine.begin() as conexion:
+            iniciada = conexion.execute(
+                update(Tarea)
+                .where(Tarea.id == tarea_id, Tarea.estado == 'pendiente')
+                .values(estado='ejecutando', iniciada_en=datetime.utcnow(), latido_en=datetime.utcnow())
+            ).rowcount
+        if not iniciada:
+            return
+
+        tarea = db.session.get(Tarea, tarea_id)
+        funcion, parametros = TIPOS[tarea.tipo], tarea.parametros or {}
+        db.session.commit()
+
+        try:
+            resultado = funcion(Progreso(tarea_id, app.config['TAREAS_INTERVALO_PROGRESO']), **parametros)
+        except TareaCancelada:
+            db.session.rollback()
+            contadores['canceladas'] += 1
+            _terminar(tarea_id, 'cancelada')
+        except Exception as error:
+            db.session.rollback()
+            contadores['fallidas'] += 1
+            logger.exception('Background task %s (%s) failed', tarea_id, tarea.tipo)
+            _terminar(tarea_id, 'fallida', error=f'{type(error).__name__}: {error}')
+        else:
+            contadores['completadas'] += 1
+            _terminar(tarea_id, 'completada', progreso=100, resultado=resultado)
+
+
+def _liberar_cupo(_futuro=None):
+    global _en_curso
+    with _pool_lock:
+        _en_curso -= 1
+
+
+def enviar(tipo, parametros=None, usuario_id=None):
+    """
+    Registra una tarea y la pone en la cola del pool. Retorna la Tarea (estado 'pendiente').
+    Lanza TareaInvalida si el tipo o los parámetros no son válidos y ColaLlena si no hay cupo.
+    Con TAREAS_WORKERS = 0 se ejecuta en el mismo hilo antes de retornar.
+    """
+    global _en_curso
+    parametros = parametros or {}
+    funcion = TIPOS.get(tipo)
+    if funcion is None:
+        raise TareaInvalida(f'Unknown task type: {tipo}')
+    try:
+        inspect.signature(funcion).bind(None, **parametros)
+    except TypeError as error:
+        raise TareaInvalida(f'Invalid parameters for {tipo}: {error}')
+
+    with _pool_lock:
+        if _en_curso >= current_app.config['TAREAS_MAXIMO_PENDIENTES']:
+            contadores['rechazadas'] += 1
+            raise ColaLlena('Too many tasks in progress, try again later')
+        _en_curso += 1
+
+    app = current_app._get_current_object()
+    _iniciar_latido(app)
+    try:
+        ahora = datetime.utcnow()
+        tarea = Tarea(tipo=tipo, parametros=parametros, usuario_id=usuario_id, creada_en=ahora,
+                      proceso=identidad_proceso(), latido_en=ahora)
+        db.session.add(tarea)
+        db.session.commit()
+    except Exception:
+        _liberar_cupo()
+        raise
+    contadores['enviadas'] += 1
+
+    workers = app.config['TAREAS_WORKERS']
+    if not workers:
+        try:
+            _ejecutar(app, tarea.id)
+        finally:
+            _liberar_cupo()
+        db.session.refresh(tarea)
+        return tarea
+
+    _obtener_pool(workers).submit(_ejecutar, app, tarea.id).add_done_callback(_liberar_cupo)
+    return tarea
+
+
+def cancelar(tarea):
+    """
+    Cancela una tarea: si está pendiente no llega a ejecutarse; si está en ejecución se detiene
+    la próxima vez que informe su progreso. Retorna False si ya había terminado.
+    """
+    if tarea.estado in TERMINADAS:
+        return False
+    db.session.execute(
+        update(Tarea).where(Tarea.id == tarea.id, Tarea.estado == 'pendiente')
+        .values(estado='cancelada', cancelar=True, terminada_en=datetime.utcnow())
+    )
+    db.session.execute(update(Tarea).where(Tarea.id == tarea.id, Tarea.estado == 'ejecutando').values(cancelar=True))
+    db.session.commit()
+    db.session.refresh(tarea)
+    return True
+
+
+def como_dict(tarea):
+    """ Representación JSON de una tarea para la API. """
+    return {
+        'id': tarea.id,
+        'tipo': tarea.tipo,
+        'estado': tarea.estado,
+        'progreso': tarea.progreso,
+        'parametros': tarea.parametros,
+        'resultado': tarea.resultado,
+        'error': tarea.error,
+        'cancelacion_pedida': tarea.cancelar,
+        'usuario_id': tarea.usuario_id,
+        'creada_en': tarea.creada_en.isoformat() if tarea.creada_en else None,
+        'iniciada_en': tarea.iniciada_en.isoformat() if tarea.iniciada_en else None,
+        'terminada_en': tarea.terminada_en.isoformat() if tarea.terminada_en else None,
+        'proceso': tarea.proceso,
+        'latido_en': tarea.latido_en.isoformat() if tarea.latido_en else None,
+    }
+
+
+def estadisticas():
+    """ Métricas del pool de tareas de este worker. """
+    return dict(contadores, en_curso=_en_curso, workers=current_app.config['TAREAS_WORKERS'],
+                maximo_pendientes=current_app.config['TAREAS_MAXIMO_PENDIENTES'])
+
+
+def init_app(app):
+    """ Publica las métricas de tareas. """
+    registrar_metrica(app, 'tareas', estadisticas)
+
+
+# --- Tipos de tarea --------------------------------------------------------------------------
+
+@tipo_de_tarea('importar_libros')
+def _importar_libros(progreso, ruta, formato, bibliotecario_id=None):
+    """ Importa un archivo CSV/NDJSON guardado en TAREAS_DIR y lo borra al terminar. """
+    from app.importacion import flujo_de_texto, importar_libros
+
+    total = os.path.getsize(ruta) or 1
+    try:
+        with open(ruta, 'rb') as binario:
+            return importar_libros(
+                flujo_de_texto(binario), formato, bibliotecario_id=bibliotecario_id,
+                al_insertar=lambda insertados, rechazados: progreso.avanzar(100 * binario.tell() / total),
+            )
+    finally:
+        os.remove(ruta)
+
+
+@tipo_de_tarea('reindexar')
+def _reindexar(progreso, lote=5000):
+    """ Reconstruye el índice de búsqueda de este worker (cada worker tiene su propia copia). """
+    from app.busqueda import COLUMNAS_INDICE
+    from app.cambios import cursor_actual
+    from app.models import Libro
+
+    # El cursor del registro de cambios se toma antes de leer: lo cambiado durante la lectura se vuelve a aplicar
+    cursor = cursor_actual()
+    total = db.session.execute(select(func.count(Libro.id))).scalar() or 1
+    columnas = [getattr(Libro, columna) for columna in COLUMNAS_INDICE]
+    indice = current_app.extensions['busqueda']
+
+    def filas():
+        # Lotes por id (keyset) en lugar de un cursor abierto: entre lote y lote se escribe el
+        # progreso, y SQLite no confirma escrituras de otra conexión con una lectura en curso
+        ultimo, leidos = 0, 0
+        while True:
+            filas_lote = db.session.execute(
+                select(*columnas).where(Libro.id > ultimo).order_by(Libro.id).limit(lote)
+            ).mappings().all()
+            if not filas_lote:
+                return
+            for fila in filas_lote:
+                yield dict(fila)
+            ultimo, leidos = filas_lote[-1]['id'], leidos + len(filas_lote)
+            progreso.avanzar(100 * leidos / total)
+
+    # Las búsquedas de este worker siguen usando el índice actual hasta que el nuevo está completo
+    indice.construir(filas(), cursor)
+    return {'libros': len(indice.documentos), 'palabras': len(indice.postings)}
+
+
+@tipo_de_tarea('recalcular_estadisticas')
+def _recalcular_estadisticas(progreso):
+    """ Rehace los contadores de estadistica_libro desde la tabla libro. """
+    from app.estadisticas import recalcular
+
+    contadores_escritos = recalcular(db.session)
+    db.session.commit()
+    return {'contadores': contadores_escritos}
+
+
+@tipo_de_tarea('generar_libros')
+def _generar_libros(progreso, cantidad, semilla=42, prestados=0.3):
+    """ Genera libros sintéticos (app/generador.py) informando el avance por lote. """
+    from app.eventos import notificar_cambios
+    from app.generador import generar_libros
+
+    try:
+        insertados = generar_libros(
+            int(cantidad), semilla=semilla, prestados=prestados,
+            al_insertar=lambda insertados, segundos: progreso.avanzar(100 * insertados / int(cantidad)),
+        )
+    except TareaCancelada:
+        # Los lotes ya confirmados quedan: índices y cachés se reconstruyen igual que al terminar
+        notificar_cambios([{'accion': 'recargar', 'id': None, 'datos': None, 'anterior': None}])
+        raise
+    return {'insertados': insertados}
+
+
+@tipo_de_tarea('compactar_cambios')
+def _compactar_cambios(progreso, dias=None):
+    """ Compacta el registro de cambios de libros (app/cambios.py) en una sola transacción. """
+    from app.cambios import compactar
+
+    with db.engine.begin() as conexion:
+        return compactar(conexion, dias)
@@ -0,0 +1,107 @@
+import os
+import uuid
+
+from flask import Blueprint, current_app, jsonify, request, url_for
+from flask_login import login_required, current_user
+
+from app.importacion import formato_de
+from app.models import db, Tarea
+from app.tareas import TIPOS, ColaLlena, TareaInvalida, cancelar, como_dict, enviar, recuperar_huerfanas
+
+# Blueprint de tareas en segundo plano (enviar, consultar el progreso y cancelar), solo para administradores
+tareas = Blueprint('tareas', __name__)
+
+
+@tareas.before_request
+@login_required
+def _solo_admin():
+    if not current_user.tiene_permiso('gestionar_tareas'):
+        return jsonify({'error': 'Forbidden'}), 403
+
+
+def _guardar_archivo():
+    """
+    Guarda el archivo a importar (campo 'archivo' o cuerpo de la petición) en TAREAS_DIR.
+    Retorna (ruta, formato).
+    """
+    archivo = request.files.get('archivo')
+    if archivo:
+        formato = request.args.get('formato') or formato_de(archivo.filename) or formato_de(archivo.mimetype)
+        origen = archivo.stream
+    else:
+        formato = request.args.get('formato') or formato_de(request.mimetype)
+        origen = request.stream
+    if formato not in ('csv', 'ndjson'):
+        raise TareaInvalida('Unsupported format, use csv or ndjson')
+
+    os.makedirs(current_app.config['TAREAS_DIR'], exist_ok=True)
+    ruta = os.path.join(current_app.config['TAREAS_DIR'], f'{uuid.uuid4().hex}.{formato}')
+    with open(ruta, 'wb') as destino:
+        while True:
+            bloque = origen.read(1 << 20)
+            if not bloque:
+                break
+            destino.write(bloque)
+    return ruta, formato
+
+
+@tareas.route('/tareas', methods=['POST'])
+def enviar_tarea():
+    """
+    Envía una tarea. JSON {"tipo": "reindexar", "parametros": {...}}, salvo importar_libros:
+    POST /tareas?tipo=importar_libros&bibliotecario_id=2 con el archivo como en /importar_libros.
+    Responde 202 con la tarea y su URL de consulta.
+    """
+    tipo = request.args.get('tipo')
+    ruta = None
+    try:
+        if tipo == 'importar_libros':
+            ruta, formato = _guardar_archivo()
+            parametros = {'ruta': ruta, 'formato': formato,
+                          'bibliotecario_id': request.args.get('bibliotecario_id', type=int)}
+        else:
+            datos = request.get_json(silent=True) or {}
+            tipo = tipo or datos.get('tipo')
+            parametros = datos.get('parametros') or {}
+            # La ruta del archivo a importar nunca la elige el cliente
+            if tipo == 'importar_libros' or not isinstance(parametros, dict):
+                raise TareaInvalida('Invalid task parameters')
+        tarea = enviar(tipo, parametros, usuario_id=current_user.id)
+    except TareaInvalida as error:
+        if ruta:
+            os.remove(ruta)
+        return jsonify({'error': str(error), 'tipos': sorted(TIPOS)}), 400
+    except ColaLlena as error:
+        if ruta:
+            os.remove(ruta)
+        return jsonify({'error': str(error)}), 503, {'Retry-After': '30'}
+
+    return jsonify(como_dict(tarea)), 202, {'Location': url_for('tareas.ver_tarea', id=tarea.id)}
+
+
+@tareas.route('/tareas', methods=['GET'])
+def listar_tareas():
+    """ Últimas tareas (?estado=ejecutando para filtrar, ?limite= hasta 200). """
+    recuperar_huerfanas()
+    consulta = Tarea.query.order_by(Tarea.id.desc())
+    if request.args.get('estado'):
+        consulta = consulta.filter(Tarea.estado == request.args['estado'])
+    limite = max(1, min(request.args.get('limite', 50, type=int), 200))
+    return jsonify([como_dict(tarea) for tarea in consulta.limit(limite)]), 200
+
+
+@tareas.route('/tareas/<int:id>', methods=['GET'])
+def ver_tarea(id):
+    """ Estado, progreso (0 a 100) y resultado de una tarea. """
+    # Quien consulta ve terminar también las tareas de un worker que se cayó
+    recuperar_huerfanas()
+    return jsonify(como_dict(db.get_or_404(Tarea, id))), 200
+
+
+@tareas.route('/tareas/<int:id>/cancelar', methods=['POST'])
+def cancelar_tarea(id):
+    """ Pide cancelar la tarea. Responde 409 si ya había terminado. """
+    tarea = db.get_or_404(Tarea, id)
+    if not cancelar(tarea):
+        return jsonify({'error': f'The task is already {tarea.estado}', **como_dict(tarea)}), 409
+    return jsonify(como_dict(tarea)), 202
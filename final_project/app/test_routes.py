@@ -1,5 +1,14 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, abort, make_response, request, jsonify, stream_with_context
+from sqlalchemy import select
 from app.models import db, Libro
+from app.busqueda import buscar_libros
+from app.cambios import CursorVencido, cambios_desde, cursor_actual
+from app.concurrencia import ConflictoDeVersion, cambiar_estado, confirmar, cumple_if_match, etag_libro, version_de_if_match
+from app.exportacion import filas_por_id, iterar_lotes, json_array, ndjson, msgpack_filas, exportar, validar_columnas
+from app.importacion import importar_libros as importar, formato_de, flujo_de_texto
+from app.lotes import LoteInvalido, actualizar_libros as actualizar_lote, eliminar_libros as eliminar_lote, obtener_libros
+from app.serializacion import FORMATOS, negociar, responder, transmitir
+from app.versiones import condicional, version_de
 
 # Blueprint solo con endpoints de prueba para cursos
 main = Blueprint('main', __name__)
@@ -12,40 +21,170 @@ def index():
     """
     return '<h1>Corriendo en Modo de Prueba.</h1>'
 
+def _campos():
+    """
+    Columnas pedidas con ?fields=id,titulo (todas si no se indica). Lanza ValueError si alguna no existe.
+    """
+    return validar_columnas(request.args.get('fields'))
+
+
 @main.route('/listar_libro', methods=['GET'])
+@condicional('libro')
 def listar_libro():
     """
-    Retorna una lista de libros (JSON).
+    Retorna la lista de libros transmitida por lotes, sin cargar toda la tabla en memoria.
+    El formato se elige con ?formato= o Accept: JSON (por defecto), NDJSON (un libro por línea)
+    o MessagePack. Con ?fields=id,titulo solo se consultan y serializan esas columnas.
+    Se comprime con gzip si el cliente lo acepta. X-Cursor-Cambios es el cursor para seguir con /cambios.
+    """
+    try:
+        columnas = _campos()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    formato = negociar(permitidos=('json', 'ndjson', 'msgpack'))
+    if formato is None:
+        return jsonify({'error': 'Unsupported format, use json, ndjson or msgpack'}), 400
+
+    serializar = {'json': json_array, 'ndjson': ndjson, 'msgpack': msgpack_filas}[formato]
+    # El cursor se toma antes de recorrer la tabla
+    cursor = cursor_actual()
+    respuesta = transmitir(serializar(iterar_lotes(columnas), columnas), FORMATOS[formato])
+    respuesta.headers['X-Cursor-Cambios'] = str(cursor)
+    return respuesta
+
+
+@main.route('/exportar_libros', methods=['GET'])
+@condicional('libro')
+def exportar_libros():
+    """
+    Exporta el catálogo completo como CSV o NDJSON transmitido por lotes.
+    Parámetros: formato (csv|ndjson), columnas o fields (p. ej. id,titulo) y gzip=1 para comprimir.
     """
-    libro = Libro.query.all()
+    formato = request.args.get('formato', 'csv')
+    if formato not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Unsupported format, use csv or ndjson'}), 400
+
+    try:
+        columnas = validar_columnas(request.args.get('fields') or request.args.get('columnas'))
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
 
-    data = [
-        {'id': libro.id, 'titulo': libro.titulo, 'autor': libro.autor, 'isbn': libro.isbn, 'categoria': libro.categoria, 
-         'estado': libro.estado, 'año_publicacion': libro.año_publicacion, 'bibliotecario_id': libro.bibliotecario_id}
-        for libro in libro
-    ]
-    return jsonify(data), 200
+    gzip = request.args.get('gzip') in ('1', 'true')
+    nombre = f'libros.{formato}' + ('.gz' if gzip else '')
+    mimetype = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+
+    return Response(
+        stream_with_context(exportar(formato, columnas, gzip=gzip)),
+        status=200,
+        mimetype='application/gzip' if gzip else mimetype,
+        headers={'Content-Disposition': f'attachment; filename={nombre}'},
+    )
 
 
 @main.route('/libro/<int:id>', methods=['GET'])
 def listar_un_libro(id):
     """
-    Retorna un solo libro por su ID (JSON).
+    Retorna un solo libro por su ID (JSON o MessagePack según Accept). Con ?fields=id,titulo solo se leen esas columnas.
+    El ETag es la versión del libro: responde 304 con If-None-Match y se usa con If-Match para modificarlo.
+    Last-Modified es la última modificación del catálogo (cota superior de la del libro), para If-Modified-Since.
     """
-    libro = Libro.query.get_or_404(id)
+    try:
+        columnas = _campos()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    # Primero solo la versión: con un 304 no se leen ni serializan las columnas
+    version = db.session.execute(select(Libro.version).where(Libro.id == id)).scalar()
+    if version is None:
+        abort(404)
+    _, modificado_en = version_de(Libro.__tablename__)
+
+    if request.if_none_match:
+        no_modificado = request.if_none_match.contains(etag_libro(id, version))
+    else:
+        no_modificado = (request.if_modified_since is not None and modificado_en is not None
+                         and modificado_en <= request.if_modified_since.replace(tzinfo=None))
+
+    if no_modificado:
+        respuesta = make_response('', 304)
+    else:
+        # La versión se vuelve a leer junto con los datos, por si el libro cambió entre las dos consultas
+        data = filas_por_id([id], list(dict.fromkeys([*columnas, 'version']))).get(id)
+        if data is None:
+            abort(404)
+        version = data['version'] if 'version' in columnas else data.pop('version')
+        respuesta = responder(data)
+
+    respuesta.set_etag(etag_libro(id, version))
+    if modificado_en is not None:
+        respuesta.last_modified = modificado_en
+    return respuesta
+
+
+@main.route('/cambios', methods=['GET'])
+@main.route('/changes', methods=['GET'])
+def cambios_libros():
+    """
+    Sincronización incremental: libros creados, modificados o eliminados después de ?since=<cursor>
+    (X-Cursor-Cambios de /listar_libro o el cursor de la respuesta anterior). Cada libro aparece una
+    vez con sus datos actuales; los eliminados como lápidas (libro null). Con "mas": true hay que
+    volver a pedir desde el nuevo cursor. Responde 410 si el cursor ya fue compactado: el cliente
+    debe volver a cargar /listar_libro. Acepta ?limite= (hasta 5000) y ?fields=id,titulo.
+    """
+    cursor = request.args.get('since', type=int)
+    if cursor is None or cursor < 0:
+        return jsonify({'error': 'The since parameter must be a cursor (integer >= 0)'}), 400
+    try:
+        columnas = _campos()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    limite = max(1, min(request.args.get('limite', 1000, type=int), 5000))
+
+    try:
+        cambios, nuevo_cursor, hay_mas = cambios_desde(cursor, limite, columnas)
+    except CursorVencido as error:
+        return jsonify({'error': str(error)}), 410
+
+    return responder({'cursor': nuevo_cursor, 'mas': hay_mas, 'cambios': cambios})
+
+
+@main.route('/buscar_libro', methods=['GET'])
+def buscar_libro():
+    """
+    Busca libros por titulo, autor, isbn o categoria (JSON o MessagePack), ordenados por relevancia.
+    Parámetros: q, pagina, por_pagina, fields y los filtros categoria, estado y año_publicacion.
+    """
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'error': 'Missing search query (q)'}), 400
+
+    try:
+        columnas = _campos()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    pagina = max(1, request.args.get('pagina', 1, type=int))
+    por_pagina = max(1, min(request.args.get('por_pagina', 25, type=int), 100))
+
+    libros, total = buscar_libros(
+        q,
+        pagina=pagina,
+        por_pagina=por_pagina,
+        columnas=columnas,
+        categoria=request.args.get('categoria'),
+        estado=request.args.get('estado'),
+        año_publicacion=request.args.get('año_publicacion', type=int),
+    )
 
     data = {
-        'id': libro.id,
-        'titulo': libro.titulo,
-        'autor': libro.autor,
-        'isbn': libro.isbn,
-        'categoria': libro.categoria,
-        'estado': libro.estado,
-        'año_publicacion': libro.año_publicacion,
-        'bibliotecario_id': libro.bibliotecario_id
+        'q': q,
+        'pagina': pagina,
+        'por_pagina': por_pagina,
+        'total': total,
+        'resultados': libros,
     }
-
-    return jsonify(data), 200
+    return responder(data)
 
 
 @main.route('/crear_libro', methods=['POST'])
@@ -78,8 +217,12 @@ def crear_libro():
 def actualizar_libro(id):
     """
     Actualiza un libro sin validación de usuario o permisos.
+    Con If-Match solo se aplica si el libro sigue en esa versión (412 si no); si otra petición
+    lo modifica mientras tanto responde 409.
     """
     libro = Libro.query.get_or_404(id)
+    if not cumple_if_match(request.if_match, libro):
+        return jsonify({'error': 'The book has changed since it was read', 'version': libro.version}), 412
     data = request.get_json()
 
     libro.titulo = data.get('titulo', libro.titulo)
@@ -90,17 +233,149 @@ def actualizar_libro(id):
     libro.año_publicacion = data.get('año_publicacion', libro.año_publicacion)
     libro.bibliotecario_id = data.get('bibliotecario_id', libro.bibliotecario_id)
 
-    db.session.commit()
+    try:
+        confirmar()
+    except ConflictoDeVersion as error:
+        return jsonify({'error': str(error)}), 409
 
-    return jsonify({'message': 'Libro actualizado', 'id': libro.id}), 200
+    respuesta = jsonify({'message': 'Libro actualizado', 'id': libro.id, 'version': libro.version})
+    respuesta.set_etag(etag_libro(libro.id, libro.version))
+    return respuesta, 200
 
 @main.route('/eliminar_libro/<int:id>', methods=['DELETE'])
 def eliminar_libro(id):
     """
-    Elimina un libro sin validación de permisos.
+    Elimina un libro sin validación de permisos. Admite If-Match como actualizar_libro.
     """
     libro = Libro.query.get_or_404(id)
+    if not cumple_if_match(request.if_match, libro):
+        return jsonify({'error': 'The book has changed since it was read', 'version': libro.version}), 412
+
     db.session.delete(libro)
-    db.session.commit()
+    try:
+        confirmar()
+    except ConflictoDeVersion as error:
+        return jsonify({'error': str(error)}), 409
+
+    return jsonify({'message': 'Libro eliminado', 'id': id}), 200
+
+
+@main.route('/libro/<int:id>/<any(prestar, devolver):accion>', methods=['POST'])
+def prestar_o_devolver(id, accion):
+    """
+    Presta o devuelve un libro cambiando su estado de forma atómica, sin bloquear la fila.
+    Responde 409 si el libro ya estaba prestado (o disponible) y 412 si no cumple If-Match.
+    """
+    version = version_de_if_match(request.if_match, id)
+    resultado, libro = cambiar_estado(id, accion, version=version)
+
+    if libro is None:
+        abort(404)
+    if resultado == 'conflicto_estado':
+        return jsonify({'error': f'The book is not {"available" if accion == "prestar" else "on loan"}',
+                        'estado': libro.estado, 'version': libro.version}), 409
+    if resultado == 'conflicto_version':
+        return jsonify({'error': 'The book was modified by another request', 'version': libro.version}), \
+            412 if version is not None else 409
+
+    respuesta = jsonify({'id': libro.id, 'estado': libro.estado, 'version': libro.version})
+    respuesta.set_etag(etag_libro(libro.id, libro.version))
+    return respuesta
+
+
+@main.route('/importar_libros', methods=['POST'])
+def importar_libros():
+    """
+    Importa libros en masa desde CSV o NDJSON (cuerpo de la petición o archivo 'archivo').
+    El formato se toma de ?formato= o del Content-Type. Los libros sin bibliotecario_id
+    usan el indicado en ?bibliotecario_id=.
+    """
+    archivo = request.files.get('archivo')
+    if archivo:
+        flujo = archivo.stream
+        formato = request.args.get('formato') or formato_de(archivo.filename) or formato_de(archivo.mimetype)
+    else:
+        flujo = request.stream
+        formato = request.args.get('formato') or formato_de(request.mimetype)
+
+    if formato not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Unsupported format, use csv or ndjson'}), 415
+
+    reporte = importar(
+        flujo_de_texto(flujo),
+        formato,
+        bibliotecario_id=request.args.get('bibliotecario_id', type=int),
+    )
+    return jsonify(reporte), 201 if reporte['insertados'] else 200
+
+
+# --- Operaciones por lotes: una consulta IN y una transacción por petición ---
+
+def _es_atomico():
+    return request.args.get('atomico') in ('1', 'true')
+
+
+def _resumen(resultados):
+    """ Cantidad de elementos por resultado ('actualizado', 'no_encontrado', ...). """
+    resumen = {}
+    for resultado in resultados:
+        resumen[resultado['resultado']] = resumen.get(resultado['resultado'], 0) + 1
+    return resumen
+
+
+def _del_cuerpo(clave):
+    """ Valor de `clave` en el cuerpo JSON. Lanza LoteInvalido si el cuerpo no es un objeto. """
+    datos = request.get_json(silent=True)
+    if datos is None:
+        return None
+    if not isinstance(datos, dict):
+        raise LoteInvalido('Expected a JSON object')
+    return datos.get(clave)
+
+
+@main.route('/obtener_libros', methods=['GET', 'POST'])
+def obtener_varios_libros():
+    """
+    Retorna varios libros por ID (JSON o MessagePack). Los IDs llegan como ?ids=1,2,3 o en el cuerpo {"ids": [...]}.
+    Con ?fields=id,titulo solo se leen esas columnas.
+    """
+    try:
+        if request.method == 'GET':
+            ids = [valor for valor in request.args.get('ids', '').split(',') if valor.strip()]
+        else:
+            ids = _del_cuerpo('ids')
+        libros, faltantes = obtener_libros(ids, _campos())
+    except (LoteInvalido, ValueError) as error:
+        return jsonify({'error': str(error)}), 400
+
+    return responder({'libros': libros, 'no_encontrados': faltantes})
+
+
+@main.route('/actualizar_libros', methods=['PUT'])
+def actualizar_varios_libros():
+    """
+    Actualiza varios libros en una transacción. Espera {"libros": [{"id": 1, "estado": "Prestado"}, ...]}.
+    Con ?atomico=1 no aplica ningún cambio si alguno falla.
+    """
+    try:
+        resultados, confirmado = actualizar_lote(_del_cuerpo('libros'), atomico=_es_atomico())
+    except LoteInvalido as error:
+        return jsonify({'error': str(error)}), 400
+
+    return jsonify({'confirmado': confirmado, 'resumen': _resumen(resultados), 'resultados': resultados}), \
+        200 if confirmado else 409
+
+
+@main.route('/eliminar_libros', methods=['DELETE', 'POST'])
+def eliminar_varios_libros():
+    """
+    Elimina varios libros en una transacción. Espera {"ids": [...]}.
+    Con ?atomico=1 no elimina ninguno si falta alguno.
+    """
+    try:
+        resultados, confirmado = eliminar_lote(_del_cuerpo('ids'), atomico=_es_atomico())
+    except LoteInvalido as error:
+        return jsonify({'error': str(error)}), 400
 
-    return jsonify({'message': 'Libro eliminado', 'id': libro.id}), 200
\ No newline at end of file
+    return jsonify({'confirmado': confirmado, 'resumen': _resumen(resultados), 'resultados': resultados}), \
+        200 if confirmado else 409
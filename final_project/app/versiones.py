@@ -0,0 +1,120 @@
+import random
+import zlib
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, make_response, request
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.eventos import libros_escritos
+from app.models import db, Libro, VersionTabla
+
+
+def fragmento_al_azar():
+    """
+    Fragmento de contador para una transacción. Cada escritura incrementa uno de los
+    CONTADORES_FRAGMENTOS fragmentos al azar, así las transacciones concurrentes no esperan
+    todas el bloqueo de la misma fila.
+    """
+    return random.randrange(current_app.config['CONTADORES_FRAGMENTOS'])
+
+
+def incrementar_version(conexion, tabla, fragmento=None):
+    """
+    Incrementa la versión de la tabla dentro de la transacción actual
+    (`conexion` puede ser una sesión o una conexión de SQLAlchemy).
+    """
+    fragmento = fragmento_al_azar() if fragmento is None else fragmento
+    ahora = datetime.utcnow().replace(microsecond=0)
+    resultado = conexion.execute(
+        update(VersionTabla)
+        .where(VersionTabla.tabla == tabla, VersionTabla.fragmento == fragmento)
+        .values(version=VersionTabla.version + 1, modificado_en=ahora)
+    )
+    if resultado.rowcount == 0:
+        conexion.execute(insert(VersionTabla).values(tabla=tabla, fragmento=fragmento, version=1, modificado_en=ahora))
+
+
+@libros_escritos.connect
+def _versionar_libros(session, cambios):
+    """ El flush creó, modificó o eliminó libros: la versión se incrementa al confirmar. """
+    session.info.setdefault('tablas_modificadas', set()).add(Libro.__tablename__)
+
+
+@event.listens_for(Session, 'before_commit')
+def _aplicar_versiones(session):
+    """
+    Incrementa una sola vez por transacción, justo antes del COMMIT, la versión de las tablas
+    modificadas: el bloqueo de la fila de versión se toma al final y dura lo que dura el COMMIT.
+    Primero se hace el último flush, que todavía puede modificar libros.
+    """
+    session.flush()
+    tablas = session.info.pop('tablas_modificadas', None)
+    if tablas:
+        conexion = session.connection()
+        fragmento = fragmento_de(session)
+        # Siempre en el mismo orden (y antes que los contadores de estadisticas) para no cruzar bloqueos
+        for tabla in sorted(tablas):
+            incrementar_version(conexion, tabla, fragmento)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_versiones(session):
+    session.info.pop('tablas_modificadas', None)
+    session.info.pop('fragmento', None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _olvidar_fragmento(session):
+    session.info.pop('fragmento', None)
+
+
+def fragmento_de(session):
+    """ Fragmento elegido para la transacción actual de la sesión (el mismo para versiones y contadores). """
+    if 'fragmento' not in session.info:
+        session.info['fragmento'] = fragmento_al_azar()
+    return session.info['fragmento']
+
+
+def version_de(tabla):
+    """ Retorna (versión, fecha de modificación) de la tabla; (0, None) si nunca se modificó. """
+    fila = db.session.execute(
+        select(func.sum(VersionTabla.version), func.max(VersionTabla.modificado_en)).where(VersionTabla.tabla == tabla)
+    ).first()
+    return (int(fila[0]), fila[1]) if fila and fila[0] is not None else (0, None)
+
+
+def condicional(tabla):
+    """
+    Decorador para vistas GET que solo dependen de `tabla`: agrega un ETag débil y Last-Modified
+    derivados de la versión de la tabla, y responde 304 si el cliente ya tiene esa versión,
+    sin ejecutar la vista ni leer las filas.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            version, modificado_en = version_de(tabla)
+
+            # La misma versión de la tabla da respuestas distintas según la URL y el formato pedido
+            variante = zlib.crc32(f'{request.full_path}|{request.headers.get("Accept", "")}'.encode('utf-8'))
+            etag = f'{tabla}-{version}-{variante:08x}'
+
+            if request.if_none_match:
+                no_modificado = request.if_none_match.contains_weak(etag)
+            else:
+                no_modificado = (request.if_modified_since is not None and modificado_en is not None
+                                 and modificado_en <= request.if_modified_since.replace(tzinfo=None))
+
+            if no_modificado:
+                respuesta = make_response('', 304)
+            else:
+                respuesta = make_response(vista(*args, **kwargs))
+
+            if respuesta.status_code in (200, 304):
+                respuesta.set_etag(etag, weak=True)
+                if modificado_en is not None:
+                    respuesta.last_modified = modificado_en
+            return respuesta
+        return envoltura
+    return decorador
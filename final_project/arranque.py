@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Arranque de la aplicación desde la línea de comandos:
+#   python arranque.py precompilar                 -> compila todas las plantillas en PLANTILLAS_CACHE_DIR (despliegue)
+#   python arranque.py medir --repeticiones 10     -> mide el arranque en frío de un worker nuevo
+#   python arranque.py medir --sin-cache-plantillas --salida arranque.json
+
+CARPETA = os.path.dirname(os.path.abspath(__file__))
+
+# Se ejecuta en un proceso nuevo por repetición, para medir un arranque en frío real
+MEDICION = '''
+import json, time
+inicio = time.perf_counter()
+from app import create_app
+importado = time.perf_counter()
+app = create_app()
+creado = time.perf_counter()
+respuesta = app.test_client().get('/login')
+atendido = time.perf_counter()
+print(json.dumps({
+    'importar_ms': 1000 * (importado - inicio),
+    'crear_app_ms': 1000 * (creado - importado),
+    'primera_peticion_ms': 1000 * (atendido - creado),
+    'total_ms': 1000 * (atendido - inicio),
+    'estado': respuesta.status_code,
+}))
+'''
+
+parser = argparse.ArgumentParser(description='Precompila las plantillas o mide el tiempo de arranque de la aplicación.')
+parser.add_argument('comando', choices=['precompilar', 'medir'])
+parser.add_argument('--repeticiones', type=int, default=5, help='Arranques a medir (solo medir)')
+parser.add_argument('--sin-cache-plantillas', action='store_true', help='Medir sin la caché de bytecode de Jinja')
+parser.add_argument('--salida', help='Guardar el resultado de la medición en este archivo JSON')
+args = parser.parse_args()
+
+if args.comando == 'precompilar':
+    from app import create_app
+    from app.plantillas import precompilar
+
+    app = create_app()
+    if not app.config['PLANTILLAS_CACHE_DIR']:
+        sys.exit('❌ PLANTILLAS_CACHE_DIR está vacío: la caché de plantillas está desactivada.')
+    compiladas = precompilar(app)
+    print(f'✅ {len(compiladas)} plantillas compiladas en {app.config["PLANTILLAS_CACHE_DIR"]}.')
+
+else:
+    entorno = dict(os.environ)
+    if args.sin_cache_plantillas:
+        entorno['PLANTILLAS_CACHE_DIR'] = ''
+
+    mediciones = []
+    for _ in range(args.repeticiones):
+        proceso = subprocess.run([sys.executable, '-c', MEDICION], cwd=CARPETA, env=entorno,
+                                 capture_output=True, text=True)
+        if proceso.returncode != 0:
+            sys.exit(f'❌ La aplicación no pudo arrancar:\n{proceso.stderr}')
+        mediciones.append(json.loads(proceso.stdout.strip().splitlines()[-1]))
+
+    resumen = {
+        clave: {
+            'mediana': round(statistics.median(m[clave] for m in mediciones), 1),
+            'minimo': round(min(m[clave] for m in mediciones), 1),
+            'maximo': round(max(m[clave] for m in mediciones), 1),
+        }
+        for clave in ('importar_ms', 'crear_app_ms', 'primera_peticion_ms', 'total_ms')
+    }
+    for clave, valores in resumen.items():
+        print(f'{clave:<22} mediana {valores["mediana"]:8.1f}  mín {valores["minimo"]:8.1f}  máx {valores["maximo"]:8.1f}')
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump({'repeticiones': args.repeticiones, 'cache_plantillas': not args.sin_cache_plantillas,
+                       'resumen': resumen, 'mediciones': mediciones}, archivo, indent=2)
+        print(f'✅ Resultado guardado en {args.salida}')
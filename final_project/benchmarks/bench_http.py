@@ -0,0 +1,270 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.generador import CATEGORIAS, PALABRAS
+
+# Benchmark HTTP de las rutas de routes.py, auth_routes.py y test_routes.py contra una base SQLite
+# sembrada con catálogos de distintos tamaños. Guarda los resultados en JSON para comparar commits:
+#   python benchmarks/bench_http.py --libros 1000 100000 --clientes 8 --peticiones 400
+#   python benchmarks/bench_http.py --libros 1000 --comparar benchmarks/resultados/anterior.json
+# Las bases sembradas se reutilizan entre ejecuciones (--datos); --resembrar las vuelve a crear.
+
+parser = argparse.ArgumentParser(description='Benchmark HTTP de la aplicación con SQLite sembrado.')
+parser.add_argument('--libros', type=int, nargs='+', default=[1000], help='Tamaños del catálogo a probar')
+parser.add_argument('--clientes', type=int, default=8, help='Clientes concurrentes por escenario')
+parser.add_argument('--peticiones', type=int, default=400, help='Peticiones medidas por escenario')
+parser.add_argument('--calentamiento', type=int, default=20, help='Peticiones sin medir antes de cada escenario')
+parser.add_argument('--escenarios', nargs='+', help='Ejecutar solo estos escenarios')
+parser.add_argument('--datos', default=os.path.join(tempfile.gettempdir(), 'biblioteca_bench'),
+                    help='Carpeta de las bases SQLite sembradas')
+parser.add_argument('--resembrar', action='store_true', help='Volver a crear las bases aunque existan')
+parser.add_argument('--sin-cache', action='store_true', help='Desactivar la caché de páginas (CACHE_PAGINAS)')
+parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto benchmarks/resultados/<fecha>_<commit>.json)')
+parser.add_argument('--comparar', help='JSON de una ejecución anterior para mostrar la diferencia')
+parser.add_argument('--tolerancia', type=float, default=0.2,
+                    help='Con --comparar, falla si el p95 empeora más que esta fracción (0.2 = 20%%)')
+parser.add_argument('--semilla', type=int, default=42)
+args = parser.parse_args()
+
+CARPETA = os.path.dirname(os.path.abspath(__file__))
+
+# Usuarios del benchmark, uno por rol: (email, contraseña, rol)
+USUARIOS = {
+    'Admin': ('admin@example.com', 'bench-admin', 'Admin'),
+    'Bibliotecario': ('bibliotecario@example.com', 'bench-biblio', 'Bibliotecario'),
+    'Lector': ('lector@example.com', 'bench-lector', 'Lector'),
+}
+
+
+def escenarios(total_libros):
+    """
+    (nombre, rol con el que inicia sesión o None, función que arma la petición a partir de un Random).
+    La petición es (método, ruta, kwargs del cliente de pruebas).
+    """
+    def libro_al_azar(azar):
+        return azar.randint(1, total_libros)
+
+    return [
+        ('login', None,
+         lambda azar: ('POST', '/login', {'data': {'email': USUARIOS['Lector'][0], 'password': USUARIOS['Lector'][1]}})),
+        ('dashboard', 'Admin', lambda azar: ('GET', '/dashboard', {})),
+        ('dashboard_filtros', 'Bibliotecario',
+         lambda azar: ('GET', f'/dashboard?categoria={azar.choice(list(CATEGORIAS))}&estado=Prestado&orden=titulo', {})),
+        ('dashboard_busqueda', 'Lector', lambda azar: ('GET', f'/dashboard?q={azar.choice(PALABRAS)}', {})),
+        ('usuarios', 'Admin', lambda azar: ('GET', '/usuarios', {})),
+        ('api_libro', None, lambda azar: ('GET', f'/api/libro/{libro_al_azar(azar)}', {})),
+        ('api_buscar', None,
+         lambda azar: ('GET', f'/api/buscar_libro?q={azar.choice(PALABRAS)}+{azar.choice(PALABRAS)}', {})),
+        ('api_actualizar', None,
+         lambda azar: ('PUT', f'/api/actualizar_libro/{libro_al_azar(azar)}',
+                       {'json': {'estado': azar.choice(['Disponible', 'Prestado'])}})),
+    ]
+
+
+def preparar_app(ruta_db):
+    """ Crea la app con el perfil de pruebas sobre la base indicada y registra la API JSON bajo /api. """
+    from app import create_app
+    from app.test_routes import main as api
+    from config import PruebasConfig
+
+    # La configuración se lee al importar config.py: cada tamaño usa una subclase con su propia base
+    opciones = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + ruta_db}
+    if args.sin_cache:
+        opciones['CACHE_PAGINAS'] = ''
+    app = create_app(type('BenchConfig', (PruebasConfig,), opciones))
+
+    # test_routes define otro blueprint 'main'; se registra con otro nombre para medir ambas APIs juntas
+    app.register_blueprint(api, name='api', url_prefix='/api')
+    return app
+
+
+def sembrar(app, total_libros):
+    """ Crea el esquema, los usuarios del benchmark y total_libros libros con datos reproducibles. """
+    from app import db
+    from app.generador import asegurar_roles, generar_libros
+    from app.models import User
+
+    with app.app_context():
+        db.create_all()
+        roles = asegurar_roles()
+        for email, password, rol in USUARIOS.values():
+            usuario = User(username=email.split('@')[0], email=email, role_id=roles[rol])
+            usuario.set_password(password)
+            db.session.add(usuario)
+        db.session.commit()
+        bibliotecarios = [usuario.id for usuario in User.query.all() if usuario.role.name != 'Lector']
+        generar_libros(total_libros, semilla=args.semilla, bibliotecarios=bibliotecarios, sesgo_bibliotecarios=0)
+
+
+def base_sembrada(total_libros):
+    """ Ruta de la base SQLite con total_libros libros, creándola si hace falta. """
+    os.makedirs(args.datos, exist_ok=True)
+    ruta = os.path.join(args.datos, f'libros_{total_libros}.db')
+    if args.resembrar and os.path.exists(ruta):
+        os.remove(ruta)
+    if not os.path.exists(ruta):
+        inicio = time.perf_counter()
+        sembrar(preparar_app(ruta), total_libros)
+        print(f'ℹ️ Base con {total_libros} libros sembrada en {time.perf_counter() - inicio:.1f} s ({ruta})')
+    return ruta
+
+
+class ContadorConsultas:
+    """ Cuenta las sentencias SQL de la petición en curso de cada hilo (el cliente de pruebas es síncrono). """
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._contar)
+
+    def _contar(self, *argumentos):
+        self._local.consultas = getattr(self._local, 'consultas', 0) + 1
+
+    def reiniciar(self):
+        self._local.consultas = 0
+
+    def leer(self):
+        return getattr(self._local, 'consultas', 0)
+
+
+def ejecutar_escenario(app, contador, rol, peticion):
+    """ Corre el escenario con args.clientes hilos y retorna sus métricas. """
+    def nuevo_cliente():
+        cliente = app.test_client()
+        if rol:
+            email, password, _ = USUARIOS[rol]
+            respuesta = cliente.post('/login', data={'email': email, 'password': password})
+            if respuesta.status_code != 302:
+                raise RuntimeError(f'Login as {rol} failed with status {respuesta.status_code}')
+        return cliente
+
+    def enviar(cliente, azar):
+        metodo, ruta, opciones = peticion(azar)
+        return cliente.open(ruta, method=metodo, **opciones)
+
+    # Calentamiento: construye índices y cachés perezosas sin medirlas
+    cliente, azar = nuevo_cliente(), random.Random(args.semilla)
+    for _ in range(args.calentamiento):
+        enviar(cliente, azar)
+
+    latencias, consultas, errores = [], [], []
+    lock = threading.Lock()
+    por_cliente = [args.peticiones // args.clientes + (1 if i < args.peticiones % args.clientes else 0)
+                   for i in range(args.clientes)]
+
+    def trabajar(posicion):
+        cliente, azar = nuevo_cliente(), random.Random(args.semilla + posicion)
+        propias, propias_consultas, propios_errores = [], [], 0
+        for _ in range(por_cliente[posicion]):
+            contador.reiniciar()
+            inicio = time.perf_counter()
+            respuesta = enviar(cliente, azar)
+            respuesta.close()
+            propias.append(time.perf_counter() - inicio)
+            propias_consultas.append(contador.leer())
+            if respuesta.status_code >= 400:
+                propios_errores += 1
+        with lock:
+            latencias.extend(propias)
+            consultas.extend(propias_consultas)
+            errores.append(propios_errores)
+
+    hilos = [threading.Thread(target=trabajar, args=(posicion,)) for posicion in range(args.clientes)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    percentiles = statistics.quantiles(latencias, n=100, method='inclusive') if len(latencias) > 1 else latencias * 99
+    return {
+        'peticiones': len(latencias),
+        'errores': sum(errores),
+        'p50_ms': round(1000 * percentiles[49], 3),
+        'p95_ms': round(1000 * percentiles[94], 3),
+        'p99_ms': round(1000 * percentiles[98], 3),
+        'peticiones_por_segundo': round(len(latencias) / duracion, 1),
+        'consultas_por_peticion': round(statistics.mean(consultas), 2),
+    }
+
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=CARPETA,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(resultados, anterior):
+    """ Muestra la diferencia con una ejecución anterior; retorna los escenarios cuyo p95 empeoró. """
+    empeorados = []
+    for tamaño, escenarios_actuales in resultados.items():
+        for nombre, actual in escenarios_actuales.items():
+            previo = anterior.get('resultados', {}).get(tamaño, {}).get(nombre)
+            if not previo:
+                continue
+            cambio = (actual['p95_ms'] - previo['p95_ms']) / previo['p95_ms'] if previo['p95_ms'] else 0
+            marca = '❌' if cambio > args.tolerancia else '✅'
+            print(f'{marca} {tamaño:>8} {nombre:<20} p95 {previo["p95_ms"]:9.2f} -> {actual["p95_ms"]:9.2f} ms '
+                  f'({cambio:+.0%}), {previo["peticiones_por_segundo"]:.1f} -> {actual["peticiones_por_segundo"]:.1f} req/s')
+            if cambio > args.tolerancia:
+                empeorados.append((tamaño, nombre))
+    return empeorados
+
+
+resultados = {}
+for total_libros in args.libros:
+    app = preparar_app(base_sembrada(total_libros))
+    from app import db
+    with app.app_context():
+        contador = ContadorConsultas(db.engine)
+
+    resultados[str(total_libros)] = {}
+    print(f'\n📚 {total_libros} libros, {args.clientes} clientes, {args.peticiones} peticiones por escenario')
+    for nombre, rol, peticion in escenarios(total_libros):
+        if args.escenarios and nombre not in args.escenarios:
+            continue
+        metricas = ejecutar_escenario(app, contador, rol, peticion)
+        resultados[str(total_libros)][nombre] = metricas
+        print(f'  {nombre:<20} p50 {metricas["p50_ms"]:8.2f} ms  p95 {metricas["p95_ms"]:8.2f} ms  '
+              f'p99 {metricas["p99_ms"]:8.2f} ms  {metricas["peticiones_por_segundo"]:8.1f} req/s  '
+              f'{metricas["consultas_por_peticion"]:5.1f} SQL/req  {metricas["errores"]} errores')
+
+    from app.hashing import cerrar_pool
+    cerrar_pool()
+
+commit = commit_actual()
+informe = {
+    'fecha': datetime.now().isoformat(timespec='seconds'),
+    'commit': commit,
+    'python': platform.python_version(),
+    'plataforma': platform.platform(),
+    'parametros': {clave: valor for clave, valor in vars(args).items() if clave not in ('salida', 'comparar')},
+    'resultados': resultados,
+}
+salida = args.salida or os.path.join(
+    CARPETA, 'resultados', f'{datetime.now():%Y%m%d_%H%M%S}_{commit or "sin-commit"}.json')
+os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+with open(salida, 'w', encoding='utf-8') as archivo:
+    json.dump(informe, archivo, indent=2, ensure_ascii=False)
+print(f'\n✅ Resultados guardados en {salida}')
+
+if args.comparar:
+    with open(args.comparar, encoding='utf-8') as archivo:
+        empeorados = comparar(resultados, json.load(archivo))
+    if empeorados:
+        sys.exit(f'❌ {len(empeorados)} escenarios empeoraron más de {args.tolerancia:.0%} en p95.')
@@ -0,0 +1,55 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.hashing import cerrar_pool, generar_hash, verificar_hash
+
+# Mide cuántos logins por segundo (verificaciones de contraseña) soporta un worker
+# con distintos tamaños del pool de hashing:
+#   python benchmarks/bench_login.py --workers 0 1 2 4 --hilos 16 --segundos 5
+
+parser = argparse.ArgumentParser(description='Benchmark de verificación de contraseñas por cantidad de workers.')
+parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4], help='Valores de HASH_WORKERS a probar')
+parser.add_argument('--hilos', type=int, default=16, help='Peticiones de login concurrentes')
+parser.add_argument('--segundos', type=float, default=5, help='Duración de cada medición')
+parser.add_argument('--metodo', help='HASH_METODO a usar (por defecto el de Config)')
+args = parser.parse_args()
+
+app = create_app()
+if args.metodo:
+    app.config['HASH_METODO'] = args.metodo
+
+
+def medir(workers):
+    """ Verifica contraseñas desde varios hilos durante un tiempo fijo y retorna logins/s. """
+    app.config['HASH_WORKERS'] = workers
+    with app.app_context():
+        password_hash = generar_hash('benchmark123')
+
+    completados = [0] * args.hilos
+    fin = time.perf_counter() + args.segundos
+
+    def cliente(posicion):
+        with app.app_context():
+            while time.perf_counter() < fin:
+                verificar_hash(password_hash, 'benchmark123')
+                completados[posicion] += 1
+
+    hilos = [threading.Thread(target=cliente, args=(posicion,)) for posicion in range(args.hilos)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    cerrar_pool()
+    return sum(completados) / (time.perf_counter() - inicio)
+
+
+print(f'Método: {app.config["HASH_METODO"]}, {args.hilos} hilos, {args.segundos} s por medición')
+for workers in args.workers:
+    print(f'HASH_WORKERS={workers:<3} {medir(workers):8.1f} logins/s')
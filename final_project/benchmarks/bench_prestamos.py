@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Benchmark de contención de préstamos: varios clientes prestan y devuelven al mismo tiempo
+# un conjunto chico de libros "calientes" a través de la API JSON (test_routes bajo /api).
+#   python benchmarks/bench_prestamos.py --clientes 1 4 8 16 --calientes 1 10 100
+#   python benchmarks/bench_prestamos.py --modos optimista ciego --salida prestamos.json
+#   python benchmarks/bench_prestamos.py --url mysql+pymysql://root:@localhost/bench_biblioteca --fragmentos 1 8
+#
+# Con SQLite (por defecto) las escrituras se serializan de todos modos; la contención por filas
+# (versión del libro, version_tabla, estadistica_libro) solo se ve contra MySQL/InnoDB con --url.
+# ¡--url borra y vuelve a crear las tablas de esa base! Usar una base dedicada al benchmark.
+#
+# Modos:
+#   optimista: POST /api/libro/<id>/prestar|devolver (compare-and-swap sobre la versión del libro)
+#   ciego:     GET del libro y PUT del nuevo estado sin If-Match (el comportamiento anterior)
+#
+# Para cada libro, préstamos exitosos - devoluciones exitosas debe coincidir con el cambio de
+# estado final; la diferencia son préstamos perdidos o duplicados ("anomalías").
+
+parser = argparse.ArgumentParser(description='Benchmark de préstamos concurrentes sobre pocos libros.')
+parser.add_argument('--clientes', type=int, nargs='+', default=[1, 4, 8, 16], help='Clientes concurrentes a probar')
+parser.add_argument('--calientes', type=int, nargs='+', default=[1, 10, 100], help='Cantidad de libros disputados')
+parser.add_argument('--operaciones', type=int, default=400, help='Operaciones por combinación')
+parser.add_argument('--modos', nargs='+', choices=['optimista', 'ciego'], default=['optimista', 'ciego'])
+parser.add_argument('--datos', default=os.path.join(tempfile.gettempdir(), 'biblioteca_bench', 'prestamos.db'),
+                    help='Base SQLite del benchmark (se vuelve a crear en cada ejecución)')
+parser.add_argument('--url', help='URL de una base MySQL dedicada al benchmark (en lugar de SQLite)')
+parser.add_argument('--fragmentos', type=int, nargs='+', default=[None],
+                    help='Valores de CONTADORES_FRAGMENTOS a comparar (por defecto el de la configuración)')
+parser.add_argument('--salida', help='Guardar los resultados en este archivo JSON')
+parser.add_argument('--semilla', type=int, default=42)
+args = parser.parse_args()
+
+LIBROS = max(args.calientes)
+
+
+def preparar_app():
+    """ App de pruebas sobre una base nueva con LIBROS libros disponibles y la API JSON bajo /api. """
+    from app import create_app, db
+    from app.generador import asegurar_roles, generar_libros
+    from app.models import User
+    from app.test_routes import main as api
+    from config import PruebasConfig
+
+    if args.url:
+        # Una conexión por cliente, para que las esperas sean de bloqueos y no del pool
+        opciones = {'SQLALCHEMY_DATABASE_URI': args.url,
+                    'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': max(args.clientes), 'max_overflow': 0}}
+    else:
+        os.makedirs(os.path.dirname(args.datos), exist_ok=True)
+        if os.path.exists(args.datos):
+            os.remove(args.datos)
+        opciones = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + args.datos}
+    app = create_app(type('BenchConfig', (PruebasConfig,), opciones))
+    app.register_blueprint(api, name='api', url_prefix='/api')
+
+    with app.app_context():
+        if args.url:
+            db.drop_all()
+        db.create_all()
+        roles = asegurar_roles()
+        db.session.add(User(username='bibliotecario', email='bibliotecario@example.com',
+                            password_hash='-', role_id=roles['Bibliotecario']))
+        db.session.commit()
+        generar_libros(LIBROS, semilla=args.semilla, prestados=0)
+    return app
+
+
+def estados(app, ids):
+    from app import db
+    from app.models import Libro
+
+    with app.app_context():
+        return dict(db.session.query(Libro.id, Libro.estado).filter(Libro.id.in_(ids)).all())
+
+
+def operar_optimista(cliente, id, accion):
+    """ Retorna 'aplicado', 'rechazado' o 'error' (5xx, por ejemplo un deadlock). """
+    return _resultado(cliente.post(f'/api/libro/{id}/{accion}').status_code)
+
+
+def operar_ciego(cliente, id, accion):
+    """ Lee el estado y escribe el nuevo sin condición: dos clientes pueden prestar el mismo libro. """
+    desde, hacia = ('Disponible', 'Prestado') if accion == 'prestar' else ('Prestado', 'Disponible')
+    respuesta = cliente.get(f'/api/libro/{id}?fields=estado')
+    if respuesta.status_code != 200:
+        return _resultado(respuesta.status_code)
+    if respuesta.json['estado'] != desde:
+        return 'rechazado'
+    return _resultado(cliente.put(f'/api/actualizar_libro/{id}', json={'estado': hacia}).status_code)
+
+
+def _resultado(codigo):
+    if codigo >= 500:
+        return 'error'
+    return 'aplicado' if codigo == 200 else 'rechazado'
+
+
+def ejecutar(app, modo, clientes, calientes):
+    from app.concurrencia import contadores
+
+    operar = operar_optimista if modo == 'optimista' else operar_ciego
+    ids = list(range(1, calientes + 1))
+    iniciales = estados(app, ids)
+    reintentos_antes = contadores['reintentos']
+
+    latencias, exitos, resultados = [], Counter(), Counter()
+    lock = threading.Lock()
+    por_cliente = [args.operaciones // clientes + (1 if i < args.operaciones % clientes else 0) for i in range(clientes)]
+
+    def trabajar(posicion):
+        cliente, azar = app.test_client(), random.Random(args.semilla + posicion)
+        propias, propios_exitos, propios_resultados = [], Counter(), Counter()
+        for _ in range(por_cliente[posicion]):
+            id, accion = azar.choice(ids), azar.choice(('prestar', 'devolver'))
+            inicio = time.perf_counter()
+            resultado = operar(cliente, id, accion)
+            propias.append(time.perf_counter() - inicio)
+            propios_resultados[resultado] += 1
+            if resultado == 'aplicado':
+                propios_exitos[(id, accion)] += 1
+        with lock:
+            latencias.extend(propias)
+            exitos.update(propios_exitos)
+            resultados.update(propios_resultados)
+
+    hilos = [threading.Thread(target=trabajar, args=(posicion,)) for posicion in range(clientes)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    # Cada préstamo exitoso debe tener su devolución, salvo el cambio neto del estado del libro
+    finales = estados(app, ids)
+    anomalias = 0
+    for id in ids:
+        neto = (finales[id] == 'Prestado') - (iniciales[id] == 'Prestado')
+        anomalias += abs(exitos[(id, 'prestar')] - exitos[(id, 'devolver')] - neto)
+
+    percentiles = statistics.quantiles(latencias, n=100, method='inclusive') if len(latencias) > 1 else latencias * 99
+    return {
+        'operaciones': len(latencias),
+        'aplicadas': resultados['aplicado'],
+        'rechazadas': resultados['rechazado'],
+        'errores': resultados['error'],
+        'anomalias': anomalias,
+        'reintentos': contadores['reintentos'] - reintentos_antes,
+        'p50_ms': round(1000 * percentiles[49], 3),
+        'p95_ms': round(1000 * percentiles[94], 3),
+        'operaciones_por_segundo': round(len(latencias) / duracion, 1),
+        'aplicadas_por_segundo': round(resultados['aplicado'] / duracion, 1),
+    }
+
+
+app = preparar_app()
+resultados = []
+print(f'📚 {LIBROS} libros, {args.operaciones} operaciones por combinación '
+      f'({app.config["SQLALCHEMY_DATABASE_URI"].split(":", 1)[0]})')
+for fragmentos in args.fragmentos:
+    if fragmentos is not None:
+        app.config['CONTADORES_FRAGMENTOS'] = fragmentos
+    for modo in args.modos:
+        for calientes in args.calientes:
+            for clientes in args.clientes:
+                metricas = ejecutar(app, modo, clientes, calientes)
+                resultados.append({'modo': modo, 'clientes': clientes, 'calientes': calientes,
+                                   'fragmentos': app.config['CONTADORES_FRAGMENTOS'], **metricas})
+                marca = '❌' if metricas['anomalias'] or metricas['errores'] else '✅'
+                print(f'{marca} {modo:<10} {calientes:>4} libros {clientes:>3} clientes '
+                      f'{app.config["CONTADORES_FRAGMENTOS"]:>2} fragmentos  '
+                      f'{metricas["operaciones_por_segundo"]:8.1f} op/s  {metricas["aplicadas_por_segundo"]:8.1f} aplicadas/s  '
+                      f'p95 {metricas["p95_ms"]:7.2f} ms  {metricas["reintentos"]:4} reintentos  '
+                      f'{metricas["errores"]} errores  {metricas["anomalias"]} anomalías')
+
+if args.salida:
+    with open(args.salida, 'w', encoding='utf-8') as archivo:
+        json.dump({'fecha': datetime.now().isoformat(timespec='seconds'), 'parametros': vars(args),
+                   'resultados': resultados}, archivo, indent=2, ensure_ascii=False)
+    print(f'✅ Resultados guardados en {args.salida}')
@@ -0,0 +1,21 @@
+import argparse
+
+from app import create_app, db
+from app.cambios import compactar
+
+# Registro de cambios de libros desde la línea de comandos (por ejemplo, en un cron diario):
+#   python cambios.py compactar            -> compacta las entradas más viejas que CAMBIOS_RETENCION_DIAS
+#   python cambios.py compactar --dias 7   -> con otra retención
+
+parser = argparse.ArgumentParser(description='Compacta el registro de cambios de libros usado por /cambios.')
+parser.add_argument('comando', choices=['compactar'])
+parser.add_argument('--dias', type=int, default=None, help='días de retención (por defecto CAMBIOS_RETENCION_DIAS)')
+args = parser.parse_args()
+
+app = create_app()
+
+with app.app_context():
+    with db.engine.begin() as conexion:
+        resultado = compactar(conexion, args.dias)
+    print(f"✅ {resultado['reemplazadas']} entradas reemplazadas y {resultado['lapidas']} lápidas eliminadas. "
+          f"Horizonte: {resultado['horizonte']}.")
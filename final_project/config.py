@@ -1,4 +1,23 @@
 import os
+import tempfile
+
+
+def _opciones_pool(pool_size, max_overflow, pool_timeout=30, pool_recycle=1800):
+    """
+    Opciones del pool de conexiones de SQLAlchemy con los valores por defecto de cada entorno.
+    Cada una puede sobrescribirse con su variable de entorno DB_*.
+    """
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', pool_size)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', max_overflow)),
+        # Segundos que una petición espera por una conexión libre antes de fallar
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', pool_timeout)),
+        # Recicla conexiones antes de que MySQL las cierre por inactividad (wait_timeout)
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', pool_recycle)),
+        # Verifica la conexión al sacarla del pool (evita errores por conexiones caídas)
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+    }
+
 
 class Config:
     """
@@ -18,5 +37,155 @@ class Config:
         'mysql+pymysql://root:@localhost/gestor_biblioteca'  # Valor por defecto para entorno local (MAMP/XAMPP)
     )
 
+    # Réplicas de solo lectura para las peticiones GET (URLs separadas por comas; vacío = sin réplicas).
+    # Cada una es un bind 'replica_N' (ver app/replicas.py). Para probar en local con SQLite:
+    #   DATABASE_URL=sqlite:////tmp/primaria.db DATABASE_REPLICAS=sqlite:////tmp/replica.db (una copia del archivo)
+    DATABASE_REPLICAS = [url.strip() for url in os.environ.get('DATABASE_REPLICAS', '').split(',') if url.strip()]
+    SQLALCHEMY_BINDS = {f'replica_{numero}': url for numero, url in enumerate(DATABASE_REPLICAS)}
+    # Segundos que quien escribió sigue leyendo de la primaria (cubre el retraso de replicación)
+    REPLICA_RETRASO_MAX = int(os.environ.get('REPLICA_RETRASO_MAX', 5))
+
     # Desactiva el sistema de seguimiento de modificaciones de SQLAlchemy (mejora el rendimiento)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Pool de conexiones (por proceso). Con gunicorn, workers * (pool_size + max_overflow)
+    # debe quedar por debajo de max_connections de MySQL.
+    SQLALCHEMY_ENGINE_OPTIONS = _opciones_pool(pool_size=5, max_overflow=10)
+
+    # Tiempo máximo de ejecución de una consulta en milisegundos (0 = sin límite; MySQL y PostgreSQL)
+    DB_TIMEOUT_SENTENCIA_MS = int(os.environ.get('DB_TIMEOUT_SENTENCIA_MS', 0))
+
+    # Las esperas por una conexión libre más largas que esto (segundos) se registran en el log
+    DB_POOL_ESPERA_LENTA = float(os.environ.get('DB_POOL_ESPERA_LENTA', 0.1))
+
+    # Cantidad de libros por página en el dashboard (paginación por cursor)
+    LIBROS_POR_PAGINA = int(os.environ.get('LIBROS_POR_PAGINA', 25))
+    LIBROS_POR_PAGINA_MAX = 100
+
+    # Filas leídas por lote al transmitir (streaming) listados y exportaciones
+    LOTE_STREAMING = int(os.environ.get('LOTE_STREAMING', 1000))
+
+    # Filas por transacción en la importación masiva de libros
+    LOTE_IMPORTACION = int(os.environ.get('LOTE_IMPORTACION', 5000))
+
+    # Compresión gzip de las respuestas (las transmitidas se comprimen al vuelo; las demás
+    # solo si ocupan al menos COMPRESION_MINIMA bytes)
+    COMPRESION_GZIP = os.environ.get('COMPRESION_GZIP', '1') == '1'
+    COMPRESION_MINIMA = int(os.environ.get('COMPRESION_MINIMA', 1024))
+    COMPRESION_NIVEL = int(os.environ.get('COMPRESION_NIVEL', 6))
+
+    # Elementos máximos por petición en los endpoints por lotes (obtener, actualizar y eliminar libros)
+    LOTE_API_MAXIMO = int(os.environ.get('LOTE_API_MAXIMO', 10000))
+
+    # Reintentos de un préstamo/devolución cuando otra petición modificó el libro al mismo tiempo
+    PRESTAMOS_REINTENTOS = int(os.environ.get('PRESTAMOS_REINTENTOS', 3))
+
+    # Fragmentos de version_tabla y estadistica_libro: cada transacción incrementa uno al azar, así
+    # las escrituras concurrentes del catálogo no compiten por la misma fila (1 = sin fragmentar)
+    CONTADORES_FRAGMENTOS = int(os.environ.get('CONTADORES_FRAGMENTOS', 8))
+
+    # Caché de usuarios y roles para Flask-Login (segundos de vida, 0 la desactiva)
+    CACHE_USUARIOS_TTL = int(os.environ.get('CACHE_USUARIOS_TTL', 60))
+    CACHE_USUARIOS_MAX = int(os.environ.get('CACHE_USUARIOS_MAX', 4096))
+
+    # Caché de páginas del catálogo: 'memoria' (LRU por worker), 'archivos' (compartida por los
+    # workers del servidor) o '' para desactivarla
+    CACHE_PAGINAS = os.environ.get('CACHE_PAGINAS', 'memoria')
+    CACHE_PAGINAS_TTL = int(os.environ.get('CACHE_PAGINAS_TTL', 300))
+    CACHE_PAGINAS_MAX = int(os.environ.get('CACHE_PAGINAS_MAX', 512))
+    CACHE_PAGINAS_DIR = os.environ.get('CACHE_PAGINAS_DIR', os.path.join(tempfile.gettempdir(), 'biblioteca_cache'))
+
+    # Detector de consultas N+1: '' (apagado), 'advertir' (log) o 'fallar' (lanza una excepción)
+    DETECTOR_N_MAS_1 = os.environ.get('DETECTOR_N_MAS_1', '')
+    UMBRAL_N_MAS_1 = int(os.environ.get('UMBRAL_N_MAS_1', 5))
+
+    # Perfilado por petición (opcional): cabecera Server-Timing con tiempo total, SQL y plantillas,
+    # log de las peticiones más lentas que PETICION_LENTA_MS con sus consultas más lentas,
+    # y volcado de cProfile en PERFIL_DIR para una fracción PERFIL_MUESTREO de las peticiones (0 a 1)
+    PERFILADO = os.environ.get('PERFILADO', '0') == '1'
+    PETICION_LENTA_MS = float(os.environ.get('PETICION_LENTA_MS', 500))
+    PERFIL_CONSULTAS_LENTAS = int(os.environ.get('PERFIL_CONSULTAS_LENTAS', 5))
+    PERFIL_MUESTREO = float(os.environ.get('PERFIL_MUESTREO', 0))
+    PERFIL_DIR = os.environ.get('PERFIL_DIR', os.path.join(tempfile.gettempdir(), 'biblioteca_perfiles'))
+
+    # Blueprint principal: 'routes' (interfaz HTML) o 'test_routes' (API JSON de pruebas)
+    BLUEPRINT_PRINCIPAL = os.environ.get('BLUEPRINT_PRINCIPAL', 'routes')
+
+    # Caché de bytecode de las plantillas Jinja compartida por los workers ('' la desactiva).
+    # "python arranque.py precompilar" la llena durante el despliegue.
+    PLANTILLAS_CACHE_DIR = os.environ.get('PLANTILLAS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'biblioteca_jinja'))
+
+    # Tareas en segundo plano (app/tareas.py): hilos por worker (0 = en el mismo hilo de la petición),
+    # máximo de tareas en curso por worker, segundos entre escrituras del progreso y carpeta de archivos a importar
+    TAREAS_WORKERS = int(os.environ.get('TAREAS_WORKERS', 2))
+    TAREAS_MAXIMO_PENDIENTES = int(os.environ.get('TAREAS_MAXIMO_PENDIENTES', 20))
+    TAREAS_INTERVALO_PROGRESO = float(os.environ.get('TAREAS_INTERVALO_PROGRESO', 1))
+    TAREAS_DIR = os.environ.get('TAREAS_DIR', os.path.join(tempfile.gettempdir(), 'biblioteca_tareas'))
+    # Segundos entre latidos de las tareas de cada worker, y sin latido tras los cuales una tarea
+    # pendiente o en ejecución se considera huérfana (su worker se reinició o se cayó) y se marca fallida
+    TAREAS_LATIDO = float(os.environ.get('TAREAS_LATIDO', 10))
+    TAREAS_LATIDO_VENCIDO = float(os.environ.get('TAREAS_LATIDO_VENCIDO', 60))
+
+    # Registro de cambios de libros (app/cambios.py): días que se conservan las entradas reemplazadas
+    # y las lápidas antes de compactarlas
+    CAMBIOS_RETENCION_DIAS = int(os.environ.get('CAMBIOS_RETENCION_DIAS', 30))
+
+    # Proxies inversos de confianza delante de la aplicación (nginx, balanceador). Con 0 la IP del cliente es
+    # la de la conexión; con N se toma de X-Forwarded-For (el valor agregado por el último de los N proxies).
+    # Sin configurarlo detrás de un proxy, todos los clientes comparten el límite por IP.
+    PROXIES_CONFIABLES = int(os.environ.get('PROXIES_CONFIABLES', 0))
+
+    # Límite de intentos de login y registro por IP y de intentos fallidos por email: 'intentos/segundos'
+    # ('' sin límite). Se verifica antes de validar el formulario o calcular hashes (ver app/limites.py).
+    LIMITE_LOGIN_IP = os.environ.get('LIMITE_LOGIN_IP', '30/60')
+    LIMITE_LOGIN_EMAIL = os.environ.get('LIMITE_LOGIN_EMAIL', '5/60')
+    LIMITE_REGISTRO_IP = os.environ.get('LIMITE_REGISTRO_IP', '10/3600')
+    LIMITE_REGISTRO_EMAIL = os.environ.get('LIMITE_REGISTRO_EMAIL', '3/3600')
+    # Contadores: 'memoria' (por worker), 'sqlite' (compartidos por los workers del servidor) o '' (desactivado)
+    LIMITES_BACKEND = os.environ.get('LIMITES_BACKEND', 'memoria')
+    LIMITES_SQLITE = os.environ.get('LIMITES_SQLITE', os.path.join(tempfile.gettempdir(), 'biblioteca_limites.db'))
+    LIMITES_MAX_CLAVES = int(os.environ.get('LIMITES_MAX_CLAVES', 100000))
+
+    # Hashing de contraseñas: método y costo de Werkzeug (p. ej. 'scrypt:32768:8:1' o 'pbkdf2:sha256:600000').
+    # Al cambiarlo, los hashes antiguos se actualizan en el siguiente login exitoso.
+    HASH_METODO = os.environ.get('HASH_METODO', 'scrypt:32768:8:1')
+    # Procesos dedicados al hashing por worker (0 = en el mismo hilo de la petición)
+    HASH_WORKERS = int(os.environ.get('HASH_WORKERS', 2))
+
+
+class DesarrolloConfig(Config):
+    """
+    Desarrollo local: pool pequeño, el servidor de Flask atiende pocas peticiones a la vez.
+    """
+    SQLALCHEMY_ENGINE_OPTIONS = _opciones_pool(pool_size=2, max_overflow=3)
+
+
+class ProduccionConfig(Config):
+    """
+    Producción con gunicorn: pool por worker, reciclaje antes del wait_timeout de MySQL
+    y límite de tiempo por consulta.
+    """
+    SQLALCHEMY_ENGINE_OPTIONS = _opciones_pool(pool_size=10, max_overflow=5, pool_timeout=10, pool_recycle=280)
+    DB_TIMEOUT_SENTENCIA_MS = int(os.environ.get('DB_TIMEOUT_SENTENCIA_MS', 10000))
+
+
+class PruebasConfig(Config):
+    """
+    Pruebas y benchmarks: SQLite, sin CSRF, sin límite de intentos, con hashing rápido en el mismo hilo
+    y con los cambios de libros visibles al instante en /cambios.
+    """
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite://')
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    HASH_METODO = 'pbkdf2:sha256:1000'
+    HASH_WORKERS = 0
+    LIMITES_BACKEND = ''
+
+
+# Perfil de configuración según la variable de entorno APP_ENTORNO (por defecto Config)
+CONFIGURACIONES = {
+    'desarrollo': DesarrolloConfig,
+    'produccion': ProduccionConfig,
+    'pruebas': PruebasConfig,
+}
@@ -0,0 +1,30 @@
+import argparse
+import sys
+
+from app import create_app, db
+from app.estadisticas import recalcular, verificar
+
+# Contadores del catálogo desde la línea de comandos:
+#   python estadisticas.py             -> compara los contadores con un recálculo completo (falla si difieren)
+#   python estadisticas.py recalcular  -> rehace todos los contadores desde la tabla libro
+
+parser = argparse.ArgumentParser(description='Verifica o recalcula las estadísticas incrementales del catálogo.')
+parser.add_argument('comando', nargs='?', default='verificar', choices=['verificar', 'recalcular'])
+args = parser.parse_args()
+
+app = create_app()
+
+with app.app_context():
+    if args.comando == 'recalcular':
+        with db.engine.begin() as conexion:
+            cantidad = recalcular(conexion)
+        print(f'✅ {cantidad} contadores recalculados.')
+
+    else:
+        with db.engine.connect() as conexion:
+            diferencias = verificar(conexion)
+        for (dimension, valor), (guardado, real) in diferencias.items():
+            print(f'❌ {dimension}={valor!r}: guardado {guardado}, real {real}')
+        if diferencias:
+            sys.exit(f'⚠️ {len(diferencias)} contadores difieren. Ejecute "python estadisticas.py recalcular".')
+        print('✅ Los contadores coinciden con la tabla libro.')
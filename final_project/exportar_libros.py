@@ -0,0 +1,42 @@
+import argparse
+import sys
+
+from app import create_app
+from app.exportacion import exportar, validar_columnas
+
+# Exportación del catálogo desde la línea de comandos (p. ej. para el volcado nocturno):
+#   python exportar_libros.py -o libros.csv.gz
+#   python exportar_libros.py --formato ndjson --columnas id,titulo,estado > libros.ndjson
+
+parser = argparse.ArgumentParser(description='Exporta la tabla libro como CSV o NDJSON.')
+parser.add_argument('-o', '--salida', help='Archivo de salida (por defecto la salida estándar); ".gz" activa la compresión')
+parser.add_argument('--formato', choices=['csv', 'ndjson'], default='csv', help='Formato de salida (csv por defecto)')
+parser.add_argument('--columnas', help='Columnas separadas por coma (por defecto todas)')
+parser.add_argument('--gzip', action='store_true', help='Comprime la salida con gzip')
+parser.add_argument('--lote', type=int, help='Filas leídas por lote (por defecto LOTE_STREAMING)')
+args = parser.parse_args()
+
+try:
+    columnas = validar_columnas(args.columnas)
+except ValueError as error:
+    sys.exit(f'❌ {error}')
+
+gzip = args.gzip or bool(args.salida and args.salida.endswith('.gz'))
+
+app = create_app()
+
+with app.app_context():
+    if args.salida:
+        salida = open(args.salida, 'wb' if gzip else 'w', encoding=None if gzip else 'utf-8', newline=None if gzip else '')
+    else:
+        salida = sys.stdout.buffer if gzip else sys.stdout
+
+    try:
+        for parte in exportar(args.formato, columnas, gzip=gzip, lote=args.lote):
+            salida.write(parte)
+    finally:
+        if args.salida:
+            salida.close()
+
+    if args.salida:
+        print(f'✅ Catálogo exportado en {args.salida}.', file=sys.stderr)
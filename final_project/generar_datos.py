@@ -0,0 +1,68 @@
+import argparse
+import sys
+
+from app import create_app, db
+from app.generador import CATEGORIAS, generar_libros, generar_usuarios, parsear_pesos
+
+# Datos sintéticos para pruebas de carga (la misma semilla genera los mismos datos):
+#   python generar_datos.py --usuarios 5000 --bibliotecarios 200 --libros 1000000
+#   python generar_datos.py --libros 200000 --categorias "Novela:50,Ciencia:30,Poesía:20" --prestados 0.6
+#   python generar_datos.py --crear-tablas --libros 100000   (base vacía, por ejemplo SQLite)
+
+parser = argparse.ArgumentParser(description='Genera usuarios y libros sintéticos en lotes.')
+parser.add_argument('--usuarios', type=int, default=0, help='Usuarios a crear (incluye admins y bibliotecarios)')
+parser.add_argument('--bibliotecarios', type=int, default=50, help='Cuántos de los usuarios son bibliotecarios')
+parser.add_argument('--admins', type=int, default=2, help='Cuántos de los usuarios son administradores')
+parser.add_argument('--password', default='demo1234', help='Contraseña común de los usuarios generados')
+parser.add_argument('--libros', type=int, default=0, help='Libros a crear')
+parser.add_argument('--categorias', type=parsear_pesos,
+                    default=','.join(f'{nombre}:{peso}' for nombre, peso in CATEGORIAS.items()),
+                    help='Categorías y pesos, p. ej. "Novela:30,Ciencia:10"')
+parser.add_argument('--prestados', type=float, default=0.3, help='Fracción de libros prestados (0 a 1)')
+parser.add_argument('--años', type=int, nargs=3, default=[1900, 2024, 2015], metavar=('MIN', 'MAX', 'MODA'),
+                    help='Distribución triangular del año de publicación')
+parser.add_argument('--sesgo-bibliotecarios', type=float, default=1.0,
+                    help='Exponente Zipf del reparto de libros entre bibliotecarios (0 = uniforme)')
+parser.add_argument('--semilla', type=int, default=42)
+parser.add_argument('--lote', type=int, help='Filas por transacción (por defecto LOTE_IMPORTACION)')
+parser.add_argument('--crear-tablas', action='store_true', help='Crear las tablas de los modelos si no existen')
+args = parser.parse_args()
+
+if args.admins + args.bibliotecarios > args.usuarios > 0:
+    sys.exit('❌ --usuarios debe ser mayor o igual que --admins + --bibliotecarios.')
+
+app = create_app()
+
+with app.app_context():
+    if args.crear_tablas:
+        db.create_all()
+
+    if args.usuarios:
+        creados = generar_usuarios(
+            args.usuarios,
+            bibliotecarios=args.bibliotecarios,
+            admins=args.admins,
+            password=args.password,
+            semilla=args.semilla,
+            lote=args.lote,
+        )
+        print('✅ Usuarios creados: ' + ', '.join(f'{cantidad} {rol}' for rol, cantidad in creados.items()))
+
+    if args.libros:
+        def progreso(insertados, segundos):
+            print(f'ℹ️ {insertados}/{args.libros} libros ({insertados / segundos:.0f} filas/s)', end='\r', flush=True)
+
+        try:
+            total = generar_libros(
+                args.libros,
+                semilla=args.semilla,
+                lote=args.lote,
+                categorias=args.categorias,
+                prestados=args.prestados,
+                años=tuple(args.años),
+                sesgo_bibliotecarios=args.sesgo_bibliotecarios,
+                al_insertar=progreso,
+            )
+        except ValueError as error:
+            sys.exit(f'\n❌ {error}')
+        print(f'\n✅ {total} libros creados.')
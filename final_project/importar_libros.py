@@ -0,0 +1,36 @@
+import argparse
+import sys
+
+from app import create_app
+from app.importacion import importar_libros, formato_de, flujo_de_texto
+
+# Importación masiva de libros desde la línea de comandos:
+#   python importar_libros.py catalogo.csv --bibliotecario-id 2
+#   python importar_libros.py catalogo.ndjson --lote 10000
+
+parser = argparse.ArgumentParser(description='Importa libros en masa desde un archivo CSV o NDJSON.')
+parser.add_argument('archivo', help='Ruta del archivo a importar')
+parser.add_argument('--formato', choices=['csv', 'ndjson'], help='Formato del archivo (por defecto se deduce de la extensión)')
+parser.add_argument('--bibliotecario-id', type=int, help='Bibliotecario para las filas que no lo indican')
+parser.add_argument('--lote', type=int, help='Filas por transacción (por defecto LOTE_IMPORTACION)')
+args = parser.parse_args()
+
+formato = args.formato or formato_de(args.archivo)
+if formato is None:
+    sys.exit('❌ No se pudo deducir el formato, use --formato csv|ndjson')
+
+app = create_app()
+
+with app.app_context(), open(args.archivo, 'rb') as archivo:
+    reporte = importar_libros(
+        flujo_de_texto(archivo),
+        formato,
+        bibliotecario_id=args.bibliotecario_id,
+        lote=args.lote,
+    )
+
+    for error in reporte['errores']:
+        print(f'⚠️ Línea {error["linea"]}: {error["error"]}')
+
+    print(f'✅ {reporte["insertados"]} libros insertados, {reporte["rechazados"]} rechazados '
+          f'en {reporte["segundos"]} s ({reporte["filas_por_segundo"]} filas/s).')
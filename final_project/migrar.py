@@ -0,0 +1,55 @@
+import argparse
+import sys
+
+from app import create_app, db
+from app import migraciones
+from app.migraciones.planes import verificar_planes
+
+# Migraciones del esquema desde la línea de comandos:
+#   python migrar.py                      -> aplica las migraciones pendientes
+#   python migrar.py estado               -> muestra versiones aplicadas y pendientes
+#   python migrar.py generar "descripcion" -> crea una migración con las diferencias modelo/base
+#   python migrar.py verificar            -> EXPLAIN de las consultas críticas (falla si alguna no usa índices)
+
+parser = argparse.ArgumentParser(description='Migraciones versionadas del esquema de la base de datos.')
+parser.add_argument('comando', nargs='?', default='aplicar', choices=['aplicar', 'estado', 'generar', 'verificar'])
+parser.add_argument('descripcion', nargs='?', help='Descripción de la nueva migración (solo para generar)')
+parser.add_argument('--hasta', type=int, help='Aplicar solo hasta esta versión')
+args = parser.parse_args()
+
+app = create_app()
+
+with app.app_context():
+    engine = db.engine
+
+    if args.comando == 'aplicar':
+        aplicadas = migraciones.aplicar_pendientes(
+            engine,
+            hasta=args.hasta,
+            al_aplicar=lambda version, nombre: print(f'✅ Migración {nombre} aplicada.'),
+        )
+        if not aplicadas:
+            print('ℹ️ No hay migraciones pendientes.')
+
+    elif args.comando == 'estado':
+        with engine.begin() as conexion:
+            aplicadas = migraciones.versiones_aplicadas(conexion)
+            faltantes = migraciones.diferencias(conexion)
+        for version, nombre in migraciones.migraciones_disponibles():
+            print(f'{"✅" if version in aplicadas else "⏳"} {nombre}')
+        if faltantes:
+            print(f'⚠️ El esquema difiere de los modelos en {len(faltantes)} operaciones: {faltantes}')
+
+    elif args.comando == 'generar':
+        if not args.descripcion:
+            sys.exit('❌ Indique la descripción de la migración.')
+        ruta = migraciones.generar(engine, args.descripcion)
+        print(f'✅ Migración creada en {ruta}.' if ruta else 'ℹ️ El esquema ya coincide con los modelos.')
+
+    elif args.comando == 'verificar':
+        with engine.connect() as conexion:
+            resultados = verificar_planes(conexion)
+        for nombre, usa_indice, plan in resultados:
+            print(f'{"✅" if usa_indice else "❌"} {nombre}: {plan}')
+        if not all(usa_indice for _, usa_indice, _ in resultados):
+            sys.exit(1)